@@ -0,0 +1,116 @@
+"""
+Разбор тела /predict/batch до DataFrame для модели: CSV против Arrow и Parquet
+
+    python benchmarks/columnar_ingest.py
+    python benchmarks/columnar_ingest.py --rows 100000 --chunk-size 5000 --json
+
+Одни и те же строки (benchmarks/synthetic.py) в каждом формате проходят путь сервиса
+без модели: CSV — bulk.iter_records, куски и DataFrame из словарей (как у NDJSON, только
+без разбора JSON и проверки схемой), Arrow IPC и Parquet — columnar.read_batches по
+отображённому в память файлу и to_pandas на кусок. Считаю время на строку, размер тела
+и что DataFrame одинаковые
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from synthetic import make_listings  # noqa: E402
+
+
+def _bodies(df) -> dict:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    arrow = pa.BufferOutputStream()
+    with pa.ipc.new_stream(arrow, table.schema) as writer:
+        writer.write_table(table)
+    parquet = pa.BufferOutputStream()
+    pq.write_table(table, parquet)
+    return {
+        "csv": df.to_csv(index=False).encode(),
+        "arrow": arrow.getvalue().to_pybytes(),
+        "parquet": parquet.getvalue().to_pybytes(),
+    }
+
+
+def _frames(body: bytes, fmt: str, chunk_size: int) -> list:
+    """Тело → куски DataFrame, как в /predict/batch"""
+    import pandas as pd
+
+    import bulk
+    import columnar
+
+    if fmt in bulk.COLUMNAR_FORMATS:
+        with tempfile.NamedTemporaryFile(suffix=f".{fmt}") as f:
+            f.write(body)
+            f.flush()
+            return [frame for _, frame in columnar.iter_frames(columnar.read_batches(f.name, fmt, chunk_size))]
+    chunks = bulk.iter_chunks(bulk.iter_records(io.BytesIO(body), fmt), chunk_size)
+    return [pd.DataFrame([record for _, record, _ in chunk]) for chunk in chunks]
+
+
+def bench_ingest(df, chunk_size: int, repeats: int) -> dict:
+    import columnar
+
+    results = {}
+    reference = None
+    for fmt, body in _bodies(df).items():
+        best = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            frames = _frames(body, fmt, chunk_size)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        # Значения столбцов, которые читает предобработка, должны совпасть с CSV
+        values = []
+        for frame in frames:
+            frame = frame[list(columnar.REQUIRED_COLUMNS)].astype(object)
+            values += frame.where(frame.notna(), None).values.tolist()
+        if fmt == "csv":
+            reference = values
+        results[fmt] = {
+            "body_bytes": len(body),
+            "us_per_row": round(best / len(df) * 1e6, 2),
+            "same_as_csv": None if reference is None or fmt == "csv" else values == reference,
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Разбор тела /predict/batch: CSV против Arrow и Parquet")
+    parser.add_argument("--rows", type=int, default=20000, help="Строк во входе")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Строк в куске, как PREDICT_BATCH_CHUNK_SIZE")
+    parser.add_argument("--repeats", type=int, default=3, help="Повторов, берётся лучший")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    args = parser.parse_args(argv)
+
+    # Сырые столбцы строками; пустые строки — пропуски, как их отдаёт CSV-путь
+    df = make_listings(args.rows, seed=11)
+    df = df.astype(object).where(df.notna() & (df != ""), None)
+    summary = {"rows": args.rows, "chunk_size": args.chunk_size,
+               "formats": bench_ingest(df, args.chunk_size, args.repeats)}
+    formats = summary["formats"]
+    summary["speedup_vs_csv"] = {fmt: round(formats["csv"]["us_per_row"] / result["us_per_row"], 1)
+                                 for fmt, result in formats.items()}
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{args.rows:,} строк, куски по {args.chunk_size}")
+    for fmt, result in formats.items():
+        same = "" if result["same_as_csv"] is None else f"  совпадает с CSV: {'да' if result['same_as_csv'] else 'нет'}"
+        print(f"  {fmt:8} {result['body_bytes'] / 1e6:7.2f} МБ  {result['us_per_row']:7.2f} мкс/строку  "
+              f"x{summary['speedup_vs_csv'][fmt]:.1f}{same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Сверка векторной предобработки с исходной построчной версией
+
+    python benchmarks/equivalence.py
+    python benchmarks/equivalence.py --seeds 20 --rows 5000
+    python benchmarks/equivalence.py --baseline-file old_preprocessing.py
+    python benchmarks/equivalence.py --freeze tests/data/preprocessing_expected.json
+
+Исходный _do_preprocessing (через apply по строкам) беру из истории git — по умолчанию
+из первого коммита репозитория, другой коммит — --baseline, сохранённый файл —
+--baseline-file. Обе версии считают признаки на одних и тех же синтетических объявлениях
+(benchmarks/synthetic.py), и я требую полного совпадения: те же столбцы в том же порядке,
+те же dtype и те же значения бит в бит, без допусков. Отдельные случаи на места,
+где векторная версия легко расходится с исходной:
+
+- ничья в моде baths — Counter.most_common отдаёт значение, встреченное первым;
+- приведение типов — колонки, где все значения пропущены или все целые;
+- порядок суммирования — средние по рейтингам и расстояниям школ, np.mean складывает попарно.
+
+В low_memory типы компактные по замыслу (category, int8, float32): исходный результат
+привожу к тем же типам через _compact_column и сверяю уже его.
+Пакеты, на которых падает исходная версия (нет моды baths, ни у одной строки нет
+какого-то факта homeFacts), не сравниваю и считаю отдельно.
+Выход с кодом 1 при первом расхождении.
+
+--freeze записывает входы и ожидаемые выходы небольшого набора случаев (FREEZE_CASES) в JSON:
+обычный режим — от исходной версии, low_memory — от текущей, сверенной с исходной.
+Его читает tests/test_preprocessing_equivalence.py, чтобы сверка шла в pytest без git
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import types
+import warnings
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from synthetic import make_listings  # noqa: E402
+
+DEFAULT_SIZES = "1,2,3,5,50,2000"
+
+
+def _git(*args) -> str:
+    out = subprocess.run(["git", *args], cwd=SRC_DIR, capture_output=True, text=True, check=True)
+    return out.stdout
+
+
+def load_baseline(rev: str = None, path: str = None) -> types.ModuleType:
+    """Исходный модуль предобработки из файла или из коммита rev (по умолчанию — первый коммит)"""
+    if path is not None:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        origin = path
+    else:
+        if rev is None:
+            rev = _git("rev-list", "--max-parents=0", "HEAD").split()[0]
+        source = _git("show", f"{rev}:src/preprocessing.py")
+        origin = f"{rev[:10]}:src/preprocessing.py"
+    module = types.ModuleType("baseline_preprocessing")
+    module.__file__ = origin
+    exec(compile(source, origin, "exec"), module.__dict__)
+    return module
+
+
+def _same_values(expected: pd.Series, actual: pd.Series) -> pd.Series:
+    """Поэлементное совпадение; в object-колонках сверяю и тип значения (1, 1.0 и '1' — разные)"""
+    if expected.dtype == object:
+        return pd.Series([
+            type(a) is type(b) and (a == b or (a != a and b != b))
+            for a, b in zip(expected, actual)
+        ], index=expected.index)
+    left, right = expected.to_numpy(), actual.to_numpy()
+    if np.issubdtype(left.dtype, np.floating):
+        # Сравниваю битовые представления: 0.1 + 0.2 и 0.3 здесь разные числа
+        return pd.Series((left.view(f"u{left.itemsize}") == right.view(f"u{right.itemsize}")) | (np.isnan(left) & np.isnan(right)),
+                         index=expected.index)
+    return pd.Series(left == right, index=expected.index)
+
+
+def compare_frames(expected: pd.DataFrame, actual: pd.DataFrame, case: str):
+    """AssertionError с первым расхождением: столбцы, dtype или значение"""
+    assert list(expected.columns) == list(actual.columns), \
+        f"{case}: столбцы {list(expected.columns)} != {list(actual.columns)}"
+    assert expected.index.equals(actual.index), f"{case}: индекс отличается"
+    for column in expected.columns:
+        left, right = expected[column], actual[column]
+        assert left.dtype == right.dtype, f"{case}: {column}: dtype {left.dtype} != {right.dtype}"
+        same = _same_values(left, right)
+        if not same.all():
+            row = same.index[~same.to_numpy()][0]
+            raise AssertionError(f"{case}: {column}, строка {row}: {left[row]!r} != {right[row]!r}")
+
+
+def _compact(current, frame: pd.DataFrame) -> pd.DataFrame:
+    """Типы low_memory; category сравниваю как object — порядок категорий не важен"""
+    frame = pd.DataFrame({col: current._compact_column(col, frame[col].to_numpy()) for col in frame.columns},
+                         index=frame.index)
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype(object)
+    return frame
+
+
+def _run(function, df: pd.DataFrame, **kwargs):
+    """Признаки или исключение, которым закончился расчёт"""
+    try:
+        return function(df.copy(), **kwargs)
+    except Exception as e:
+        return e
+
+
+def check_case(baseline, current, df: pd.DataFrame, case: str) -> str:
+    """Сверяю исходную версию с новой в обычном режиме и в low_memory; ok или raises"""
+    expected = _run(baseline._do_preprocessing, df)
+    if isinstance(expected, Exception):
+        return "raises"
+    for low_memory in (False, True):
+        name = f"{case}, low_memory" if low_memory else case
+        actual = _run(current._do_preprocessing, df, low_memory=low_memory)
+        assert not isinstance(actual, Exception), f"{name}: новая версия падает: {actual!r}"
+        if low_memory:
+            compare_frames(_compact(current, expected), _compact(current, actual), name)
+        else:
+            compare_frames(expected, actual, name)
+    return "ok"
+
+
+def tie_cases(seed: int):
+    """Ничья в моде baths: два значения поровну, в разном порядке и разной записи"""
+    base = make_listings(6, seed=seed)
+    for baths in (['3', '2', '2 ba', '3 Baths', '12', None],
+                  ['2', '3 Baths', '3', '2 ba', '--', ''],
+                  ['1,5', '1.5 Baths', '4', '4', 'Semi-Mod', '1.5']):
+        df = base.copy()
+        df['baths'] = baths
+        yield f"ничья baths {baths}", df
+
+
+def coercion_cases(seed: int):
+    """Все homeFacts и schools пустые или битые, и целые значения без пропусков"""
+    yield "все homeFacts/schools битые", make_listings(20, seed=seed, broken_share=1.0)
+    df = make_listings(20, seed=seed, broken_share=0.0)
+    df['sqft'] = '2900'
+    df['beds'] = '4'
+    df['stories'] = '2.0'
+    yield "целые sqft/beds/stories", df
+
+
+def freeze_cases():
+    """Случаи для замороженных ожидаемых выходов: маленькие пакеты, ничьи и приведение типов"""
+    for seed in range(3):
+        for size in (1, 5, 40):
+            yield f"seed {seed}, {size} строк", make_listings(size, seed=seed)
+    yield from tie_cases(0)
+    yield from coercion_cases(0)
+
+
+def _encode(frame: pd.DataFrame) -> dict:
+    """Столбцы, dtype и значения; category — значениями, float32 — точными float"""
+    return {
+        "columns": list(frame.columns),
+        "dtypes": [str(dtype) for dtype in frame.dtypes],
+        "values": [frame[col].astype(object).tolist() if isinstance(frame[col].dtype, pd.CategoricalDtype)
+                   else frame[col].tolist() for col in frame.columns],
+    }
+
+
+def freeze(baseline, current, path: str) -> int:
+    """Пишу замороженные случаи в path; случаи, на которых исходная версия падает, пропускаю"""
+    cases = []
+    for case, df in freeze_cases():
+        expected = _run(baseline._do_preprocessing, df)
+        if isinstance(expected, Exception):
+            continue
+        check_case(baseline, current, df, case)
+        cases.append({
+            "name": case,
+            "input": df.astype(object).where(df.notna(), None).to_dict("records"),
+            "expected": _encode(expected),
+            "low_memory": _encode(current._do_preprocessing(df.copy(), low_memory=True)),
+        })
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"baseline": baseline.__file__, "cases": cases}, f, ensure_ascii=False)
+        f.write("\n")
+    return len(cases)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сверка векторной предобработки с исходной построчной")
+    parser.add_argument("--baseline", default=None, help="Коммит с исходной версией (по умолчанию первый)")
+    parser.add_argument("--baseline-file", default=None, help="Файл с исходной версией вместо git")
+    parser.add_argument("--seeds", type=int, default=5, help="Сколько наборов синтетических объявлений")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Размеры пакетов через запятую")
+    parser.add_argument("--freeze", default=None, help="Записать ожидаемые выходы для pytest в этот JSON")
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings("ignore")
+    import preprocessing
+
+    baseline = load_baseline(args.baseline, args.baseline_file)
+    print(f"Исходная версия: {baseline.__file__}")
+
+    if args.freeze:
+        try:
+            count = freeze(baseline, preprocessing, args.freeze)
+        except AssertionError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ Записано {count} случаев в {args.freeze}")
+        return
+
+    cases = []
+    for seed in range(args.seeds):
+        for size in (int(s) for s in args.sizes.split(",")):
+            cases.append((f"seed {seed}, {size} строк", make_listings(size, seed=seed)))
+        cases.extend(tie_cases(seed))
+        cases.extend(coercion_cases(seed))
+
+    outcomes = {"ok": 0, "raises": 0}
+    try:
+        for case, df in cases:
+            outcomes[check_case(baseline, preprocessing, df, case)] += 1
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Совпадает: {outcomes['ok']} пакетов, ещё {outcomes['raises']} исходная версия не считает")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Пик памяти предобработки: обычный режим против low_memory
+
+    python benchmarks/memory.py --rows 100000
+    python benchmarks/memory.py --input ../notebook/data/data.csv --json
+
+Каждый режим — в свежем процессе. Основная величина — пик выделенной памяти
+за время Preprocessor.transform по tracemalloc (numpy и pandas в нём видны);
+пик RSS процесса — для справки: его часто задаёт уже чтение входа
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+# Код, который выполняется в свежем интерпретаторе
+CHILD = r"""
+import gc, json, resource, sys, tracemalloc
+import pandas as pd
+from preprocessing import Preprocessor
+
+def peak_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт КБ, macOS — байты
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+df = pd.read_pickle(INPUT_PATH)
+preprocessor = Preprocessor(STATE, low_memory=LOW_MEMORY)
+gc.collect()
+tracemalloc.start()
+baseline = tracemalloc.get_traced_memory()[0]
+out = preprocessor.transform(df)
+traced_peak = tracemalloc.get_traced_memory()[1] - baseline
+tracemalloc.stop()
+print(json.dumps({
+    "input_mb": df.memory_usage(deep=True).sum() / 2 ** 20,
+    "output_mb": out.memory_usage(deep=True).sum() / 2 ** 20,
+    "preprocessing_peak_mb": traced_peak / 2 ** 20,
+    "peak_rss_mb": peak_mb(),
+}))
+"""
+
+
+def run_once(input_path, state, low_memory, python):
+    code = f"INPUT_PATH = {input_path!r}\nSTATE = {state!r}\nLOW_MEMORY = {low_memory!r}\n" + CHILD
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    out = subprocess.run([python, "-c", code], env=env, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    return {key: round(value, 1) for key, value in result.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пик памяти предобработки в обычном режиме и в low_memory")
+    parser.add_argument("--rows", type=int, default=100000, help="Строк синтетических объявлений")
+    parser.add_argument("--input", default=None, help="CSV с сырыми столбцами вместо синтетики")
+    parser.add_argument("--python", default=sys.executable, help="Интерпретатор для прогона")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from preprocessing import Preprocessor
+    from synthetic import make_listings
+
+    if args.input:
+        df = pd.read_csv(args.input, low_memory=False)
+    else:
+        df = make_listings(args.rows, seed=args.rows)
+    # Статистики — как у экспортированной модели, чтобы homeFacts тоже разбирался по частям
+    state = Preprocessor().fit(df).state
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "input.pkl")
+        df.to_pickle(input_path)
+        rows = len(df)
+        del df
+        summary = {
+            "rows": rows,
+            "default": run_once(input_path, state, False, args.python),
+            "low_memory": run_once(input_path, state, True, args.python),
+        }
+    summary["peak_reduction"] = round(
+        summary["default"]["preprocessing_peak_mb"] / max(summary["low_memory"]["preprocessing_peak_mb"], 0.1), 2)
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Предобработка {rows:,} строк (вход {summary['default']['input_mb']:.0f} МБ):")
+    for mode in ("default", "low_memory"):
+        result = summary[mode]
+        print(f"  {mode:11} пик предобработки {result['preprocessing_peak_mb']:8.1f} МБ, "
+              f"результат {result['output_mb']:7.1f} МБ, пик RSS процесса {result['peak_rss_mb']:7.1f} МБ")
+    print(f"  пик ниже в {summary['peak_reduction']:.1f} раза")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Путь запроса /predict без модели: разбор JSON, проверка схемой и ответ — до и после
+
+    python benchmarks/request_path.py
+    python benchmarks/request_path.py --payloads 5000 --http --json
+
+Варианты на одних и тех же телах запросов (benchmarks/synthetic.py):
+- pydantic — как было: json.loads, HouseInput.model_validate, model_dump, ответ через
+  PredictionResponse.model_dump_json;
+- lean — сейчас в /predict: fastjson.loads (orjson), validate_house (TypedDict сразу
+  в словарь для предсказателя), ответ словарём через fastjson.dumps;
+- raw — /predict/raw: только разбор и ответ, без проверки схемой.
+Для сравнения — ответ через jsonable_encoder и json.dumps, как у FastAPI по умолчанию.
+--http — ещё p50 /predict и /predict/raw целиком через ASGI-клиент (нужны httpx и модель)
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from synthetic import make_payloads  # noqa: E402
+
+
+def _per_request_us(fn, bodies, repeats: int) -> float:
+    """Лучшее из repeats среднее время на тело, мкс"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for body in bodies:
+            fn(body)
+        elapsed = (time.perf_counter() - start) / len(bodies) * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 2)
+
+
+def bench_request_path(bodies, repeats: int) -> dict:
+    import fastjson
+    from fastapi.encoders import jsonable_encoder
+    from schemas import HouseInput, PredictionResponse, validate_house
+
+    price = 418000.0
+
+    def pydantic_request(body):
+        house = HouseInput.model_validate(json.loads(body)).model_dump(exclude_unset=True)
+        response = PredictionResponse(success=True, predicted_price=price, predicted_price_formatted=f"${price:,.2f}",
+                                      message="Предсказание успешно").model_dump_json(exclude={"profile"})
+        return house, response
+
+    def lean_request(body):
+        house = validate_house(fastjson.loads(body))
+        response = fastjson.dumps({"success": True, "predicted_price": price,
+                                   "predicted_price_formatted": f"${price:,.2f}", "message": "Предсказание успешно"})
+        return house, response
+
+    def raw_request(body):
+        house = fastjson.loads(body)
+        response = fastjson.dumps({"success": True, "predicted_price": price,
+                                   "predicted_price_formatted": f"${price:,.2f}", "message": "Предсказание успешно"})
+        return house, response
+
+    response_model = PredictionResponse(success=True, predicted_price=price, predicted_price_formatted="$418,000.00",
+                                        message="Предсказание успешно")
+    parsed = [json.loads(body) for body in bodies]
+    houses = [HouseInput.model_validate(payload) for payload in parsed]
+    steps = {
+        "parse_json": _per_request_us(json.loads, bodies, repeats),
+        "parse_fastjson": _per_request_us(fastjson.loads, bodies, repeats),
+        "validate_model": _per_request_us(HouseInput.model_validate, parsed, repeats),
+        "model_dump": _per_request_us(lambda house: house.model_dump(exclude_unset=True), houses, repeats),
+        "validate_house": _per_request_us(validate_house, parsed, repeats),
+        "response_jsonable_encoder": _per_request_us(lambda _: json.dumps(jsonable_encoder(response_model)),
+                                                     bodies, repeats),
+    }
+    return {
+        "orjson": fastjson.orjson is not None,
+        "steps_us": steps,
+        "request_us": {
+            "pydantic": _per_request_us(pydantic_request, bodies, repeats),
+            "lean": _per_request_us(lean_request, bodies, repeats),
+            "raw": _per_request_us(raw_request, bodies, repeats),
+        },
+    }
+
+
+async def _bench_http(payloads, requests: int) -> dict:
+    import httpx
+    import app as service
+
+    results = {}
+    async with service.lifespan(service.app):
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for path in ("/predict", "/predict/raw"):
+                latencies = []
+                for i in range(requests):
+                    content = json.dumps(payloads[i % len(payloads)])
+                    start = time.perf_counter()
+                    response = await client.post(path, content=content, headers={"Content-Type": "application/json"})
+                    latencies.append(time.perf_counter() - start)
+                    response.raise_for_status()
+                results[path] = round(statistics.median(latencies) * 1000, 3)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Разбор, проверка и ответ /predict: pydantic против облегчённого пути")
+    parser.add_argument("--payloads", type=int, default=2000, help="Тел запросов")
+    parser.add_argument("--repeats", type=int, default=5, help="Повторов, берётся лучший")
+    parser.add_argument("--http", action="store_true", help="Ещё p50 /predict и /predict/raw через ASGI-клиент")
+    parser.add_argument("--requests", type=int, default=500, help="Запросов на эндпоинт для --http")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    args = parser.parse_args(argv)
+
+    payloads = make_payloads(args.payloads, seed=7)
+    bodies = [json.dumps(payload).encode() for payload in payloads]
+    summary = dict(payloads=len(bodies), body_bytes=round(statistics.mean(map(len, bodies))),
+                   **bench_request_path(bodies, args.repeats))
+    request_us = summary["request_us"]
+    summary["speedup"] = round(request_us["pydantic"] / request_us["lean"], 2)
+
+    if args.http:
+        # Кэш выключен, чтобы каждый запрос доходил до модели; батчинг не ждёт добора пакета
+        os.environ.update(PREDICT_RAW="1", PREDICT_CACHE_SIZE="0", PREDICT_BATCHING="0", WARMUP_ROUNDS="1")
+        summary["http_p50_ms"] = asyncio.run(_bench_http(payloads, args.requests))
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{summary['payloads']:,} тел по {summary['body_bytes']} байт, orjson: {'да' if summary['orjson'] else 'нет'}")
+    for name, value in summary["steps_us"].items():
+        print(f"  {name:26} {value:8.2f} мкс")
+    for name, value in request_us.items():
+        print(f"  запрос {name:19} {value:8.2f} мкс")
+    print(f"  облегчённый путь быстрее в {summary['speedup']:.1f} раза")
+    for path, value in summary.get("http_p50_ms", {}).items():
+        print(f"  p50 {path:22} {value:8.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Замер холодного старта сервиса: импорт, загрузка модели и первое предсказание
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --model models/housing_model.json --json
+
+Каждый прогон — новый интерпретатор, как при старте контейнера.
+Дополнительно вывожу тяжёлые модули, которые оказались импортированы
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Модули, которых не должно быть в процессе сервиса при нативной модели
+HEAVY_MODULES = ["sklearn", "joblib", "matplotlib", "plotly", "seaborn", "xgboost", "graphviz"]
+
+# Код, который выполняется в свежем интерпретаторе
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+from predictor import HousePricePredictor
+from schemas import HouseInput, validate_house
+predictor = HousePricePredictor(MODEL_PATH)
+t2 = time.perf_counter()
+house = validate_house(HouseInput.model_config["json_schema_extra"]["example"])
+predictor.predict(house)
+t3 = time.perf_counter()
+predictor.predict(house)
+t4 = time.perf_counter()
+print(json.dumps({
+    "import_s": t1 - t0,
+    "model_load_s": t2 - t1,
+    "first_prediction_s": t3 - t2,
+    "second_prediction_s": t4 - t3,
+    "heavy_modules": [m for m in HEAVY_MODULES if m in sys.modules],
+}))
+"""
+
+
+def run_once(model_path, python):
+    code = f"MODEL_PATH = {model_path!r}\nHEAVY_MODULES = {HEAVY_MODULES!r}\n" + CHILD
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, MODEL_PRELOAD="0")
+    start = time.perf_counter()
+    out = subprocess.run([python, "-c", code], env=env, capture_output=True, text=True, check=True)
+    total = time.perf_counter() - start
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    # От запуска процесса до готового первого предсказания, включая старт интерпретатора
+    result["time_to_first_prediction_s"] = total - result["second_prediction_s"]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер времени старта сервиса")
+    parser.add_argument("--runs", type=int, default=5, help="Сколько свежих процессов запустить")
+    parser.add_argument("--model", default=None, help="Путь к модели (по умолчанию — автопоиск)")
+    parser.add_argument("--python", default=sys.executable, help="Интерпретатор для прогона")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    args = parser.parse_args(argv)
+
+    runs = [run_once(args.model, args.python) for _ in range(args.runs)]
+    keys = ["import_s", "model_load_s", "first_prediction_s", "second_prediction_s", "time_to_first_prediction_s"]
+    summary = {key: round(statistics.median(run[key] for run in runs), 4) for key in keys}
+    summary["runs"] = args.runs
+    summary["heavy_modules"] = sorted({m for run in runs for m in run["heavy_modules"]})
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Медиана по {args.runs} прогонам:")
+    print(f"  импорт app:                 {summary['import_s'] * 1000:8.1f} мс")
+    print(f"  загрузка модели:            {summary['model_load_s'] * 1000:8.1f} мс")
+    print(f"  первое предсказание:        {summary['first_prediction_s'] * 1000:8.1f} мс")
+    print(f"  второе предсказание:        {summary['second_prediction_s'] * 1000:8.1f} мс")
+    print(f"  от запуска до предсказания: {summary['time_to_first_prediction_s'] * 1000:8.1f} мс")
+    print(f"  тяжёлые модули:             {', '.join(summary['heavy_modules']) or 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Набор замеров: предобработка, модель и HTTP /predict на синтетических объявлениях
+
+    python benchmarks/suite.py --output bench.json
+    python benchmarks/suite.py --sizes 1,100,10000 --model models/housing_model.json --output bench.json
+    python benchmarks/suite.py --output new.json --compare old.json
+
+Предобработка — строк/с на пакетах 1, 100, 10k и 377k строк (размер полного датасета),
+модель — задержка одной строки и строк/с на пакете, HTTP — p50/p99 /predict
+при одновременных запросах через ASGI-клиент в том же процессе (нужен httpx).
+Результат пишется в JSON, чтобы сравнивать прогоны между собой
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from synthetic import make_listings, make_payloads  # noqa: E402
+
+DEFAULT_SIZES = "1,100,10000,377000"
+
+
+def _percentiles(latencies_s) -> dict:
+    """p50/p99/среднее в миллисекундах"""
+    ms = np.asarray(latencies_s) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def bench_preprocessing(sizes, repeats: int, train_rows: int) -> dict:
+    """Строк/с Preprocessor.transform на пакетах разного размера"""
+    from preprocessing import Preprocessor
+
+    preprocessor = Preprocessor().fit(make_listings(train_rows, seed=0))
+    # Прогрев: импорт, словари категорий для значений из пулов
+    preprocessor.transform(make_listings(1000, seed=1))
+
+    results = {}
+    for size in sizes:
+        frame = make_listings(size, seed=size)
+        # Большие пакеты считаю один раз — иначе прогон идёт десятки минут
+        runs = repeats if size <= 10000 else 1
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            preprocessor.transform(frame)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results[str(size)] = {
+            "rows": size,
+            "runs": runs,
+            "best_s": round(best, 6),
+            "median_s": round(statistics.median(timings), 6),
+            "rows_per_sec": round(size / best, 1),
+        }
+        print(f"  предобработка {size:>7} строк: {size / best:12,.0f} строк/с", file=sys.stderr)
+    return results
+
+
+def bench_model(predictor, rows: int, batch_rows: int) -> dict:
+    """Задержка predict на одной строке и строк/с predict_frame"""
+    payloads = make_payloads(rows, seed=2)
+    predictor.predict(payloads[0])
+
+    latencies = []
+    for house in payloads:
+        start = time.perf_counter()
+        predictor.predict(house)
+        latencies.append(time.perf_counter() - start)
+
+    frame = make_listings(batch_rows, seed=3)
+    start = time.perf_counter()
+    predictor.predict_frame(frame)
+    batch_s = time.perf_counter() - start
+
+    result = {
+        "single_row": dict(_percentiles(latencies), rows=rows),
+        "batch": {"rows": batch_rows, "seconds": round(batch_s, 6), "rows_per_sec": round(batch_rows / batch_s, 1)},
+    }
+    print(f"  модель, одна строка: p50 {result['single_row']['p50_ms']:.2f} мс, "
+          f"p99 {result['single_row']['p99_ms']:.2f} мс; пакет {batch_rows}: "
+          f"{result['batch']['rows_per_sec']:,.0f} строк/с", file=sys.stderr)
+    return result
+
+
+def _require_httpx():
+    """httpx нужен только для HTTP-замера, поэтому импортирую его по требованию"""
+    try:
+        import httpx
+        return httpx
+    except ImportError:
+        raise SystemExit("❌ Для HTTP-замера нужен httpx: pip install httpx (или запустите с --skip-http)")
+
+
+async def _bench_http(predictor, requests: int, concurrency: int) -> dict:
+    httpx = _require_httpx()
+    import app as service
+
+    # Сервис берёт уже загруженную модель — lifespan только поднимает пул и батчер
+    service.predictor = predictor
+    payloads = make_payloads(requests, seed=4)
+    latencies = []
+    statuses = {}
+
+    async with service.lifespan(service.app):
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/predict", json=payloads[0])
+            queue = asyncio.Queue()
+            for house in payloads:
+                queue.put_nowait(house)
+
+            async def worker():
+                while not queue.empty():
+                    house = queue.get_nowait()
+                    start = time.perf_counter()
+                    response = await client.post("/predict", json=house)
+                    latencies.append(time.perf_counter() - start)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+    return dict(
+        _percentiles(latencies),
+        requests=requests,
+        concurrency=concurrency,
+        seconds=round(elapsed, 6),
+        requests_per_sec=round(requests / elapsed, 1),
+        status_codes={str(code): count for code, count in sorted(statuses.items())},
+    )
+
+
+def bench_http(predictor, requests: int, concurrency: int) -> dict:
+    """p50/p99 /predict при concurrency одновременных клиентах"""
+    result = asyncio.run(_bench_http(predictor, requests, concurrency))
+    print(f"  /predict x{concurrency}: p50 {result['p50_ms']:.2f} мс, p99 {result['p99_ms']:.2f} мс, "
+          f"{result['requests_per_sec']:,.0f} запросов/с, коды {result['status_codes']}", file=sys.stderr)
+    return result
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(data: dict, prefix: str = "") -> dict:
+    """Числовые значения вложенного JSON в виде {"a.b.c": value}"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old: dict, new: dict):
+    """Печатаю метрики скорости и задержки двух прогонов и их отношение"""
+    old_flat = _flatten(old.get("results", {}))
+    new_flat = _flatten(new.get("results", {}))
+    print(f"Сравнение с прогоном {old.get('meta', {}).get('git_commit')} от {old.get('meta', {}).get('timestamp')}:")
+    for key, value in new_flat.items():
+        if not key.endswith(("_per_sec", "_ms")) or not old_flat.get(key):
+            continue
+        ratio = value / old_flat[key]
+        print(f"  {key:45} {old_flat[key]:>14,.2f} → {value:>14,.2f}  (x{ratio:.2f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры предобработки, модели и HTTP /predict")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Размеры пакетов для предобработки через запятую")
+    parser.add_argument("--repeats", type=int, default=5, help="Повторов для пакетов до 10k строк")
+    parser.add_argument("--train-rows", type=int, default=5000, help="Строк для Preprocessor.fit")
+    parser.add_argument("--model", default=None, help="Путь к модели (по умолчанию — автопоиск)")
+    parser.add_argument("--model-rows", type=int, default=500, help="Строк для замера задержки модели")
+    parser.add_argument("--batch-rows", type=int, default=10000, help="Размер пакета для predict_frame")
+    parser.add_argument("--requests", type=int, default=2000, help="Запросов /predict")
+    parser.add_argument("--concurrency", type=int, default=32, help="Одновременных клиентов /predict")
+    parser.add_argument("--skip-model", action="store_true", help="Только предобработка")
+    parser.add_argument("--skip-http", action="store_true", help="Без HTTP-замера")
+    parser.add_argument("-o", "--output", default=None, help="Куда записать JSON (по умолчанию — stdout)")
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s", stream=sys.stderr)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = {"preprocessing": bench_preprocessing(sizes, args.repeats, args.train_rows)}
+
+    model_info = None
+    if not args.skip_model:
+        from predictor import HousePricePredictor
+
+        # Кэш выключен: замеряю саму предобработку и модель
+        predictor = HousePricePredictor(args.model, cache_size=0)
+        info = predictor.get_model_info()
+        model_info = dict({key: info.get(key) for key in ("model_format", "preprocessing_version", "preprocessing_fitted")},
+                          model_path=predictor.model_path)
+        results["model"] = bench_model(predictor, args.model_rows, args.batch_rows)
+        if not args.skip_http:
+            results["http"] = bench_http(predictor, args.requests, args.concurrency)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": model_info,
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"✅ Результат записан в {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
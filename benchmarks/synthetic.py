@@ -0,0 +1,159 @@
+"""
+Синтетические объявления в формате сырых столбцов датасета
+
+    from synthetic import make_listings, make_payloads
+    df = make_listings(10000, seed=1)        # как notebook/data/data.csv
+    train = make_listings(10000, seed=1, with_target=True)   # с ценой в колонке target
+    houses = make_payloads(100, seed=2)      # тела запросов /predict
+
+Значения грязные, как в выгрузке: "3 Baths", "1,947 sqft", "3 or more",
+homeFacts и schools — repr питоновских структур, часть строк пустая или битая
+"""
+import random
+from typing import Any, Dict, List
+
+import pandas as pd
+
+STATUS = ['Active', 'for sale', 'For sale', 'Pending', 'pending', 'Under Contract', 'Contingent',
+          'Auction', 'Foreclosure', 'Pre-foreclosure', 'New', 'Coming soon: Nov 21.', 'Price Change',
+          'Back on Market', 'sold', 'Closed', 'For rent', 'Option Pending', 'C', 'P', 'U', 'X', '', None]
+PROPERTY_TYPE = ['Single Family Home', 'single-family home', 'condo', 'Condo/Townhome/Row Home/Co-Op',
+                 'townhouse', 'Multi-Family', 'lot/land', 'Land', 'Apartment', 'Coop', 'High Rise',
+                 'Mobile / Manufactured', 'Farms/Ranches', 'Ranch', 'Traditional', 'Colonial',
+                 'Contemporary', 'Cape Cod', '2 Stories', 'Detached, One Story', 'Other', '', None]
+STREET = ['240 Heather Ln', '1 Main St', '12 Oak Ave', 'Address Not Disclosed', 'Undisclosed Address',
+          '(undisclosed Address)', 'Address Not Available', 'Unknown Address', None]
+BATHS = ['3.5', '3 Baths', '2', '2 ba', '1,5', 'Bathrooms: 2', '1.5 Baths', '3.5+', '4', '12',
+         '0', '~', '--', 'Semi-Mod', '', None]
+SQFT = ['2900', '1,947 sqft', 'Total interior livable area: 2,000 sqft', '7,500 sqft', '850', '12000',
+        '--', '', None]
+BEDS = ['4', '3 Beds', '2 bd', '3 or more', 'Studio', '10', 'Baths', '1,000 sqft', '0.5 acres', '', None]
+STORIES = ['2.0', '1', '3', 'Two', 'one story', 'Ranch', '2 Level, Site Built', 'tri-level', 'mid-rise',
+           'High-Rise', 'Split Level', '1.5 Story', 'Condominium', '', None]
+FIREPLACE = ['Gas Logs', 'yes', 'Wood Burning', '1', '2', 'Fireplace', 'Electric', 'Living Room',
+             'Family Room, Living Room', 'Master Bedroom', 'Great Room', 'decorative', 'pellet stove',
+             'Two', 'Not Applicable', 'Basement', '', None]
+CITY = ['Southern Pines', 'new york', 'Los Angeles', 'HOUSTON', 'Dallas', 'San Francisco', 'Miami',
+        'Arlington', 'el paso', '', None]
+STATE = ['NC', 'NY', 'CA', 'TX', 'FL', 'WA', 'PA', 'TN', 'OH', 'IL']
+POOL = ['yes', 'Yes', None]
+
+YEAR = ['1920', '1965', '1999', '2005', '2019', 'No Data', '', '—']
+HEATING = ['Forced Air', 'Forced air, Heat pump', 'Heat Pump', 'Central', 'Electric', 'Gas', 'Baseboard',
+           'Radiant', 'Hot Water', 'Other', 'No Data', '']
+COOLING = ['Central Air', 'Central A/C', 'Central', 'Central Electric', 'Refrigeration', 'Evaporative',
+           'Window Unit', 'Wall Unit', 'Has Cooling', 'None', 'No Data', '']
+PARKING = ['Attached Garage', 'Detached Garage', 'Carport', 'Off Street', 'On Street', 'Driveway',
+           '1', '2', '3', 'None', 'No Data', '']
+LOTSIZE = ['680 sqft', '0.25 acres', '1 acre', '5,000 sq. ft.', '7500', '2.5 Acres', '12,000 sqft',
+           'No Data', '', '—']
+PRICE_SQFT = ['$233/sqft', '$120/sqft', '$560 / Sq. Ft.', 'No Data']
+
+RATING = ['2', '4', '7', '9', '10', '4/10', '8/10', 'NR', 'None', '']
+DISTANCE = ['0.4 mi', '0.9 mi', '1.0mi', '2.0 mi', '5.6 mi', '12 mi', '']
+GRADES = ['PK-5', 'K-5', 'PK-6', '6-8', '7-8', '9-12', '10-12', 'K-12', 'PK-12', '6-12', '3–5', 'K-8', 'N/A']
+SCHOOL_NAMES = ['Roosevelt Elementary School', 'Lincoln Intermediate School', 'Mason City High School',
+                'Jefferson Middle School', 'Harvest Academy', 'City Charter', 'Washington Preparatory',
+                'Kennedy Junior High', 'Montessori Magnet', 'Oak Vocational']
+
+# Цена: база по городу, множители по типу дома и бассейну, формат как в выгрузке
+CITY_PRICE = {'new york': 900000, 'Los Angeles': 850000, 'San Francisco': 1200000, 'Miami': 450000}
+PRICE_FORMATS = ['${:,}', '{}', '${:,}+', '$ {:,}']
+
+FACTS = [('Year built', YEAR), ('Remodeled year', YEAR), ('Heating', HEATING), ('Cooling', COOLING),
+         ('Parking', PARKING), ('lotsize', LOTSIZE), ('Price/sqft', PRICE_SQFT)]
+
+
+def _pick(rng: random.Random, values: list):
+    return values[rng.randrange(len(values))]
+
+
+def _home_facts(rng: random.Random) -> Dict[str, List[Dict[str, str]]]:
+    """homeFacts: часть фактов может отсутствовать"""
+    return {'atAGlanceFacts': [{'factValue': _pick(rng, pool), 'factLabel': label}
+                               for label, pool in FACTS if rng.random() < 0.9]}
+
+
+def _schools(rng: random.Random) -> List[Dict[str, Any]]:
+    """schools: до трёх записей, в каждой списки рейтингов, расстояний, классов и названий"""
+    schools = []
+    for _ in range(rng.randrange(0, 4)):
+        k = rng.randrange(1, 8)
+        schools.append({
+            'rating': [_pick(rng, RATING) for _ in range(k)],
+            'data': {'Distance': [_pick(rng, DISTANCE) for _ in range(k)],
+                     'Grades': [_pick(rng, GRADES) for _ in range(k)]},
+            'name': [_pick(rng, SCHOOL_NAMES) for _ in range(k)],
+        })
+    return schools
+
+
+def _listing(rng: random.Random, i: int) -> Dict[str, Any]:
+    """Одно объявление: плоские поля как в выгрузке, вложенные — структурами"""
+    return {
+        'status': _pick(rng, STATUS),
+        'private pool': _pick(rng, POOL),
+        'propertyType': _pick(rng, PROPERTY_TYPE),
+        'street': _pick(rng, STREET),
+        'baths': _pick(rng, BATHS),
+        'homeFacts': _home_facts(rng),
+        'fireplace': _pick(rng, FIREPLACE),
+        'city': _pick(rng, CITY),
+        'schools': _schools(rng),
+        'sqft': _pick(rng, SQFT),
+        'zipcode': f'{rng.randrange(10000, 99999)}',
+        'beds': _pick(rng, BEDS),
+        'state': _pick(rng, STATE),
+        'stories': _pick(rng, STORIES),
+        'mls-id': None,
+        'PrivatePool': _pick(rng, POOL),
+        'MlsId': str(i),
+    }
+
+
+def _target(rng: random.Random, row: Dict[str, Any]):
+    """Цена объявления строкой: зависит от города, типа дома, бассейна и числа ванных"""
+    price = CITY_PRICE.get(row['city'], 300000)
+    if 'condo' in str(row['propertyType']).lower():
+        price *= 0.7
+    if row['PrivatePool'] or row['private pool']:
+        price *= 1.2
+    if row['baths'] in ('3.5', '3 Baths', '3.5+', '4'):
+        price *= 1.4
+    price = int(price * rng.lognormvariate(0, 0.4)) // 100 * 100
+    if rng.random() < 0.01:
+        return None
+    return _pick(rng, PRICE_FORMATS).format(price)
+
+
+def make_listings(n: int, seed: int = 0, broken_share: float = 0.02, with_target: bool = False) -> pd.DataFrame:
+    """
+    n объявлений как в сыром CSV: homeFacts и schools — repr структур.
+    broken_share — доля пустых и неразбираемых homeFacts/schools.
+    with_target — добавить колонку target (цена строкой, ~1% пропусков);
+    остальные колонки от неё не меняются
+    """
+    rng = random.Random(seed)
+    target_rng = random.Random(f"{seed}-target")
+    rows = []
+    for i in range(n):
+        row = _listing(rng, i)
+        for field in ('homeFacts', 'schools'):
+            r = rng.random()
+            if r < broken_share / 2:
+                row[field] = None
+            elif r < broken_share:
+                row[field] = 'garbage{'
+            else:
+                row[field] = repr(row[field])
+        if with_target:
+            row['target'] = _target(target_rng, row)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def make_payloads(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """n тел запросов /predict по схеме HouseInput: пропуски — null, вложенные поля — JSON"""
+    rng = random.Random(seed)
+    return [_listing(rng, i) for i in range(n)]
+
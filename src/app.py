@@ -1,56 +1,264 @@
-# FIX для joblib: нужно определить _do_preprocessing в __main__ перед загрузкой модели
-import sys
-import types
-
-# Создаю или получаем модуль __main__
-if '__main__' not in sys.modules:
-    sys.modules['__main__'] = types.ModuleType('__main__')
-
-# Импортирую функцию из preprocessing
-try:
-    from preprocessing import _do_preprocessing
-    # Копирую её в __main__ модуль
-    sys.modules['__main__']._do_preprocessing = _do_preprocessing
-    print("✅ _do_preprocessing зарегистрирована в __main__")
-except ImportError as e:
-    print(f"⚠️ Не удалось импортировать _do_preprocessing: {e}")
-
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+import asyncio
+import gc
+import hmac
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Dict, Optional
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from pydantic.json_schema import models_json_schema
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
-from datetime import datetime
 
+import bulk
+import columnar
+import fastjson
+import profiling
+from batching import MicroBatcher
+import telemetry
+from parsers import parse_stats
 from predictor import HousePricePredictor
-from schemas import HouseInput, PredictionResponse
+from registry import ModelRegistry, ModelReloader
+from telemetry import ERRORS, REQUEST_SECONDS, STAGE_SECONDS
+from workers import PoolSaturated, PredictionPool, PredictionTimeout
+from schemas import HouseInput, PredictionResponse, validate_house
+from warmup import cache_bypassed, load_samples, warm_up
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Загружать модель при импорте модуля: под gunicorn --preload (см. gunicorn.conf.py) это
+# происходит один раз в мастере, и воркеры после fork делят страницы модели copy-on-write
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "0") == "1"
+
+# Кэш предсказаний по строке признаков: 0 — выключен
+CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE", "10000"))
+CACHE_TTL_S = float(os.getenv("PREDICT_CACHE_TTL_S", "3600"))
+
+# Компактная предобработка пакетов: category и float32 вместо object и float64
+LOW_MEMORY = os.getenv("PREPROCESS_LOW_MEMORY", "0") == "1"
+# Процессов для предобработки больших пакетов по частям; 0 — в одном процессе
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", "0"))
+
+# Пул, в котором считаются предсказания: thread или process
+POOL_MODE = os.getenv("PREDICT_POOL", "thread")
+POOL_WORKERS = int(os.getenv("PREDICT_WORKERS", "0")) or None
+POOL_QUEUE_SIZE = int(os.getenv("PREDICT_QUEUE_SIZE", "64"))
+PREDICT_TIMEOUT_S = float(os.getenv("PREDICT_TIMEOUT_S", "10"))
+
+# Настройки микробатчинга /predict
+BATCHING_ENABLED = os.getenv("PREDICT_BATCHING", "1") == "1"
+BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "5"))
+BATCH_QUEUE_SIZE = int(os.getenv("PREDICT_BATCH_QUEUE_SIZE", "512"))
+
+# /predict/raw — объявление без проверки схемой, только для доверенных внутренних клиентов
+PREDICT_RAW_ENABLED = os.getenv("PREDICT_RAW", "0") == "1"
+
+INTERVALS_DESCRIPTION = "Добавить интервал цены price_low/price_high (виртуальный ансамбль CatBoost)"
+
+# Настройки /predict/batch: размер куска и сколько тела держу в памяти до сброса на диск
+BULK_CHUNK_SIZE = int(os.getenv("PREDICT_BATCH_CHUNK_SIZE", "1000"))
+BULK_SPOOL_MAX_BYTES = int(os.getenv("PREDICT_BATCH_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Реестр версий модели (см. registry.py): без него — одна модель из models/
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "")
+# Как часто проверять реестр на новую версию; 0 — только через /admin/models
+MODEL_REGISTRY_POLL_S = float(os.getenv("MODEL_REGISTRY_POLL_S", "10"))
+# Токен для /admin/models (заголовок X-Admin-Token); без него эндпоинты выключены
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+
+# Прогрев перед приёмом трафика (см. warmup.py): проходов, строк в пакете и свой файл образцов;
+# WARMUP_ROUNDS=0 — готов сразу после загрузки
+WARMUP_ROUNDS = int(os.getenv("WARMUP_ROUNDS", "3"))
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", "32"))
+WARMUP_SAMPLES_PATH = os.getenv("WARMUP_SAMPLES", "")
+
 # Глобальный объект предсказателя
 predictor = None
+# Пул потоков/процессов для CPU-работы
+pool = None
+# Сборщик одновременных запросов в пакеты (пакет — на одну модель и с интервалом или без)
+batcher = None
+# Реестр версий и загрузчик новых версий в фоне
+model_registry = ModelRegistry(MODEL_REGISTRY_DIR) if MODEL_REGISTRY_DIR else None
+reloader = None
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Обработчик жизненного цикла приложения"""
-    global predictor
+warmup_samples = load_samples(WARMUP_SAMPLES_PATH)
+# Отчёт прогрева; готовность к трафику — модель загружена, прогрета и сервис не останавливается
+warmup_report = None
+warmed_up = False
+shutting_down = False
+
+
+def create_predictor(model_path: Optional[str] = None, version: Optional[str] = None) -> HousePricePredictor:
+    return HousePricePredictor(model_path, cache_size=CACHE_SIZE, cache_ttl_s=CACHE_TTL_S, low_memory=LOW_MEMORY,
+                               preprocess_workers=PREPROCESS_WORKERS, version=version)
+
+
+def load_predictor():
+    """Загружаю модель (из реестра — версию, которую он велит); None — если не получилось"""
     try:
-        predictor = HousePricePredictor()
-        logger.info("✅ Модель загружена")
+        if model_registry is None:
+            loaded = create_predictor()
+        else:
+            version = model_registry.target()
+            if version is None:
+                raise FileNotFoundError(f"В реестре {MODEL_REGISTRY_DIR} нет версий модели")
+            loaded = create_predictor(model_registry.model_path(version), version)
+        logger.info(f"✅ Модель загружена{f' (версия {loaded.version})' if loaded.version else ''}")
+        return loaded
     except Exception as e:
         logger.error(f"❌ Ошибка загрузки модели: {e}")
-        predictor = None
+        return None
+
+
+def warm_predictor(loaded: HousePricePredictor, rounds: int = WARMUP_ROUNDS) -> dict:
+    return warm_up(loaded, warmup_samples, rounds, WARMUP_BATCH_SIZE)
+
+
+if MODEL_PRELOAD:
+    predictor = load_predictor()
+    # Прогреваю ещё в мастере: компиляция регулярок и инициализация моделей достанутся воркерам готовыми
+    if predictor is not None and WARMUP_ROUNDS:
+        try:
+            warm_predictor(predictor)
+        except Exception as e:
+            logger.error(f"❌ Прогрев в мастере не удался: {e}")
+    # Убираю загруженные объекты из-под сборщика мусора: его проходы пишут в заголовки
+    # объектов и иначе постепенно копируют общие страницы в каждый воркер
+    gc.freeze()
+    logger.info(f"✅ Модель предзагружена в процессе {os.getpid()}")
+
+
+async def run_batch(items: list, key: tuple) -> list:
+    """
+    Пакет микробатчинга; key — (модель, взятая запросами в начале, нужен ли интервал).
+    Места в пуле пакет ждёт: лишние запросы отклоняет сам батчер по PREDICT_BATCH_QUEUE_SIZE,
+    а не пул весь пакет сразу
+    """
+    current, intervals = key
+    return await pool.predict_chunk(items, wait=True, predictor=current, intervals=intervals)
+
+
+async def activate_predictor(loaded: HousePricePredictor):
+    """
+    Делаю загруженную модель текущей. Обработчики берут глобальный predictor в начале
+    запроса, пул — в момент отправки задачи, поэтому начатые запросы доживают на старой
+    """
+    global predictor, pool, batcher
+    if pool is None:
+        pool = PredictionPool(loaded, POOL_MODE, POOL_WORKERS, POOL_QUEUE_SIZE, PREDICT_TIMEOUT_S)
+        pool.start()
+        if BATCHING_ENABLED:
+            batcher = MicroBatcher(run_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_QUEUE_SIZE)
+            await batcher.start()
+    else:
+        pool.swap_predictor(loaded)
+    predictor = loaded
+
+
+async def activate_warmed(loaded: HousePricePredictor):
+    """Подмена из реестра: ModelReloader уже прогрел версию"""
+    global warmed_up
+    await activate_predictor(loaded)
+    warmed_up = True
+
+
+async def warm_up_service():
+    """
+    Прогрев после старта, в фоне: liveness уже отвечает, а readiness — только после него.
+    Сначала модель напрямую (в потоке), потом пакет через пул — заводятся его потоки,
+    а процессы пула, созданные fork, получают уже прогретую модель
+    """
+    global warmup_report, warmed_up
+    try:
+        report = await run_in_threadpool(warm_predictor, predictor)
+        if WARMUP_ROUNDS and warmup_samples:
+            start = time.perf_counter()
+            # Потоки пула считают той же моделью — мимо её кэша. Процессы пула создаются
+            # этим же проходом и унаследовали бы выключенный кэш, их кэш не трогаю
+            with cache_bypassed(predictor) if pool.mode == "thread" else nullcontext():
+                for _, error in await pool.predict_chunk(warmup_samples, wait=True):
+                    if error is not None:
+                        raise error
+            report["pool_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        warmup_report = report
+        warmed_up = True
+        logger.info("✅ Сервис готов принимать трафик")
+    except Exception as e:
+        warmup_report = {"error": str(e)}
+        logger.error(f"❌ Прогрев не удался, сервис не готов: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Обработчик жизненного цикла приложения"""
+    global predictor, pool, batcher, reloader, shutting_down
+    if predictor is None:
+        predictor = load_predictor()
+
+    warmup_task = None
+    if predictor is not None:
+        await activate_predictor(predictor)
+        warmup_task = asyncio.create_task(warm_up_service())
+
+    if model_registry is not None:
+        # Новую версию проверяю хотя бы одним проходом, даже если прогрев при старте выключен
+        reloader = ModelReloader(model_registry, create_predictor, activate_warmed,
+                                 lambda loaded: warm_predictor(loaded, max(WARMUP_ROUNDS, 1)),
+                                 MODEL_REGISTRY_POLL_S, predictor.version if predictor is not None else None)
+        reloader.start()
+
     yield
 
+    shutting_down = True
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    if reloader is not None:
+        await reloader.stop()
+        reloader = None
+    if batcher is not None:
+        await batcher.stop()
+        batcher = None
+    if pool is not None:
+        pool.stop()
+        pool = None
+
 
 app = FastAPI(
     title="🏠 House Price Prediction API",
     version="1.0.0",
     docs_url="/docs",
+    # Ответы эндпоинтов, возвращающих словари, собираю через orjson (если он есть)
+    default_response_class=fastjson.JSONResponse,
     lifespan=lifespan
 )
 
+
+
+def custom_openapi():
+    """
+    /predict читает тело сам (чтобы замерять разбор и валидацию отдельно),
+    поэтому схемы HouseInput добавляю в components вручную
+    """
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        _, definitions = models_json_schema([(HouseInput, "validation")],
+                                            ref_template="#/components/schemas/{model}")
+        schema.setdefault("components", {}).setdefault("schemas", {}).update(definitions["$defs"])
+        app.openapi_schema = schema
+    return app.openapi_schema
+
+
+app.openapi = custom_openapi
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -67,35 +275,404 @@ async def root():
         "endpoints": {
             "docs": "/docs",
             "health": "/health",
-            "predict": "/predict"
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
+            "predict": "/predict",
+            "predict_batch": "/predict/batch",
+            "metrics": "/metrics",
+            "models": "/admin/models"
         }
     }
 
 
+def is_ready() -> bool:
+    return bool(predictor and predictor.is_loaded and warmed_up and not shutting_down)
+
+
 @app.get("/health")
 async def health():
     if predictor and predictor.is_loaded:
-        return {"status": "healthy", "model_loaded": True}
-    return {"status": "unhealthy", "model_loaded": False}
+        return {"status": "healthy", "model_loaded": True, "model_version": predictor.version, "ready": is_ready()}
+    return {"status": "unhealthy", "model_loaded": False, "ready": False}
+
+
+@app.get("/health/live")
+async def liveness():
+    """Процесс жив и event loop отвечает; модель не нужна — перезапуск её не загрузит"""
+    return {"status": "alive"}
 
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict_price(house: HouseInput):
-    if not predictor or not predictor.is_loaded:
+@app.get("/health/ready")
+async def readiness():
+    """Можно ли слать трафик: модель загружена и прогрета; иначе 503, чтобы балансировщик подождал"""
+    if is_ready():
+        return {"status": "ready", "model_version": predictor.version, "warmup": warmup_report}
+    if shutting_down:
+        reason = "сервис останавливается"
+    elif not predictor or not predictor.is_loaded:
+        reason = "модель не загружена"
+    elif warmup_report is not None and "error" in warmup_report:
+        reason = f"прогрев не удался: {warmup_report['error']}"
+    else:
+        reason = "идёт прогрев"
+    return fastjson.JSONResponse({"status": "not_ready", "reason": reason}, status_code=503)
+
+
+def _stats_metrics() -> list:
+    """Счётчики пула, кэша, батчера и разбора в формате Prometheus"""
+    lines = []
+    if predictor is not None and predictor.version is not None:
+        lines += telemetry.render_family("house_price_model_info", "gauge", "Активная версия модели",
+                                         [({"version": predictor.version}, 1)])
+    if pool is not None:
+        stats = pool.stats()
+        lines += telemetry.render_family("house_price_pool_in_flight", "gauge", "Задач в пуле сейчас",
+                                         [({}, stats["in_flight"])])
+        lines += telemetry.render_family("house_price_pool_submitted_total", "counter", "Задач отправлено в пул",
+                                         [({}, stats["submitted_total"])])
+        lines += telemetry.render_family("house_price_pool_rejected_total", "counter", "Отказов из-за заполненной очереди",
+                                         [({}, stats["rejected_total"])])
+        lines += telemetry.render_family("house_price_pool_timeouts_total", "counter", "Предсказаний, не уложившихся в таймаут",
+                                         [({}, stats["timeouts_total"])])
+
+    cache = predictor.cache if predictor is not None else None
+    if cache is not None:
+        stats = cache.stats()
+        lines += telemetry.render_family("house_price_cache_lookups_total", "counter", "Обращения к кэшу предсказаний",
+                                         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])])
+        lines += telemetry.render_family("house_price_cache_evictions_total", "counter", "Вытеснено из кэша по размеру",
+                                         [({}, stats["evictions"])])
+        lines += telemetry.render_family("house_price_cache_size", "gauge", "Записей в кэше",
+                                         [({}, stats["size"])])
+
+    if batcher is not None:
+        lines += telemetry.render_histogram("house_price_batch_size", "Размер пакетов микробатчинга /predict",
+                                            batcher.batch_size_counts, batcher.items_total)
+        lines += telemetry.render_family("house_price_batch_rejected_total", "counter",
+                                         "Отказов /predict из-за заполненной очереди микробатчинга",
+                                         [({}, batcher.rejected_total)])
+
+    # В режиме PREDICT_POOL=process разбор идёт в дочерних процессах и сюда не попадает
+    parsing = parse_stats()
+    for key in ("rows", "missing", "failed"):
+        lines += telemetry.render_family(f"house_price_parse_{key}_total", "counter",
+                                         f"Разбор вложенных полей: {key}",
+                                         [({"field": field}, stats[key]) for field, stats in parsing.items()])
+    return lines
+
+
+@app.get("/metrics")
+async def metrics(fmt: str = Query("prometheus", alias="format", pattern="^(prometheus|json)$")):
+    """Метрики в текстовом формате Prometheus; ?format=json — прежняя сводка в JSON"""
+    if fmt == "json":
+        return {
+            "pool": pool.stats() if pool is not None else None,
+            "cache": predictor.cache.stats() if predictor is not None and predictor.cache is not None else {"enabled": False},
+            "batching": batcher.stats() if batcher is not None else {"enabled": False},
+            # В режиме PREDICT_POOL=process разбор идёт в дочерних процессах и сюда не попадает
+            "parsing": parse_stats()
+        }
+    return Response(telemetry.render(_stats_metrics()), media_type=telemetry.CONTENT_TYPE)
+
+
+async def _read_house(request: Request, endpoint: str = "predict", validate: bool = True) -> Dict[str, Any]:
+    """
+    Разбираю тело и проверяю его схемой (validate=False — только разбор, для /predict/raw),
+    замеряя оба этапа; отдаю словарь для предсказателя
+    """
+    body = await request.body()
+
+    with STAGE_SECONDS.time("parse"):
+        try:
+            payload = fastjson.loads(body)
+        except ValueError as e:
+            ERRORS.inc(endpoint, "invalid_json")
+            raise RequestValidationError([{"type": "json_invalid", "loc": ("body", 0),
+                                           "msg": "JSON decode error", "input": {}, "ctx": {"error": str(e)}}])
+
+    if not validate:
+        if not isinstance(payload, dict):
+            ERRORS.inc(endpoint, "validation")
+            raise RequestValidationError([{"type": "dict_type", "loc": ("body",),
+                                           "msg": "Input should be a valid dictionary", "input": payload}])
+        return payload
+
+    with STAGE_SECONDS.time("validation"):
+        try:
+            return validate_house(payload)
+        except ValidationError as e:
+            ERRORS.inc(endpoint, "validation")
+            raise RequestValidationError([dict(error, loc=("body", *error["loc"]))
+                                          for error in e.errors(include_url=False)])
+
+
+async def _predict(request: Request, endpoint: str, validate: bool, intervals: bool = False) -> Response:
+    """
+    Общая часть /predict и /predict/raw: разбор, предсказание в пуле и ответ по схеме PredictionResponse.
+    intervals — добавить price_low/price_high (null, если у модели нет калибровки интервалов)
+    """
+    start = time.perf_counter()
+    # Версия на начало запроса: подмена модели посреди него ответ не меняет
+    current = predictor
+    try:
+        if not current or not current.is_loaded:
+            ERRORS.inc(endpoint, "unavailable")
+            raise HTTPException(status_code=503, detail="Модель не загружена")
+
+        house_data = await _read_house(request, endpoint, validate)
+        # Профиль по заголовку — только если сервис это разрешает (tracemalloc замедляет весь процесс)
+        profile = None
+        profile_mode = request.headers.get("x-profile") if profiling.PROFILE_HEADER_ENABLED else None
+        with_intervals = intervals and current.intervals is not None
+        low = high = None
+        try:
+            if profile_mode in profiling.PROFILE_MODES:
+                # Профиль — про предобработку, интервал в нём не считаю
+                price, profile = await pool.predict_profiled(house_data, memory=profile_mode == "memory",
+                                                             predictor=current)
+            else:
+                # Считает та же модель, чья версия уйдёт в ответ, даже если её подменят посреди запроса.
+                # Без статистик предобработки мода baths и метки homeFacts берутся из пакета —
+                # в общем пакете ответ зависел бы от соседей, поэтому такие модели считают по строке
+                if batcher is not None and current.preprocessor.fitted:
+                    result = await batcher.submit(house_data, key=(current, with_intervals))
+                else:
+                    result = await pool.predict(house_data, predictor=current, intervals=with_intervals)
+                price, low, high = result if with_intervals else (result, None, None)
+        except PoolSaturated as e:
+            ERRORS.inc(endpoint, "saturated")
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+        except PredictionTimeout as e:
+            ERRORS.inc(endpoint, "timeout")
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            ERRORS.inc(endpoint, "prediction")
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Ответ собираю словарём в порядке полей PredictionResponse — без экземпляра модели
+        with STAGE_SECONDS.time("serialization"):
+            content = {
+                "success": True,
+                "predicted_price": price,
+                "predicted_price_formatted": f"${price:,.2f}",
+            }
+            if intervals:
+                content["price_low"] = low
+                content["price_high"] = high
+            content["message"] = "Предсказание успешно"
+            if intervals and low is None:
+                content["message"] += "; интервал цены для этой модели недоступен"
+            if current.version is not None:
+                content["model_version"] = current.version
+            if profile is not None:
+                content["profile"] = profile
+            body = fastjson.dumps(content)
+        return Response(body, media_type="application/json")
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+
+
+@app.post(
+    "/predict",
+    response_model=PredictionResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"$ref": "#/components/schemas/HouseInput"}}},
+        }
+    },
+)
+async def predict_price(request: Request, intervals: bool = Query(False, description=INTERVALS_DESCRIPTION)):
+    return await _predict(request, "predict", validate=True, intervals=intervals)
+
+
+@app.post(
+    "/predict/raw",
+    response_model=PredictionResponse,
+    include_in_schema=PREDICT_RAW_ENABLED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"type": "object", "description": "Сырые столбцы датасета"}}},
+        }
+    },
+)
+async def predict_raw(request: Request, intervals: bool = Query(False, description=INTERVALS_DESCRIPTION)):
+    """
+    Объявление сырыми столбцами датасета без проверки схемой — для доверенных внутренних
+    клиентов, которые сами собирают тело. Все столбцы HouseInput должны быть (пропуск — null).
+    Выключен, пока не задан PREDICT_RAW=1
+    """
+    if not PREDICT_RAW_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return await _predict(request, "predict_raw", validate=False, intervals=intervals)
+
+
+@app.post(
+    "/predict/batch",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/HouseInput"}}},
+                "application/x-ndjson": {"schema": {"type": "string", "description": "Один объект HouseInput на строку"}},
+                "text/csv": {"schema": {"type": "string", "description": "Сырые столбцы датасета с заголовком"}},
+                "application/vnd.apache.arrow.stream": {"schema": {"type": "string", "format": "binary",
+                                                                   "description": "Arrow IPC: сырые столбцы датасета"}},
+                "application/vnd.apache.parquet": {"schema": {"type": "string", "format": "binary",
+                                                              "description": "Parquet: сырые столбцы датасета"}},
+            },
+        }
+    },
+)
+async def predict_batch(
+    request: Request,
+    chunk_size: int = Query(None, ge=1, le=10000, description="Сколько строк считать за один вызов модели"),
+    intervals: bool = Query(False, description=INTERVALS_DESCRIPTION),
+):
+    """
+    Пакетное предсказание: JSON-массив, NDJSON, CSV, Arrow IPC или Parquet на входе.
+    Ответ отдаю потоком по кускам: NDJSON, CSV при Accept: text/csv или поток Arrow IPC
+    (по умолчанию для Arrow и Parquet, для остальных — при Accept: application/vnd.apache.arrow.stream)
+    """
+    current = predictor
+    if not current or not current.is_loaded:
         raise HTTPException(status_code=503, detail="Модель не загружена")
+    if pool.saturated:
+        ERRORS.inc("predict_batch", "saturated")
+        raise HTTPException(status_code=429, detail="Пул предсказаний занят", headers={"Retry-After": "1"})
+
+    fmt = bulk.detect_format(request.headers.get("content-type"))
+    if fmt is None:
+        ERRORS.inc("predict_batch", "unsupported_media_type")
+        raise HTTPException(status_code=415, detail="Поддерживаются application/json, application/x-ndjson, text/csv, "
+                                                    "application/vnd.apache.arrow.stream и application/vnd.apache.parquet")
+    columnar_input = fmt in bulk.COLUMNAR_FORMATS
+    out = bulk.response_format(request.headers.get("accept"), fmt)
+    if (columnar_input or out == "arrow") and not columnar.available():
+        ERRORS.inc("predict_batch", "unsupported_media_type")
+        raise HTTPException(status_code=415, detail="Arrow и Parquet недоступны: на сервере не установлен pyarrow")
+
+    # Тело сначала складываю во временный файл: большой запрос уходит на диск, а не в память,
+    # и чтение тела не пересекается с потоковой отдачей ответа.
+    # Arrow и Parquet — всегда на диск: файл отображаю в память и читаю столбцы без копий
+    if columnar_input:
+        body = tempfile.NamedTemporaryFile(suffix=f".{fmt}")
+    else:
+        body = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_MAX_BYTES)
+    async for part in request.stream():
+        body.write(part)
+    body.flush()
+    body.seek(0)
+
+    size = chunk_size or BULK_CHUNK_SIZE
+    if columnar_input:
+        try:
+            chunks = columnar.iter_frames(await run_in_threadpool(columnar.read_batches, body.name, fmt, size))
+        except ValueError as e:
+            body.close()
+            ERRORS.inc("predict_batch", "validation")
+            raise HTTPException(status_code=422, detail=str(e))
+    else:
+        chunks = bulk.iter_chunks(bulk.iter_records(body, fmt), size)
+
+    # Столбцы границ есть в ответе, если их просили, даже когда модель их не считает (null)
+    with_intervals = intervals and current.intervals is not None
+
+    async def predict_rows(chunk) -> list:
+        # Весь поток считаю версией, с которой он начался
+        if columnar_input:
+            start, frame = chunk
+            try:
+                outcomes = await pool.predict_frame(frame, wait=True, predictor=current, intervals=with_intervals)
+            except PredictionTimeout as e:
+                outcomes = [(None, e)] * len(frame)
+            return bulk.frame_rows(start, outcomes)
+
+        items = [record for _, record, error in chunk if error is None]
+        try:
+            outcomes = await pool.predict_chunk(items, wait=True, predictor=current,
+                                                intervals=with_intervals) if items else []
+        except PredictionTimeout as e:
+            outcomes = [(None, e)] * len(items)
+        return bulk.result_rows(chunk, outcomes)
 
+    def format_rows(rows: list, first: bool):
+        if out == "csv":
+            return bulk.format_csv(rows, header=first, intervals=intervals)
+        if out == "arrow":
+            return columnar.format_arrow(rows, schema_first=first, intervals=intervals)
+        return bulk.format_ndjson(rows)
+
+    async def results():
+        try:
+            first = True
+            count = 0
+            while True:
+                # Разбор куска — вне event loop, предсказание — в пуле
+                chunk = await run_in_threadpool(next, chunks, None)
+                if chunk is None:
+                    break
+                rows = await predict_rows(chunk)
+                failed = sum("error" in row for row in rows)
+                if failed:
+                    ERRORS.inc("predict_batch", "row", amount=failed)
+                count += len(rows)
+                yield format_rows(rows, first)
+                first = False
+            if first and out != "ndjson":
+                # Пустой вход: всё равно отдаю заголовок CSV или схему Arrow
+                yield format_rows([], first)
+            if out == "arrow":
+                yield columnar.END_OF_STREAM
+            logger.info(f"✅ Пакетное предсказание: {count} строк")
+        finally:
+            body.close()
+
+    media_type = {"csv": "text/csv", "arrow": columnar.ARROW_STREAM_TYPE, "ndjson": "application/x-ndjson"}[out]
+    headers = {"X-Model-Version": current.version} if current.version else None
+    return StreamingResponse(results(), media_type=media_type, headers=headers)
+
+
+def require_admin(x_admin_token: str = Header("")):
+    """Управление моделями — только с токеном MODEL_ADMIN_TOKEN и при настроенном реестре"""
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Управление моделями выключено: задайте MODEL_ADMIN_TOKEN")
+    if not hmac.compare_digest(x_admin_token.encode(), MODEL_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Неверный X-Admin-Token")
+    if reloader is None:
+        raise HTTPException(status_code=404, detail="Реестр моделей не настроен: задайте MODEL_REGISTRY_DIR")
+
+
+async def _switch_model(switch) -> dict:
     try:
-        house_data = house.model_dump(exclude_unset=True)
-        price = predictor.predict(house_data)
-
-        return PredictionResponse(
-            success=True,
-            predicted_price=price,
-            predicted_price_formatted=f"${price:,.2f}",
-            message="Предсказание успешно"
-        )
+        await switch()
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Версия не загружена, работает прежняя: {e}")
+    return await run_in_threadpool(reloader.status)
+
+
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+async def list_models():
+    """Версии в реестре, активная, закреплена ли она и история для отката"""
+    return await run_in_threadpool(reloader.status)
+
+
+@app.post("/admin/models/reload", dependencies=[Depends(require_admin)])
+async def reload_model(version: Optional[str] = Query(None, description="Версия; без неё — та, что велит реестр")):
+    """
+    Загрузить версию в фоне, прогреть и подменить. С version версия закрепляется в этом
+    процессе, без неё сервис снова следит за реестром
+    """
+    return await _switch_model(lambda: reloader.reload(version))
+
+
+@app.post("/admin/models/rollback", dependencies=[Depends(require_admin)])
+async def rollback_model():
+    """Вернуть предыдущую активную версию и закрепить её"""
+    return await _switch_model(reloader.rollback)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограммы размеров пакетов
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+class PoolSaturated(Exception):
+    """Очередь пула или микробатчера заполнена — запрос отклоняю сразу"""
+
+
+def interval_result(result) -> Tuple[float, float, float]:
+    """Результат с интервалом: (цена, нижняя граница, верхняя граница)"""
+    return tuple(float(value) for value in result)
+
+
+def predict_chunk(predict_batch: Callable[[List[Dict[str, Any]]], List[Any]],
+                  items: List[Dict[str, Any]], convert: Callable[[Any], Any] = float) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Считаю пакет целиком; если он падает — пересчитываю по одной строке,
+    чтобы одна плохая строка не роняла весь пакет.
+    Возвращаю пары (результат, ошибка) в порядке items; результат — convert(ответ модели)
+    """
+    try:
+        return [(convert(result), None) for result in predict_batch(items)]
+    except Exception:
+        outcomes = []
+        for item in items:
+            try:
+                outcomes.append((convert(predict_batch([item])[0]), None))
+            except Exception as e:
+                outcomes.append((None, e))
+        return outcomes
+
+
+def predict_frame_chunk(predict_frame: Callable[[Any], Any], frame,
+                        convert: Callable[[Any], Any] = float) -> List[Tuple[Any, Optional[Exception]]]:
+    """То же для DataFrame с сырыми столбцами (Arrow/Parquet в /predict/batch): при ошибке — по строке"""
+    try:
+        return [(convert(result), None) for result in predict_frame(frame)]
+    except Exception:
+        outcomes = []
+        for i in range(len(frame)):
+            try:
+                outcomes.append((convert(predict_frame(frame.iloc[i:i + 1])[0]), None))
+            except Exception as e:
+                outcomes.append((None, e))
+        return outcomes
+
+
+class MicroBatcher:
+    """
+    Собираю одновременные запросы /predict в пакеты.
+    Пакет уходит в run_chunk(items, key), когда набралось max_batch_size элементов или
+    прошло max_wait_ms с момента первого запроса в пакете. key — чем считать запрос
+    (в сервисе — модель и нужен ли интервал): запросы с разными ключами собираются
+    вместе, но в run_chunk уходят отдельными пакетами.
+    Принятых и ещё не отвеченных запросов (в очереди, в собранных пакетах и в счёте) —
+    не больше max_queue: сверх этого запрос сразу получает PoolSaturated, а не копится
+    в памяти. Решение принимается по каждому запросу, поэтому run_chunk может ждать места
+    в пуле, а не отклонять пакет целиком. max_queue=0 — без ограничения
+    """
+
+    def __init__(self, run_chunk: Callable[[List[Dict[str, Any]], Any], Awaitable[List[Tuple[Any, Optional[Exception]]]]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0, max_queue: int = 0):
+        self.run_chunk = run_chunk
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.max_queue = max(0, int(max_queue))
+        self.pending = 0
+
+        self._queue: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+
+        # Метрики по пакетам
+        self.batches_total = 0
+        self.items_total = 0
+        self.max_batch_seen = 0
+        self.rejected_total = 0
+        self.batch_size_counts = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.batch_size_counts['+Inf'] = 0
+
+    async def start(self):
+        """Запускаю фоновую задачу сборки пакетов"""
+        # Размер ограничивает счётчик pending в submit: он учитывает и уже собранные пакеты
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"✅ Микробатчинг: до {self.max_batch_size} запросов / {self.max_wait * 1000:.1f} мс")
+
+    async def stop(self):
+        """Останавливаю фоновую задачу"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, house_data: Dict[str, Any], key: Any = None) -> Any:
+        """Ставлю запрос в очередь и жду его собственный результат; мест нет — PoolSaturated"""
+        if self.max_queue and self.pending >= self.max_queue:
+            self.rejected_total += 1
+            raise PoolSaturated(f"Микробатчинг занят: {self.pending} запросов ждут ответа")
+        future = asyncio.get_running_loop().create_future()
+        # Место освобождается, когда у запроса есть ответ или его отменили
+        self.pending += 1
+        future.add_done_callback(self._release)
+        self._queue.put_nowait((house_data, key, future))
+        return await future
+
+    def _release(self, future: asyncio.Future):
+        self.pending -= 1
+
+    async def _collect(self) -> List[Tuple[Dict[str, Any], Any, asyncio.Future]]:
+        """Жду первый запрос и добираю пакет до лимита по размеру или времени"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # То, что уже лежит в очереди, забираю без ожидания
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        return batch
+
+    async def _run(self):
+        """Основной цикл: собираю пакет и отправляю его считаться, не дожидаясь предыдущих"""
+        pending = set()
+        try:
+            while True:
+                groups: Dict[Any, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+                for item, key, future in await self._collect():
+                    if not future.cancelled():
+                        groups.setdefault(key, []).append((item, future))
+
+                for key, batch in groups.items():
+                    self._record(len(batch))
+                    task = asyncio.create_task(self._dispatch(batch, key))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _dispatch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]], key: Any):
+        """Считаю пакет вне event loop и раздаю результаты"""
+        items = [item for item, _ in batch]
+        try:
+            outcomes = await self.run_chunk(items, key)
+        except Exception as e:
+            # Пул занят или таймаут — ошибка общая для всего пакета
+            outcomes = [(None, e)] * len(items)
+
+        for (_, future), (result, error) in zip(batch, outcomes):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _record(self, size: int):
+        """Учитываю размер пакета в метриках"""
+        self.batches_total += 1
+        self.items_total += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        for bucket in BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_counts[bucket] += 1
+                return
+        self.batch_size_counts['+Inf'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики по размерам пакетов"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches_total": self.batches_total,
+            "items_total": self.items_total,
+            "avg_batch_size": round(self.items_total / self.batches_total, 2) if self.batches_total else 0,
+            "max_batch_seen": self.max_batch_seen,
+            "queue_size": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "rejected_total": self.rejected_total,
+            "batch_size_histogram": {str(k): v for k, v in self.batch_size_counts.items()},
+        }
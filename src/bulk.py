@@ -0,0 +1,230 @@
+import csv
+import io
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+import fastjson
+from schemas import validate_house
+
+logger = logging.getLogger(__name__)
+
+# Форматы входа и выхода для /predict/batch
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+CSV_TYPES = ("text/csv", "application/csv")
+JSON_TYPES = ("application/json",)
+# Столбцовые форматы (columnar.py): поток или файл Arrow IPC и Parquet
+ARROW_TYPES = ("application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.file")
+PARQUET_TYPES = ("application/vnd.apache.parquet", "application/x-parquet")
+COLUMNAR_FORMATS = ("arrow", "parquet")
+
+# Сколько символов читаю за раз при разборе JSON-массива
+READ_SIZE = 64 * 1024
+
+# Колонки CSV-ответа; с интервалами (?intervals=true) — ещё границы цены
+CSV_FIELDS = ["index", "predicted_price", "error"]
+CSV_INTERVAL_FIELDS = ["index", "predicted_price", "price_low", "price_high", "error"]
+
+
+def detect_format(content_type: Optional[str]) -> Optional[str]:
+    """Определяю формат тела по Content-Type: json, ndjson, csv, arrow или parquet"""
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        return "ndjson"
+    if media_type in CSV_TYPES:
+        return "csv"
+    if media_type in ARROW_TYPES:
+        return "arrow"
+    if media_type in PARQUET_TYPES:
+        return "parquet"
+    if media_type in JSON_TYPES or media_type.endswith("+json"):
+        return "json"
+    return None
+
+
+def response_format(accept: Optional[str], fmt: str) -> str:
+    """
+    Формат ответа по Accept: csv, arrow или ndjson.
+    Без явного Accept столбцовый вход получает Arrow, остальной — NDJSON
+    """
+    accept = (accept or "").lower()
+    if "text/csv" in accept:
+        return "csv"
+    if ARROW_TYPES[0] in accept:
+        return "arrow"
+    if any(media_type in accept for media_type in NDJSON_TYPES):
+        return "ndjson"
+    return "arrow" if fmt in COLUMNAR_FORMATS else "ndjson"
+
+
+def _validate(item: Any) -> Dict[str, Any]:
+    """Проверяю JSON-объект схемой HouseInput и отдаю словарь для предсказателя"""
+    return validate_house(item)
+
+
+def _iter_json_values(text: io.TextIOBase) -> Iterator[Any]:
+    """
+    Разбираю JSON-массив по элементам, не читая тело целиком.
+    Объект {"houses": [...]} (BatchPredictionRequest) разбираю целиком
+    """
+    decoder = json.JSONDecoder()
+    buffer = text.read(READ_SIZE).lstrip()
+    if buffer.startswith("{"):
+        houses = fastjson.loads(buffer + text.read()).get("houses")
+        if not isinstance(houses, list):
+            raise ValueError('Ожидается объект {"houses": [...]}')
+        yield from houses
+        return
+    if not buffer.startswith("["):
+        raise ValueError("Ожидается JSON-массив объектов")
+
+    pos = 1
+    eof = False
+    while True:
+        # Пропускаю пробелы и запятые между элементами
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                raise ValueError("JSON-массив не закрыт")
+            buffer, pos = text.read(READ_SIZE), 0
+            eof = not buffer
+            continue
+        if buffer[pos] == "]":
+            return
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Элемент не поместился в буфер — дочитываю
+            chunk = text.read(READ_SIZE)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        # Число на границе буфера могло обрезаться — проверяю, что дальше разделитель
+        if end == len(buffer) and not eof:
+            chunk = text.read(READ_SIZE)
+            if chunk:
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            eof = True
+
+        yield value
+        buffer, pos = buffer[end:], 0
+
+
+def iter_records(body: io.BufferedIOBase, fmt: str) -> Iterator[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Отдаю пары (объект, ошибка) по одной строке входа.
+    Ошибка разбора одной строки NDJSON/CSV не останавливает остальные
+    """
+    text = io.TextIOWrapper(body, encoding="utf-8-sig", newline="" if fmt == "csv" else None)
+
+    if fmt == "ndjson":
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield _validate(fastjson.loads(line)), None
+            except (ValueError, ValidationError) as e:
+                yield None, _error_message(e)
+
+    elif fmt == "csv":
+        # Колонки — сырые столбцы датасета, homeFacts и schools строками как в выгрузке
+        for row in csv.DictReader(text):
+            yield {key: (value if value != "" else None) for key, value in row.items() if key}, None
+
+    else:
+        values = _iter_json_values(text)
+        while True:
+            try:
+                value = next(values)
+            except StopIteration:
+                return
+            except (ValueError, ValidationError) as e:
+                # После битого JSON дальше читать нельзя
+                yield None, _error_message(e)
+                return
+            try:
+                yield _validate(value), None
+            except ValidationError as e:
+                yield None, _error_message(e)
+
+
+def iter_chunks(records: Iterator[Tuple[Optional[Dict[str, Any]], Optional[str]]],
+                chunk_size: int) -> Iterator[List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]]:
+    """Режу поток на куски по chunk_size строк, сохраняя номер строки во входе"""
+    chunk = []
+    for index, (record, error) in enumerate(records):
+        chunk.append((index, record, error))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _price_row(index: int, result) -> Dict[str, Any]:
+    """Строка ответа с ценой; результат с интервалом — (цена, low, high)"""
+    if isinstance(result, tuple):
+        price, low, high = result
+        return {"index": index, "predicted_price": price, "price_low": low, "price_high": high}
+    return {"index": index, "predicted_price": result}
+
+
+def frame_rows(start: int, outcomes: List[Tuple[Any, Optional[Exception]]]) -> List[Dict[str, Any]]:
+    """Строки ответа для куска DataFrame, который начинается со строки start входа"""
+    rows = []
+    for index, (result, exc) in enumerate(outcomes, start):
+        if exc is None:
+            rows.append(_price_row(index, result))
+        else:
+            rows.append({"index": index, "error": _error_message(exc)})
+    return rows
+
+
+def _error_message(e: Exception) -> str:
+    """Короткий текст ошибки для строки ответа"""
+    if isinstance(e, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" if err['loc'] else err['msg']
+            for err in e.errors()
+        )
+    return str(e)
+
+
+def format_ndjson(rows: List[Dict[str, Any]]) -> bytes:
+    """Строки ответа в NDJSON"""
+    return b"".join(fastjson.dumps(row) + b"\n" for row in rows)
+
+
+def format_csv(rows: List[Dict[str, Any]], header: bool = False, intervals: bool = False) -> str:
+    """Строки ответа в CSV"""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_INTERVAL_FIELDS if intervals else CSV_FIELDS, lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def result_rows(chunk: List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]],
+                outcomes: List[Tuple[Any, Optional[Exception]]]) -> List[Dict[str, Any]]:
+    """Собираю строки ответа: предсказания и ошибки в порядке входа"""
+    rows = []
+    outcomes = iter(outcomes)
+    for index, record, error in chunk:
+        if error is None:
+            result, exc = next(outcomes)
+            if exc is not None:
+                error = _error_message(exc)
+            else:
+                rows.append(_price_row(index, result))
+                continue
+        rows.append({"index": index, "error": error})
+    return rows
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def feature_key(vector) -> bytes:
+    """
+    Ключ кэша — хэш строки признаков модели после предобработки и one-hot.
+    Косметически разные входы ("3 Baths" и "3") дают одну строку и один ключ
+    """
+    return hashlib.blake2b(np.ascontiguousarray(vector, dtype=np.float64).tobytes(), digest_size=16).digest()
+
+
+def _file_stamp(paths: List[str]) -> Tuple:
+    """Отпечаток файлов модели: время изменения и размер"""
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+
+class PredictionCache:
+    """
+    LRU-кэш предсказаний с TTL и ограничением по размеру.
+    Сбрасывается сам, если файлы модели изменились (проверяю не чаще check_interval_s)
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_s: Optional[float] = 3600.0,
+                 watch_paths: Optional[List[str]] = None, check_interval_s: float = 1.0):
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl_s) if ttl_s and ttl_s > 0 else None
+        self.watch_paths = list(watch_paths or [])
+        self.check_interval = check_interval_s
+
+        self._data: "OrderedDict[bytes, Tuple[float, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = _file_stamp(self.watch_paths)
+        self._checked_at = time.monotonic()
+        # > 0 — кэш обходится (прогрев): get не находит, put не пишет, счётчики не растут
+        self._bypass = 0
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: bytes) -> Optional[float]:
+        if self._bypass:
+            return None
+        now = time.monotonic()
+        self._check_model(now)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: bytes, value: float):
+        if self._bypass:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Сбрасываю все записи"""
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    @contextmanager
+    def bypassed(self):
+        """Внутри блока кэш не читается и не пополняется — для прогрева"""
+        with self._lock:
+            self._bypass += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._bypass -= 1
+
+    def reset(self):
+        """Сбрасываю записи и счётчики — кэш как после создания"""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+            self.evictions = self.expirations = self.invalidations = 0
+
+    def _check_model(self, now: float):
+        """Если файлы модели изменились — старые предсказания больше не годятся"""
+        if not self.watch_paths or now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        stamp = _file_stamp(self.watch_paths)
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self.invalidate()
+            logger.info("♻️ Файл модели изменился — кэш предсказаний сброшен")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,131 @@
+"""
+Столбцовые форматы /predict/batch: Arrow IPC и Parquet на входе, Arrow IPC stream на выходе
+
+Для клиентов с большими объёмами: вместо JSON-объекта на строку — сырые столбцы
+датасета (как в выгрузке и у score.py; homeFacts и schools строками). Тело лежит
+во временном файле и отображается в память (memory_map): буферы Arrow читаются
+прямо со страниц файла, куски режутся срезами без копий, и в предобработку уходит
+DataFrame целиком — без словаря и проверки схемой на каждую строку.
+Копия одна — to_pandas, строки pandas всё равно держит объектами.
+pyarrow нужен только здесь; без него сервис отвечает на эти форматы 415
+"""
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pandas as pd
+
+from preprocessing import raw_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+
+# Столбцы, которые читает предобработка; бассейн — любой из двух, остальные отбрасываю
+REQUIRED_COLUMNS = tuple(raw_columns)
+OPTIONAL_COLUMNS = ("private pool", "PrivatePool")
+
+# Магия файлового формата Arrow IPC (.arrow / Feather v2); без неё тело — поток IPC
+ARROW_FILE_MAGIC = b"ARROW1"
+# Конец потока IPC: маркер продолжения и нулевая длина
+END_OF_STREAM = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _check_schema(schema) -> "pa.Schema":
+    """
+    Схема, к которой привожу куски: нужные столбцы строками.
+    Числа и bool привожу к строкам, вложенные типы не принимаю — ValueError
+    """
+    missing = [name for name in REQUIRED_COLUMNS if name not in schema.names]
+    if missing:
+        raise ValueError(f"Нет столбцов: {', '.join(missing)}")
+    fields = []
+    for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS:
+        if name not in schema.names:
+            continue
+        field = schema.field(name)
+        if pa.types.is_nested(field.type) or pa.types.is_binary(field.type):
+            raise ValueError(f"Столбец {name}: тип {field.type} не поддерживается, нужны строки")
+        fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def _rechunk(batches, schema, chunk_size: int, source) -> Iterator["pa.RecordBatch"]:
+    try:
+        for batch in batches:
+            batch = batch.select(schema.names).cast(schema)
+            # slice — представление тех же буферов, не копия
+            for offset in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(offset, chunk_size)
+    finally:
+        source.close()
+
+
+def read_batches(path: str, fmt: str, chunk_size: int) -> Iterator["pa.RecordBatch"]:
+    """
+    Открываю тело (fmt — arrow или parquet) и отдаю куски по chunk_size строк.
+    Схему проверяю сразу, до первого куска: ошибка — ValueError
+    """
+    source = pa.memory_map(path)
+    try:
+        if fmt == "parquet":
+            parquet = pq.ParquetFile(source)
+            schema = _check_schema(parquet.schema_arrow)
+            batches = parquet.iter_batches(batch_size=chunk_size, columns=schema.names)
+        elif source.read(len(ARROW_FILE_MAGIC)) == ARROW_FILE_MAGIC:
+            reader = pa.ipc.open_file(source)
+            schema = _check_schema(reader.schema)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        else:
+            source.seek(0)
+            reader = pa.ipc.open_stream(source)
+            schema = _check_schema(reader.schema)
+            batches = reader
+    except pa.ArrowInvalid as e:
+        source.close()
+        raise ValueError(f"Тело не читается как {fmt}: {e}")
+    except BaseException:
+        source.close()
+        raise
+    return _rechunk(batches, schema, chunk_size, source)
+
+
+def iter_frames(batches: Iterator["pa.RecordBatch"]) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """
+    Куски → (номер первой строки во входе, DataFrame сырых столбцов).
+    Пропуски — None, как у DataFrame из JSON
+    """
+    start = 0
+    for batch in batches:
+        yield start, batch.to_pandas()
+        start += batch.num_rows
+
+
+def result_schema(intervals: bool = False) -> "pa.Schema":
+    prices = ["predicted_price", "price_low", "price_high"] if intervals else ["predicted_price"]
+    return pa.schema([("index", pa.int64())] + [(name, pa.float64()) for name in prices] + [("error", pa.string())])
+
+
+def format_arrow(rows: List[Dict[str, Any]], schema_first: bool = False, intervals: bool = False) -> bytes:
+    """
+    Строки ответа — батч потока Arrow IPC (index, predicted_price, error; с интервалами —
+    ещё price_low и price_high). schema_first — первый кусок ответа, перед ним схема;
+    поток закрывает END_OF_STREAM
+    """
+    schema = result_schema(intervals)
+    batch = pa.RecordBatch.from_pydict({
+        name: [row.get(name) for row in rows] for name in schema.names
+    }, schema=schema)
+    head = schema.serialize().to_pybytes() if schema_first else b""
+    return head + batch.serialize().to_pybytes()
+
+
+def read_results(data: bytes) -> pd.DataFrame:
+    """Ответ Arrow IPC → DataFrame; для клиентов и бенчмарка"""
+    return pa.ipc.open_stream(data).read_pandas()
@@ -0,0 +1,35 @@
+"""
+JSON на горячих путях сервиса: orjson, если установлен, иначе стандартный json.
+orjson разбирает и собирает JSON в разы быстрее и работает сразу с bytes;
+без него сервис ведёт себя так же, только медленнее
+"""
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse as _StdJSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data: Any) -> Any:
+    """bytes или str → объект; при ошибке — ValueError (orjson.JSONDecodeError — его наследник)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Объект → компактный JSON в UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class JSONResponse(_StdJSONResponse):
+    """Ответ по умолчанию для эндпоинтов сервиса: тело собирается через dumps"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
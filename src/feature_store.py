@@ -0,0 +1,242 @@
+"""
+Хранилище признаков для обучения на данных больше памяти
+
+    python -m feature_store ../notebook/data/data.csv -o ../features/train.parquet
+    python -m feature_store history_2019.csv history_2020.csv -o ../features/history.parquet --chunk-size 200000
+
+Сырые CSV/Parquet читаются кусками в два прохода:
+1) Preprocessor.partial_fit и статистики log1p(target) — для границ выбросов, как в ноутбуке
+   (среднее − 3.5σ … среднее + 3σ);
+2) каждый кусок: чистка target, отсев пропусков и выбросов, _do_preprocessing в режиме
+   low_memory со статистиками первого прохода → row group в Parquet.
+Рядом пишется <имя>.json: версия предобработки, state, словари категорий, границы target
+и число строк — по нему обучение и экспорт модели берут ту же предобработку.
+В памяти живут только сырой кусок и его признаки, поэтому пик задаёт --chunk-size
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import PREPROCESSING_VERSION, Preprocessor, columns_bool, cols_to_use, get_vocabulary, \
+    set_vocabulary
+from score import _require_pyarrow, read_chunks
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 1
+
+TARGET_COLUMN = "target"
+
+# Границы выбросов целевой на шкале log1p, в стандартных отклонениях от среднего (как в ноутбуке)
+TARGET_LOWER_SIGMA = 3.5
+TARGET_UPPER_SIGMA = 3.0
+
+target_pattern = r"(\d+(?:\.\d+)?)"
+
+
+def clean_target(target: pd.Series) -> np.ndarray:
+    """Цена из строки вида '$1,250,000+' (как clean_target в ноутбуке); нет числа — NaN"""
+    text = target.astype("string").str.replace(",", "", regex=False)
+    return pd.to_numeric(text.str.extract(target_pattern, expand=False), errors="coerce").to_numpy(dtype=float)
+
+
+class TargetStats:
+    """Среднее и дисперсия log1p(target) по кускам (объединение по Чану)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, target: np.ndarray):
+        values = np.log1p(target[~np.isnan(target)])
+        if len(values) == 0:
+            return
+        count, mean = len(values), float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        delta = mean - self.mean
+        total = self.count + count
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def bounds(self) -> Tuple[float, float]:
+        """Границы цены в исходной шкале"""
+        if self.count < 2:
+            raise ValueError("Для границ выбросов нужно хотя бы две строки с ценой")
+        std = (self.m2 / (self.count - 1)) ** 0.5
+        return (float(np.expm1(self.mean - TARGET_LOWER_SIGMA * std)),
+                float(np.expm1(self.mean + TARGET_UPPER_SIGMA * std)))
+
+
+def _iter_inputs(inputs: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    for path in inputs:
+        yield from read_chunks(path, chunk_size)
+
+
+def _store_schema(pa, frame: pd.DataFrame):
+    """
+    Схема файла фиксируется по первому куску: у category и downcast-целых тип
+    зависит от куска, а у row group он должен быть один
+    """
+    fields = []
+    for col in frame.columns:
+        if col == TARGET_COLUMN:
+            fields.append(pa.field(col, pa.float64()))
+        elif col in columns_bool:
+            fields.append(pa.field(col, pa.int8()))
+        elif isinstance(frame[col].dtype, pd.CategoricalDtype):
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(col, pa.float32()))
+    return pa.schema(fields)
+
+
+def fit_pass(inputs: List[str], chunk_size: int) -> Tuple[Preprocessor, TargetStats, int]:
+    """Первый проход: статистики предобработки и целевой по строкам с ценой"""
+    preprocessor = Preprocessor(low_memory=True)
+    stats = TargetStats()
+    rows = 0
+    for chunk in _iter_inputs(inputs, chunk_size):
+        target = clean_target(chunk[TARGET_COLUMN])
+        stats.update(target)
+        preprocessor.partial_fit(chunk[~np.isnan(target)])
+        rows += len(chunk)
+        logger.info(f"⏳ Статистики: {rows:,} строк")
+    return preprocessor, stats, rows
+
+
+def build_feature_store(inputs: List[str], output_path: str, chunk_size: int = 100000,
+                        trim_outliers: bool = True) -> Dict[str, Any]:
+    """
+    Строю Parquet с признаками cols_to_use и колонкой target из сырых файлов.
+    Возвращаю манифест хранилища (он же пишется в <output без расширения>.json)
+    """
+    pa = _require_pyarrow()
+    start = time.perf_counter()
+
+    preprocessor, stats, raw_rows = fit_pass(inputs, chunk_size)
+    if not preprocessor.fitted:
+        raise ValueError("Не удалось посчитать статистики предобработки: нет значений baths")
+    bounds = stats.bounds() if trim_outliers else None
+    logger.info(f"📐 state {preprocessor.state}, границы target {bounds}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    writer = None
+    rows = 0
+    dropped = {"missing_target": 0, "outliers": 0}
+
+    # Словари категорий собираю с нуля, как build_vocabulary, и возвращаю прежние после прохода
+    previous_vocabulary = get_vocabulary()
+    set_vocabulary(None)
+    try:
+        for chunk in _iter_inputs(inputs, chunk_size):
+            target = clean_target(chunk[TARGET_COLUMN])
+            keep = ~np.isnan(target)
+            dropped["missing_target"] += int((~keep).sum())
+            if bounds is not None:
+                in_bounds = (target >= bounds[0]) & (target <= bounds[1])
+                dropped["outliers"] += int((keep & ~in_bounds).sum())
+                keep &= in_bounds
+            if not keep.any():
+                continue
+
+            features = preprocessor.transform(chunk[keep].reset_index(drop=True))
+            features[TARGET_COLUMN] = target[keep]
+            if writer is None:
+                schema = _store_schema(pa, features)
+                writer = pa.parquet.ParquetWriter(tmp_path, schema)
+            writer.write_table(pa.Table.from_pandas(features, schema=schema, preserve_index=False))
+
+            rows += len(features)
+            elapsed = time.perf_counter() - start
+            logger.info(f"⏳ Признаки: {rows:,} строк, {rows / elapsed:,.0f} строк/с")
+        vocabulary = get_vocabulary()
+    finally:
+        set_vocabulary(previous_vocabulary)
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError("Во входных файлах нет строк с ценой")
+    os.replace(tmp_path, output_path)
+
+    manifest = {
+        "store_version": STORE_VERSION,
+        "preprocessing_version": PREPROCESSING_VERSION,
+        "data_file": os.path.basename(output_path),
+        "inputs": [os.path.abspath(path) for path in inputs],
+        "columns": list(cols_to_use),
+        "target_column": TARGET_COLUMN,
+        "target_bounds": bounds,
+        "raw_rows": raw_rows,
+        "rows": rows,
+        "dropped": dropped,
+        "preprocessing_state": preprocessor.state,
+        "vocabulary": vocabulary,
+    }
+    with open(manifest_path(output_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"✅ Хранилище признаков: {rows:,} из {raw_rows:,} строк за {elapsed:.1f} с → {output_path}")
+    return manifest
+
+
+def manifest_path(store_path: str) -> str:
+    return os.path.splitext(store_path)[0] + ".json"
+
+
+def load_manifest(store_path: str) -> Dict[str, Any]:
+    """Манифест хранилища; проверяю, что признаки построены текущей предобработкой"""
+    with open(manifest_path(store_path), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("store_version") != STORE_VERSION:
+        raise ValueError(f"Неизвестная версия хранилища признаков: {manifest.get('store_version')}")
+    if manifest.get("preprocessing_version") != PREPROCESSING_VERSION:
+        raise ValueError(
+            f"Признаки построены предобработкой версии {manifest.get('preprocessing_version')}, "
+            f"а в коде версия {PREPROCESSING_VERSION} — пересоберите хранилище"
+        )
+    return manifest
+
+
+def read_feature_store(store_path: str, columns: Optional[List[str]] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Признаки целиком (строковые — category) и манифест"""
+    pa = _require_pyarrow()
+    manifest = load_manifest(store_path)
+    frame = pa.parquet.read_table(store_path, columns=columns).to_pandas()
+    return frame, manifest
+
+
+def iter_feature_store(store_path: str, batch_size: int = 100000,
+                       columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Признаки кусками — для потребителей, которым не нужна вся выборка сразу"""
+    pa = _require_pyarrow()
+    load_manifest(store_path)
+    for batch in pa.parquet.ParquetFile(store_path).iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Хранилище признаков для обучения из сырых CSV/Parquet")
+    parser.add_argument("inputs", nargs="+", help="Сырые CSV или Parquet с колонкой target")
+    parser.add_argument("-o", "--output", required=True, help="Куда записать признаки (.parquet)")
+    parser.add_argument("-c", "--chunk-size", type=int, default=100000, help="Строк в одном куске")
+    parser.add_argument("--keep-outliers", action="store_true", help="Не отсеивать выбросы target")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    build_feature_store(args.inputs, args.output, args.chunk_size, trim_outliers=not args.keep_outliers)
+
+
+if __name__ == "__main__":
+    main()
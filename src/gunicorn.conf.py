@@ -0,0 +1,12 @@
+# Запуск с общей моделью на все воркеры:
+#   gunicorn app:app -c gunicorn.conf.py
+# Мастер загружает модель до fork (preload_app), воркеры делят её страницы copy-on-write
+import os
+
+os.environ.setdefault("MODEL_PRELOAD", "1")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
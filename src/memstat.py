@@ -0,0 +1,66 @@
+"""
+Память процесса сервиса и его воркеров (только Linux, /proc/<pid>/smaps_rollup)
+
+    python -m memstat <pid мастера>
+
+RSS считает общие страницы в каждом процессе, поэтому для оценки, сколько
+воркеров поместится на узел, смотрю на PSS (общие страницы делятся поровну
+между процессами) и Private (страницы только этого процесса)
+"""
+import argparse
+import os
+from typing import Dict, List
+
+# Поля smaps_rollup, которые вывожу, в кБ
+FIELDS = ["Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"]
+
+
+def read_rollup(pid: int) -> Dict[str, int]:
+    """Сводка по памяти процесса в кБ"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":"):
+                values[parts[0][:-1]] = int(parts[1])
+    return values
+
+
+def children(pid: int) -> List[int]:
+    """Все потомки процесса (воркеры gunicorn/uvicorn и пулы процессов)"""
+    result = []
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                for child in f.read().split():
+                    result.append(int(child))
+                    result.extend(children(int(child)))
+        except FileNotFoundError:
+            continue
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RSS/PSS мастера и воркеров")
+    parser.add_argument("pid", type=int, help="pid мастера (gunicorn/uvicorn)")
+    args = parser.parse_args(argv)
+
+    pids = [args.pid] + children(args.pid)
+    print(f"{'pid':>8} {'RSS, МБ':>9} {'PSS, МБ':>9} {'Shared, МБ':>11} {'Private, МБ':>12}")
+    total = {"Rss": 0, "Pss": 0, "Private": 0}
+    for pid in pids:
+        m = read_rollup(pid)
+        shared = m.get("Shared_Clean", 0) + m.get("Shared_Dirty", 0)
+        private = m.get("Private_Clean", 0) + m.get("Private_Dirty", 0)
+        print(f"{pid:>8} {m.get('Rss', 0) / 1024:>9.1f} {m.get('Pss', 0) / 1024:>9.1f} "
+              f"{shared / 1024:>11.1f} {private / 1024:>12.1f}")
+        total["Rss"] += m.get("Rss", 0)
+        total["Pss"] += m.get("Pss", 0)
+        total["Private"] += private
+
+    print(f"{'итого':>8} {total['Rss'] / 1024:>9.1f} {total['Pss'] / 1024:>9.1f} {'':>11} {total['Private'] / 1024:>12.1f}")
+    print(f"Процессов: {len(pids)}; реальный расход памяти — сумма PSS: {total['Pss'] / 1024:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
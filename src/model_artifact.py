@@ -0,0 +1,321 @@
+"""
+Нативный артефакт модели: CatBoost в .cbm и JSON-манифест рядом с ним
+
+    python -m model_artifact models/housing_model.pkl --train-data data/data.csv
+    → models/housing_model.cbm и models/housing_model.json
+
+В манифесте — раскладка признаков (one-hot категории и порядок числовых колонок),
+преобразование целевой переменной, версия предобработки, а по обучающим данным —
+статистики предобработки (мода baths и др.) и словари категорий (сырое значение →
+категория). Сервис грузит артефакт без pickle и без sklearn.
+Модели из train.py несут ещё калибровку интервалов цены (calibrate_intervals)
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import PREPROCESSING_VERSION, Preprocessor, build_vocabulary
+
+logger = logging.getLogger(__name__)
+
+# Версия формата манифеста
+MANIFEST_VERSION = 1
+
+# Поддерживаемые преобразования целевой: имя → обратная функция
+TARGET_TRANSFORMS = {
+    None: None,
+    "log1p": np.expm1,
+}
+# Прямые преобразования — для калибровки интервалов по ценам
+TARGET_FORWARD = {
+    None: None,
+    "log1p": np.log1p,
+}
+
+# Интервалы цены: доля цен, которая должна попасть в [price_low, price_high],
+# и сколько моделей в виртуальном ансамбле CatBoost
+INTERVAL_COVERAGE = 0.8
+VIRTUAL_ENSEMBLES = 10
+
+
+def load_pipeline(path: str):
+    """
+    Загружаю старый pickle с sklearn pipeline.
+    При обучении _do_preprocessing жила в __main__ ноутбука, поэтому на время загрузки
+    кладу её туда же
+    """
+    import joblib
+    from preprocessing import _do_preprocessing
+
+    main = sys.modules['__main__']
+    had = hasattr(main, '_do_preprocessing')
+    previous = getattr(main, '_do_preprocessing', None)
+    main._do_preprocessing = _do_preprocessing
+    try:
+        return joblib.load(path)
+    finally:
+        if had:
+            main._do_preprocessing = previous
+        else:
+            del main._do_preprocessing
+
+
+def pipeline_state(pipeline) -> Optional[Dict[str, Any]]:
+    """
+    Статистики предобработки, вшитые в pickle-пайплайн train.py первым шагом
+    FunctionTransformer(Preprocessor.transform). В старых пайплайнах там _do_preprocessing — None
+    """
+    steps = getattr(pipeline, 'steps', None)
+    if not steps:
+        return None
+    owner = getattr(getattr(steps[0][1], 'func', None), '__self__', None)
+    return dict(owner.state) if isinstance(owner, Preprocessor) else None
+
+
+def pipeline_layout(pipeline) -> Optional[Dict[str, Any]]:
+    """
+    Разбираю обученный pipeline: раскладка one-hot из категорий энкодера,
+    порядок признаков, CatBoost-модель и преобразование целевой.
+    Если pipeline устроен иначе — None
+    """
+    from sklearn.preprocessing import FunctionTransformer, OneHotEncoder
+
+    steps = getattr(pipeline, 'named_steps', None)
+    if not steps or 'prep' not in steps or 'model' not in steps:
+        return None
+
+    layout = []
+    for name, transformer, columns in getattr(steps['prep'], 'transformers_', []):
+        if isinstance(transformer, str) and transformer == 'drop':
+            continue
+        # После fit sklearn заменяет 'passthrough' на FunctionTransformer без функции
+        if (isinstance(transformer, str) and transformer == 'passthrough') or (
+                isinstance(transformer, FunctionTransformer) and transformer.func is None):
+            layout.append({'kind': 'num', 'columns': list(columns)})
+        elif (isinstance(transformer, OneHotEncoder) and transformer.drop_idx_ is None
+              and getattr(transformer, 'infrequent_categories_', None) is None):
+            layout.append({'kind': 'cat', 'columns': list(columns),
+                           'categories': [categories.tolist() for categories in transformer.categories_]})
+        else:
+            return None
+
+    estimator = steps['model']
+    regressor = getattr(estimator, 'regressor_', estimator)
+    if not type(regressor).__module__.startswith('catboost'):
+        return None
+
+    # Обратное преобразование целевой переменной (log1p → expm1)
+    target_transform = None
+    inverse = None
+    if regressor is not estimator:
+        if estimator.transformer is None and estimator.func is np.log1p and estimator.inverse_func is np.expm1:
+            target_transform, inverse = "log1p", np.expm1
+        elif estimator.transformer is None:
+            inverse = estimator.inverse_func
+            target_transform = getattr(inverse, '__name__', 'custom')
+        else:
+            inverse = lambda y: estimator.transformer_.inverse_transform(y.reshape(-1, 1)).ravel()
+            target_transform = type(estimator.transformer_).__name__
+
+    return {'layout': layout, 'regressor': regressor,
+            'target_transform': target_transform, 'inverse': inverse}
+
+
+def compile_layout(layout: List[Dict[str, Any]]) -> List[Tuple[str, List[str], Optional[List[Dict[Any, int]]]]]:
+    """Раскладка для быстрого построения признаков: позиции категорий в one-hot"""
+    compiled = []
+    for block in layout:
+        if block['kind'] == 'cat':
+            positions = [{category: i for i, category in enumerate(categories)}
+                         for categories in block['categories']]
+            compiled.append(('cat', block['columns'], positions))
+        else:
+            compiled.append(('num', block['columns'], None))
+    return compiled
+
+
+def build_vector(features: Dict[str, Any], layout) -> List[float]:
+    """Вектор признаков модели для одной строки (без pandas)"""
+    vector = []
+    for kind, columns, positions in layout:
+        if kind == 'cat':
+            for col, position in zip(columns, positions):
+                one_hot = [0.0] * len(position)
+                index = position.get(features[col])
+                if index is not None:
+                    one_hot[index] = 1.0
+                vector.extend(one_hot)
+        else:
+            # Строки вида '1920' CatBoost тоже приводит к числу
+            vector.extend(float(features[col]) for col in columns)
+    return vector
+
+
+def build_matrix(features, layout) -> np.ndarray:
+    """Матрица признаков модели для DataFrame после _do_preprocessing"""
+    blocks = []
+    for kind, columns, positions in layout:
+        if kind == 'cat':
+            for col, position in zip(columns, positions):
+                values = features[col]
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    # category (режим low_memory): позиции считаю по категориям, строки беру по кодам
+                    lookup = np.append(pd.Series(values.cat.categories).map(position).fillna(-1)
+                                       .to_numpy(dtype=np.int64), -1)
+                    codes = lookup[values.cat.codes.to_numpy()]
+                else:
+                    codes = values.map(position).fillna(-1).to_numpy(dtype=np.int64)
+                one_hot = np.zeros((len(features), len(position)))
+                known = codes >= 0
+                one_hot[np.flatnonzero(known), codes[known]] = 1.0
+                blocks.append(one_hot)
+        else:
+            blocks.append(features[columns].to_numpy(dtype=float))
+    return np.hstack(blocks) if blocks else np.empty((len(features), 0))
+
+
+def ensemble_spread(regressor, matrix: np.ndarray, ensembles: int) -> np.ndarray:
+    """
+    Разброс предсказаний виртуального ансамбля CatBoost по строкам (в пространстве
+    модели, до expm1): части одного леса, поэтому считается одним проходом по деревьям
+    """
+    members = regressor.virtual_ensembles_predict(matrix, prediction_type="VirtEnsembles",
+                                                  virtual_ensembles_count=ensembles)
+    return np.asarray(members, dtype=float).reshape(len(matrix), ensembles).std(axis=1)
+
+
+def calibrate_intervals(regressor, matrix: np.ndarray, target: np.ndarray,
+                        coverage: float = INTERVAL_COVERAGE, ensembles: int = VIRTUAL_ENSEMBLES) -> Dict[str, Any]:
+    """
+    Калибровка интервалов на отложенной выборке (target — в пространстве модели).
+    Разброс ансамбля сам по себе — только неуверенность модели, без шума в ценах,
+    поэтому ширину подбираю по остаткам: остаток делю на разброс (плюс его медиана,
+    чтобы строки с почти нулевым разбросом не давали нулевую ширину) и беру квантили
+    (1 - coverage) / 2 и (1 + coverage) / 2. На первой половине строк калибрую,
+    на второй проверяю, какая доля цен попала в интервал
+    """
+    # CatBoost строит не больше tree_count / 2 виртуальных моделей
+    ensembles = max(2, min(ensembles, regressor.tree_count_ // 2))
+    prediction = np.asarray(regressor.predict(matrix), dtype=float)
+    spread = ensemble_spread(regressor, matrix, ensembles)
+    floor = max(float(np.median(spread)), 1e-6)
+    scores = (target - prediction) / (spread + floor)
+
+    half = len(scores) // 2
+    low, high = np.quantile(scores[:half], [(1 - coverage) / 2, (1 + coverage) / 2])
+    inside = (scores[half:] >= low) & (scores[half:] <= high)
+    intervals = {
+        "coverage": coverage,
+        "ensembles": ensembles,
+        "spread_floor": floor,
+        "low": float(low),
+        "high": float(high),
+        "calibration_rows": half,
+        "holdout_coverage": round(float(inside.mean()), 4) if len(inside) else None,
+    }
+    logger.info(f"✅ Интервалы {coverage:.0%}: на проверочной половине в них {intervals['holdout_coverage']:.1%} цен")
+    return intervals
+
+
+def export_artifact(pipeline, output_prefix: str,
+                    vocabulary: Optional[Dict[str, Dict[str, list]]] = None,
+                    preprocessing_state: Optional[Dict[str, Any]] = None,
+                    calibration: Optional[Tuple[pd.DataFrame, np.ndarray]] = None) -> Dict[str, Any]:
+    """
+    Сохраняю CatBoost в <prefix>.cbm и манифест в <prefix>.json.
+    vocabulary — словари категорий из preprocessing.build_vocabulary,
+    preprocessing_state — Preprocessor.state после fit на обучающих данных,
+    calibration — отложенные признаки и цены для калибровки интервалов
+    """
+    parts = pipeline_layout(pipeline)
+    if parts is None:
+        raise ValueError("Pipeline не поддерживается: нужны шаги 'prep' (OneHotEncoder + passthrough) и 'model' (CatBoost)")
+    if parts['target_transform'] not in TARGET_TRANSFORMS:
+        raise ValueError(f"Преобразование целевой не поддерживается: {parts['target_transform']}")
+
+    model_file = output_prefix + ".cbm"
+    parts['regressor'].save_model(model_file, format="cbm")
+
+    manifest = {
+        "manifest_version": MANIFEST_VERSION,
+        "preprocessing_version": PREPROCESSING_VERSION,
+        "model_file": os.path.basename(model_file),
+        "target_transform": parts['target_transform'],
+        "layout": parts['layout'],
+        "feature_count": sum(
+            sum(len(c) for c in block['categories']) if block['kind'] == 'cat' else len(block['columns'])
+            for block in parts['layout']
+        ),
+        "preprocessing_state": preprocessing_state or {},
+        "vocabulary": vocabulary or {},
+    }
+    if calibration is not None:
+        features, prices = calibration
+        forward = TARGET_FORWARD[parts['target_transform']]
+        target = forward(np.asarray(prices, dtype=float)) if forward is not None else np.asarray(prices, dtype=float)
+        matrix = build_matrix(features, compile_layout(parts['layout']))
+        manifest["intervals"] = calibrate_intervals(parts['regressor'], matrix, target)
+    with open(output_prefix + ".json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"✅ Артефакт сохранён: {model_file}, {output_prefix}.json")
+    return manifest
+
+
+def load_artifact(manifest_path: str):
+    """Загружаю манифест и CatBoost-модель; проверяю версии"""
+    from catboost import CatBoostRegressor
+
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("manifest_version") != MANIFEST_VERSION:
+        raise ValueError(f"Неизвестная версия манифеста: {manifest.get('manifest_version')}")
+    if manifest.get("preprocessing_version") != PREPROCESSING_VERSION:
+        raise ValueError(
+            f"Модель обучена с предобработкой версии {manifest.get('preprocessing_version')}, "
+            f"а в коде версия {PREPROCESSING_VERSION} — переэкспортируйте модель"
+        )
+    if manifest.get("target_transform") not in TARGET_TRANSFORMS:
+        raise ValueError(f"Преобразование целевой не поддерживается: {manifest.get('target_transform')}")
+
+    regressor = CatBoostRegressor()
+    regressor.load_model(os.path.join(os.path.dirname(manifest_path), manifest["model_file"]), format="cbm")
+    return regressor, manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт pickle-модели в .cbm + JSON-манифест")
+    parser.add_argument("model", help="Путь к housing_model.pkl")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Префикс выходных файлов (по умолчанию — рядом с pickle)")
+    parser.add_argument("--train-data", default=None,
+                        help="CSV с обучающими данными: статистики предобработки и словари категорий")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    output = args.output or os.path.splitext(args.model)[0]
+
+    vocabulary = None
+    state = None
+    if args.train_data:
+        import pandas as pd
+        train = pd.read_csv(args.train_data, low_memory=False)
+        state = Preprocessor().fit(train).state
+        logger.info(f"✅ Статистики предобработки: {state}")
+        vocabulary = build_vocabulary(train)
+        logger.info("✅ Словари категорий: " + ", ".join(f"{name} — {len(v)}" for name, v in vocabulary.items()))
+    else:
+        logger.warning("⚠️ Без --train-data мода baths будет считаться по каждому пакету отдельно")
+
+    export_artifact(load_pipeline(args.model), output, vocabulary, state)
+
+
+if __name__ == "__main__":
+    main()
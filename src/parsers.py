@@ -0,0 +1,293 @@
+"""
+Разбор вложенных полей объявлений: homeFacts и schools
+
+В выгрузке это строки с repr питоновских структур ("{'atAGlanceFacts': [...]}"),
+в NDJSON/CSV может прийти JSON, а из API (HouseInput) — уже готовые dict и list.
+Строки разбираю через json (C-парсер), repr предварительно переписываю в JSON;
+ast.literal_eval остаётся только для редких строк с экранированием.
+Ошибки разбора не глотаю молча, а считаю — см. parse_stats()
+"""
+import ast
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Значения homeFacts, если строку не удалось разобрать
+default_home_facts = {
+    'Year built': 0,
+    'Remodeled year': 0,
+    'Heating': 0,
+    'Cooling': 0,
+    'Parking': 0,
+    'lotsize': 0,
+    'Price/Sqft': 0
+}
+
+# Факты, которые идут в признаки модели
+home_fact_labels = ['Year built', 'Remodeled year', 'Heating', 'Cooling', 'Parking', 'lotsize']
+
+# Ошибки, по которым строка считается неразобранной
+PARSE_ERRORS = (ValueError, SyntaxError, TypeError, AttributeError, MemoryError, RecursionError)
+
+# Строки в одинарных и двойных кавычках и ключевые слова Python
+_repr_token_pattern = re.compile(r"'[^']*'|\"[^\"]*\"|\bNone\b|\bTrue\b|\bFalse\b")
+_json_keywords = {'None': 'null', 'True': 'true', 'False': 'false'}
+_json_decoder = json.JSONDecoder(strict=False)
+
+# Счётчики разбора по полям
+_stats = {field: {'rows': 0, 'missing': 0, 'failed': 0} for field in ('homeFacts', 'schools')}
+_last_errors: Dict[str, str] = {}
+_stats_lock = threading.Lock()
+
+
+def _repr_token_to_json(match) -> str:
+    """Один токен repr → JSON"""
+    token = match.group()
+    if token[0] == "'":
+        return '"' + token[1:-1].replace('"', '\\"') + '"'
+    if token[0] == '"':
+        return token
+    return _json_keywords[token]
+
+
+def _repr_to_json(text: str) -> str:
+    """Переписываю repr питоновской структуры в JSON (строки в одинарных кавычках, None/True/False)"""
+    if '\\' in text or '\x00' in text:
+        raise ValueError("Экранирование или нулевой байт в repr — разбираю через literal_eval")
+    if '"' in text:
+        return _repr_token_pattern.sub(_repr_token_to_json, text)
+
+    # Частый случай: все строки в одинарных кавычках — чётные куски лежат вне строк.
+    # Ключевые слова заменяю во всех таких кусках разом, склеив их через \x00
+    parts = text.split("'")
+    outside = '\x00'.join(parts[0::2])
+    for keyword, value in _json_keywords.items():
+        outside = outside.replace(keyword, value)
+    parts[0::2] = outside.split('\x00')
+    return '"'.join(parts)
+
+
+def _loads_repr(text: str) -> Any:
+    """repr питоновской структуры через json-парсер"""
+    return _json_decoder.decode(_repr_to_json(text))
+
+
+def loads(text: str) -> Any:
+    """
+    Разбираю JSON или repr питоновской структуры.
+    Для repr результат тот же, что у ast.literal_eval; при ошибке — ValueError
+    """
+    # В repr есть одинарные кавычки — с него и начинаю, чтобы не ловить ошибку json зря
+    decoders = (_loads_repr, json.loads) if "'" in text else (json.loads, _loads_repr)
+    for decode in decoders:
+        try:
+            return decode(text)
+        except ValueError:
+            pass
+    try:
+        return ast.literal_eval(text)
+    except PARSE_ERRORS as e:
+        raise ValueError(f"Не удалось разобрать: {type(e).__name__}: {e}") from None
+
+
+def _is_missing(value) -> bool:
+    """Пропуск для скалярного значения (None / NaN)"""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def clean_fact_value(v):
+    """Преобразую значение факта о доме"""
+
+    if v in [None, '', '—', 'No Data']:
+        return 0
+
+    # Если это строка: убираю пробелы и мусор
+    if isinstance(v, str):
+        v = v.strip()
+        # Оставляю только цифры, если это похоже на число
+        v_digits = re.sub(r'[^0-9]', '', v)
+        if v_digits.isdigit():
+            return int(v_digits)
+        return v  # Если нет цифр — оставить как есть (категориальное значение)
+
+    return v  # Числа вернуть как есть
+
+
+def _home_facts_record(value) -> Tuple[Dict[Any, Any], str]:
+    """Словарь {factLabel: factValue} и исход разбора: ok, missing или failed"""
+
+    if _is_missing(value):
+        return dict(default_home_facts), 'missing'
+    data = loads(value) if isinstance(value, str) else value
+    if not isinstance(data, dict):
+        raise ValueError(f"Ожидается объект с atAGlanceFacts, получен {type(data).__name__}")
+
+    result = {}
+    for fact in data.get('atAGlanceFacts', []):
+        result[fact.get('factLabel')] = clean_fact_value(fact.get('factValue'))
+    return result, 'ok'
+
+
+def extract_home_facts(x) -> Dict[Any, Any]:
+    """Разбираю homeFacts (строку или dict) в словарь {factLabel: factValue}"""
+    return _parse_rows('homeFacts', [x], _home_facts_record, dict(default_home_facts))[0]
+
+
+def coerce_home_facts(record: Dict[Any, Any], n_labels: int) -> Dict[Any, Any]:
+    """
+    Повторяю приведение типов, как было у apply(pd.Series): строка из одних чисел
+    становится float, если в ней есть дробные или не хватает части колонок
+    """
+    values = record.values()
+    if record and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        if len(record) < n_labels or any(isinstance(v, float) for v in values):
+            return {label: float(v) for label, v in record.items()}
+    return record
+
+
+def home_facts_records(values) -> List[Dict[Any, Any]]:
+    """Разбираю колонку homeFacts в словари {factLabel: factValue}"""
+    return _parse_rows('homeFacts', values, _home_facts_record, dict(default_home_facts))
+
+
+def count_fact_labels(records: List[Dict[Any, Any]]) -> int:
+    """Сколько разных factLabel встретилось — столько колонок было бы у DataFrame фактов"""
+    return len(set().union(*records)) if records else 0
+
+
+def home_facts_columns(values, n_labels: Optional[int] = None) -> Dict[str, pd.Series]:
+    """
+    Разбираю колонку homeFacts сразу в колонки фактов home_fact_labels.
+    Типы колонок те же, что у pd.DataFrame из списка словарей.
+    n_labels — число меток на обучении; None — считаю по самому пакету
+    """
+    records = home_facts_records(values)
+    if n_labels is None:
+        n_labels = count_fact_labels(records)
+
+    columns = {label: [] for label in home_fact_labels}
+    for record in records:
+        record = coerce_home_facts(record, n_labels)
+        for label, column in columns.items():
+            column.append(record.get(label, np.nan))
+    return {label: pd.Series(column, index=pd.RangeIndex(len(records)))
+            for label, column in columns.items()}
+
+
+def _schools_list(value) -> Tuple[List[Any], str]:
+    """Список школ и исход разбора: ok, missing или failed"""
+
+    # Если уже список
+    if isinstance(value, list):
+        return value, 'ok'
+    if isinstance(value, str):
+        if value == '':
+            return [], 'missing'
+        text = value
+    elif _is_missing(value) or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return [], 'missing'
+    elif isinstance(value, dict):
+        raise ValueError("Ожидается список школ, получен dict")
+    else:
+        text = str(value)
+
+    try:
+        parsed = loads(text)
+    except ValueError:
+        # Запасной вариант: json с заменой кавычек и None
+        parsed = json.loads(text.replace("'", '"').replace('None', 'null'))
+    if not isinstance(parsed, list):
+        raise ValueError(f"Ожидается список школ, получен {type(parsed).__name__}")
+    return parsed, 'ok'
+
+
+def parse_schools(schools_str) -> List[Any]:
+    """Разбираю значение признака школы в список"""
+    return _parse_rows('schools', [schools_str], _schools_list, [])[0]
+
+
+def schools_columns(values) -> Dict[str, Tuple[np.ndarray, pd.Series]]:
+    """
+    Разбираю колонку schools в плоские массивы
+    (номер строки, значение) для рейтингов, расстояний, классов и названий
+    """
+    flat = {key: ([], []) for key in ('rating', 'distance', 'grades', 'name')}
+
+    for row, schools_list in enumerate(_parse_rows('schools', values, _schools_list, [])):
+        for school in schools_list:
+            if not isinstance(school, dict):
+                continue
+
+            ratings = school.get('rating', [])
+            if isinstance(ratings, list):
+                for rating_str in ratings:
+                    if isinstance(rating_str, str):
+                        flat['rating'][0].append(row)
+                        flat['rating'][1].append(rating_str)
+
+            data_dict = school.get('data', {})
+            if isinstance(data_dict, dict):
+                dist_list = data_dict.get('Distance', [])
+                if isinstance(dist_list, list):
+                    for dist_str in dist_list:
+                        if dist_str and isinstance(dist_str, str):
+                            flat['distance'][0].append(row)
+                            flat['distance'][1].append(dist_str)
+
+                grades_list = data_dict.get('Grades', [])
+                if isinstance(grades_list, list):
+                    for g in grades_list:
+                        flat['grades'][0].append(row)
+                        flat['grades'][1].append(str(g).upper())
+
+            name_list = school.get('name', [])
+            if name_list and isinstance(name_list, list) and len(name_list) > 0:
+                flat['name'][0].append(row)
+                flat['name'][1].append(str(name_list[0]).upper())
+
+    return {
+        key: (np.asarray(rows, dtype=np.int64), pd.Series(values, dtype=object))
+        for key, (rows, values) in flat.items()
+    }
+
+
+def _parse_rows(field: str, values, parse_row, default) -> list:
+    """Разбираю значения по одному; неразобранные заменяю на default и считаю"""
+
+    results = []
+    missing = 0
+    failed = 0
+    error = None
+    for value in values:
+        try:
+            result, outcome = parse_row(value)
+            missing += outcome == 'missing'
+        except PARSE_ERRORS as e:
+            result = default.copy()
+            failed += 1
+            error = f"{type(e).__name__}: {e}"
+        results.append(result)
+
+    with _stats_lock:
+        stats = _stats[field]
+        stats['rows'] += len(results)
+        stats['missing'] += missing
+        stats['failed'] += failed
+        if error is not None:
+            _last_errors[field] = error[:200]
+    if failed:
+        logger.debug(f"⚠️ {field}: не разобрано {failed} из {len(results)} строк ({error})")
+    return results
+
+
+def parse_stats() -> Dict[str, Dict[str, Any]]:
+    """Счётчики разбора по полям: строк, пропусков, ошибок и последняя ошибка"""
+    with _stats_lock:
+        return {field: dict(stats, last_error=_last_errors.get(field)) for field, stats in _stats.items()}
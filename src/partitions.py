@@ -0,0 +1,102 @@
+"""
+Предобработка больших пакетов по частям в пуле процессов
+
+Даже векторизованная _do_preprocessing упирается в построчную работу со строками
+(регулярки sqft/beds/stories/lotsize, разбор homeFacts и schools, поиск слов
+в названиях школ) и занимает одно ядро. Здесь пакет режется на части по строкам,
+части считаются в процессах со статистиками с обучения и склеиваются в исходном
+порядке. Результат совпадает с однопроцессным: строки предобрабатываются независимо,
+если статистики (Preprocessor.state) известны, поэтому без них — только один процесс.
+
+Разбор homeFacts/schools в дочерних процессах не попадает в счётчики /metrics
+"""
+import atexit
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+logger = logging.getLogger(__name__)
+
+# С какого размера пакета резать его на части: ниже накладные расходы
+# (pickle сырых строк в процесс и признаков обратно) съедают выигрыш
+PARALLEL_MIN_ROWS = int(os.getenv("PREPROCESS_PARALLEL_MIN_ROWS", "5000"))
+# Меньше этого часть не делаю, даже если процессов больше
+MIN_PARTITION_ROWS = 1000
+
+_executors: Dict[int, ProcessPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _init_worker(vocabulary: Dict[str, Dict[str, list]]):
+    """Словари категорий родителя — чтобы известные значения не гонять через правила"""
+    from preprocessing import set_vocabulary
+    set_vocabulary(vocabulary)
+
+
+def _transform_partition(df: pd.DataFrame, state: Dict[str, Any], low_memory: bool) -> pd.DataFrame:
+    from preprocessing import _do_preprocessing
+    return _do_preprocessing(df, state, low_memory)
+
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """Пул процессов на workers, один на процесс сервиса; создаю при первом большом пакете"""
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            from preprocessing import get_vocabulary
+            executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(get_vocabulary(),))
+            _executors[workers] = executor
+            logger.info(f"✅ Пул предобработки: {workers} процессов")
+        return executor
+
+
+@atexit.register
+def shutdown():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+
+
+def available() -> bool:
+    """Демоническим процессам (воркеры multiprocessing.Pool в score) свои процессы заводить нельзя"""
+    return not multiprocessing.current_process().daemon
+
+
+def split(df: pd.DataFrame, workers: int) -> List[pd.DataFrame]:
+    """Режу пакет на части по строкам: по одной на процесс, но не мельче MIN_PARTITION_ROWS"""
+    parts = max(1, min(workers, len(df) // MIN_PARTITION_ROWS))
+    size = math.ceil(len(df) / parts)
+    return [df.iloc[start:start + size] for start in range(0, len(df), size)]
+
+
+def combine(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Склеиваю части в исходном порядке. Категории у частей разные — объединяю их
+    (с сортировкой, как у однопроцессного результата), иначе concat дал бы object
+    """
+    columns = {}
+    for col in parts[0].columns:
+        pieces = [part[col] for part in parts]
+        if isinstance(pieces[0].dtype, pd.CategoricalDtype):
+            columns[col] = union_categoricals(pieces, sort_categories=True, ignore_order=True)
+        else:
+            columns[col] = pd.concat(pieces, ignore_index=True)
+    return pd.DataFrame({col: pd.Series(values).reset_index(drop=True) for col, values in columns.items()},
+                        index=pd.RangeIndex(sum(len(part) for part in parts)))
+
+
+def parallel_transform(df: pd.DataFrame, state: Dict[str, Any], low_memory: bool = False,
+                       workers: Optional[int] = None) -> pd.DataFrame:
+    """_do_preprocessing(df, state) по частям в workers процессах"""
+    executor = get_executor(workers)
+    parts = split(df, workers)
+    futures = [executor.submit(_transform_partition, part, state, low_memory) for part in parts]
+    return combine([future.result() for future in futures])
@@ -1,42 +1,29 @@
-
 import os
-import sys
-
-# ФИКС ДЛЯ JOBLIB: создаю функцию в __main__ модуле
-if '__main__' not in sys.modules:
-    sys.modules['__main__'] = types.ModuleType('__main__')
-
-# Импортирую функцию из preprocessing
-try:
-    from preprocessing import _do_preprocessing
-    # Копирую её в __main__ модуль
-    sys.modules['__main__']._do_preprocessing = _do_preprocessing
-except ImportError:
-    # Если файл не найден, создаю заглушку
-    def _do_preprocessing_stub(df):
-        return df
-    sys.modules['__main__']._do_preprocessing = _do_preprocessing_stub
-
-import joblib
+import numpy as np
 import pandas as pd
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
-# Создаю fake модуль __main__
-if not hasattr(sys.modules['__main__'], '_do_preprocessing'):
-    # Импортирую из preprocessing
-    from preprocessing import _do_preprocessing
-    # Присваиваю в __main__
-    setattr(sys.modules['__main__'], '_do_preprocessing', _do_preprocessing)
+import profiling
+from cache import PredictionCache, feature_key
+from model_artifact import TARGET_TRANSFORMS, build_matrix, build_vector, compile_layout, ensemble_spread, \
+    load_artifact, load_pipeline, pipeline_layout, pipeline_state
+from preprocessing import Preprocessor, raw_columns, set_vocabulary
+from telemetry import FAST_PATH_FALLBACKS, PREDICTIONS, STAGE_SECONDS
 
 logger = logging.getLogger(__name__)
 
 class HousePricePredictor:
     """Простой класс для предсказания цен"""
 
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, cache_size: int = 0, cache_ttl_s: Optional[float] = None,
+                 low_memory: bool = False, preprocess_workers: int = 0, version: Optional[str] = None):
         """
-        Инициализация предсказателя с автопоиском модели
+        Инициализация предсказателя с автопоиском модели.
+        cache_size > 0 включает кэш предсказаний по строке признаков,
+        low_memory — компактная предобработка пакетов (Preprocessor.low_memory),
+        preprocess_workers > 1 — большие пакеты предобрабатываются по частям в процессах,
+        version — имя версии в реестре моделей (registry.py), если модель оттуда
         """
         # Автоматически нахожу модель
         if model_path is None:
@@ -50,41 +37,106 @@ class HousePricePredictor:
             raise FileNotFoundError(error_msg)
 
         try:
-            self.model = joblib.load(model_path)
-            self.is_loaded = True
             self.model_path = model_path
-            logger.info("✅ Модель загружена успешно")
+            self.version = version
+            if model_path.endswith(".json"):
+                self._load_native(model_path)
+            else:
+                self._load_pipeline(model_path)
+            self.is_loaded = True
+            self.low_memory = low_memory
+            self.preprocessor.low_memory = low_memory
+            self.preprocess_workers = preprocess_workers
+            self.preprocessor.workers = preprocess_workers
+            logger.info(f"✅ Модель загружена успешно ({self.model_format})")
+
+            # Кэш работает по строке признаков модели, поэтому нужна раскладка
+            self.cache = None
+            self.cache_size = cache_size
+            self.cache_ttl_s = cache_ttl_s
+            if cache_size > 0 and self._fast_path is not None:
+                self.cache = PredictionCache(cache_size, cache_ttl_s, self._model_files())
+                logger.info(f"✅ Кэш предсказаний: до {cache_size} записей")
+
+            if self._fast_path is not None:
+                logger.info("✅ Быстрый путь для одиночных предсказаний включен")
 
         except Exception as e:
             logger.error(f"❌ Ошибка загрузки модели: {e}")
             self.is_loaded = False
             raise
 
+    def _load_native(self, manifest_path: str):
+        """Нативный артефакт: CatBoost .cbm + JSON-манифест, без pickle и sklearn"""
+        self.model, self.manifest = load_artifact(manifest_path)
+        self.model_format = "cbm"
+        # Словари категорий с обучения: известные значения не гоняю через правила
+        set_vocabulary(self.manifest.get("vocabulary"))
+        self.preprocessor = Preprocessor(self.manifest.get("preprocessing_state"))
+        if not self.preprocessor.fitted:
+            logger.warning("⚠️ В манифесте нет статистик предобработки — мода baths считается по пакету. "
+                           "Переэкспортируйте модель с --train-data")
+        self._fast_path = {
+            'layout': compile_layout(self.manifest['layout']),
+            'regressor': self.model,
+            'inverse': TARGET_TRANSFORMS[self.manifest['target_transform']],
+        }
+        # Калибровка интервалов цены (model_artifact.calibrate_intervals); у старых артефактов её нет
+        self.intervals = self.manifest.get("intervals")
+
+    def _load_pipeline(self, model_path: str):
+        """Старый формат: sklearn pipeline в pickle"""
+        self.model = load_pipeline(model_path)
+        self.manifest = None
+        self.model_format = "pickle"
+        # Быстрый путь считает признаки сам — беру статистики, с которыми обучен пайплайн
+        self.preprocessor = Preprocessor(pipeline_state(self.model))
+        self.intervals = None
+        logger.warning("⚠️ Модель в pickle — экспортируйте её: python -m model_artifact " + model_path)
+
+        parts = pipeline_layout(self.model)
+        self._fast_path = None
+        if parts is not None:
+            self._fast_path = {
+                'layout': compile_layout(parts['layout']),
+                'regressor': parts['regressor'],
+                'inverse': parts['inverse'],
+            }
+
+    def _model_files(self) -> List[str]:
+        """Файлы, из которых загружена модель"""
+        if self.manifest is not None:
+            return [self.model_path, os.path.join(os.path.dirname(self.model_path), self.manifest["model_file"])]
+        return [self.model_path]
+
     def _find_model(self) -> str:
         """Автоматический поиск модели"""
         # Текущая директория где запущен код
         current_dir = os.getcwd()
 
-        # Возможные пути к модели (в порядке приоритета)
-        possible_paths = [
+        # Возможные папки с моделью (в порядке приоритета)
+        possible_dirs = [
             # 1. В папке models рядом с текущей директорией
-            os.path.join(current_dir, "models", "housing_model.pkl"),
+            os.path.join(current_dir, "models"),
             # 2. В корне проекта (если запускаем из корня)
-            os.path.join(current_dir, "housing_model.pkl"),
+            current_dir,
             # 3. В папке housing_price_service/models
-            os.path.join(current_dir, "housing_price_service", "models", "housing_model.pkl"),
+            os.path.join(current_dir, "housing_price_service", "models"),
             # 4. Рядом с этим файлом (если predictor.py в src/)
-            os.path.join(os.path.dirname(__file__), "..", "models", "housing_model.pkl"),
-            os.path.join(os.path.dirname(__file__), "housing_model.pkl"),
+            os.path.join(os.path.dirname(__file__), "..", "models"),
+            os.path.dirname(__file__),
         ]
 
-        for path in possible_paths:
-            if os.path.exists(path):
-                logger.info(f"✅ Модель найдена: {path}")
-                return path
+        # Нативный артефакт важнее pickle
+        for filename in ("housing_model.json", "housing_model.pkl"):
+            for directory in possible_dirs:
+                path = os.path.join(directory, filename)
+                if os.path.exists(path):
+                    logger.info(f"✅ Модель найдена: {path}")
+                    return path
 
         # Если не нашли, возвращаю наиболее вероятный путь для ошибки
-        return os.path.join(current_dir, "models", "housing_model.pkl")
+        return os.path.join(current_dir, "models", "housing_model.json")
 
     def _get_error_message(self, model_path: str) -> str:
         """Информативное сообщение об ошибке"""
@@ -94,7 +146,7 @@ class HousePricePredictor:
         Ожидаемый путь: {model_path}
 
         Что сделать:
-        1. Убедитесь, что файл housing_model.pkl существует
+        1. Убедитесь, что файл housing_model.json (+ housing_model.cbm) или housing_model.pkl существует
         2. Положите его в одну из папок:
            - {os.path.join(os.getcwd(), "models")}/
            - {os.path.join(os.getcwd(), "housing_price_service", "models")}/
@@ -103,14 +155,144 @@ class HousePricePredictor:
         Текущая директория: {os.getcwd()}
         """
 
+    def _record_vector(self, house_data: Dict[str, Any]) -> Optional[List[float]]:
+        """Признаки одной строки без pandas; None — если строку нужно отдать в общий путь"""
+        try:
+            with STAGE_SECONDS.time("preprocessing"):
+                features = self.preprocessor.transform_record(house_data)
+            with STAGE_SECONDS.time("encoding"):
+                return build_vector(features, self._fast_path['layout'])
+        except Exception as e:
+            FAST_PATH_FALLBACKS.inc("features")
+            logger.debug(f"Быстрый путь недоступен, использую общий: {e}")
+            return None
+
+    def _predict_fast(self, house_data: Dict[str, Any]) -> Optional[float]:
+        """
+        Быстрое предсказание для одной строки без pandas: признаки считаются
+        построчно, one-hot собирается по категориям из раскладки, CatBoost
+        предсказывает один объект. None — если строку нужно отдать в общий путь
+        """
+        vector = self._record_vector(house_data)
+        if vector is None:
+            return None
+
+        key = None
+        if self.cache is not None:
+            key = feature_key(vector)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            with STAGE_SECONDS.time("predict"):
+                prediction = self._fast_path['regressor'].predict(vector)
+        except Exception as e:
+            FAST_PATH_FALLBACKS.inc("predict")
+            logger.debug(f"Быстрый путь недоступен, использую общий: {e}")
+            return None
+
+        inverse = self._fast_path['inverse']
+        if inverse is not None:
+            prediction = inverse(np.array([prediction], dtype=float))[0]
+        prediction = float(prediction)
+        PREDICTIONS.inc("fast")
+
+        if key is not None:
+            self.cache.put(key, prediction)
+        return prediction
+
+    def _predict_matrix(self, matrix: np.ndarray) -> np.ndarray:
+        """CatBoost и обратное преобразование целевой для матрицы признаков"""
+        with STAGE_SECONDS.time("predict"), profiling.stage("predict"):
+            prediction = self._fast_path['regressor'].predict(matrix)
+        inverse = self._fast_path['inverse']
+        if inverse is not None:
+            prediction = inverse(np.asarray(prediction, dtype=float))
+        return np.asarray(prediction, dtype=float)
+
+    def _predict_intervals(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        Цена и границы интервала для матрицы признаков — столбцы predicted, low, high.
+        Разброс виртуального ансамбля считается на весь пакет сразу, ширина — по калибровке
+        """
+        intervals = self.intervals
+        regressor = self._fast_path['regressor']
+        with STAGE_SECONDS.time("predict"), profiling.stage("predict"):
+            prediction = np.asarray(regressor.predict(matrix), dtype=float)
+        with STAGE_SECONDS.time("intervals"), profiling.stage("intervals"):
+            spread = ensemble_spread(regressor, matrix, intervals['ensembles']) + intervals['spread_floor']
+            result = np.column_stack([prediction, prediction + intervals['low'] * spread,
+                                      prediction + intervals['high'] * spread])
+        inverse = self._fast_path['inverse']
+        if inverse is not None:
+            result = inverse(result)
+        return result
+
+    def _frame_matrix(self, df: pd.DataFrame) -> np.ndarray:
+        with STAGE_SECONDS.time("preprocessing"):
+            features = self.preprocessor.transform(df)
+        with STAGE_SECONDS.time("encoding"), profiling.stage("encoding"):
+            return build_matrix(features, self._fast_path['layout'])
+
+    @staticmethod
+    def records_frame(houses_data: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        DataFrame из словарей объявлений. Столбца, которого нет ни в одной строке, pandas
+        не заводит — добавляю его пропусками: строка без ключа считается одинаково
+        одна и в пакете, где ключ есть у соседей (там у неё NaN)
+        """
+        df = pd.DataFrame(houses_data)
+        missing = [col for col in raw_columns if col not in df.columns]
+        if missing:
+            df = df.reindex(columns=[*df.columns, *missing])
+        return df
+
+    def predict_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """Предсказания для DataFrame с сырыми столбцами"""
+        PREDICTIONS.inc("frame", amount=len(df))
+        if self._fast_path is None:
+            # Pickle-пайплайн: предобработка, one-hot и модель внутри одного вызова
+            with STAGE_SECONDS.time("pipeline"):
+                return np.asarray(self.model.predict(df), dtype=float)
+
+        matrix = self._frame_matrix(df)
+        if self.cache is None:
+            return self._predict_matrix(matrix)
+
+        # Из кэша беру то, что есть, модель считаю только для промахов
+        keys = [feature_key(row) for row in matrix]
+        cached = [self.cache.get(key) for key in keys]
+        missing = [i for i, value in enumerate(cached) if value is None]
+
+        result = np.array([np.nan if value is None else value for value in cached], dtype=float)
+        if missing:
+            # Одинаковые строки внутри пакета считаю один раз
+            first = {}
+            for i in missing:
+                first.setdefault(keys[i], i)
+            unique = list(first.values())
+            computed = dict(zip(first, self._predict_matrix(matrix[unique])))
+            for i in missing:
+                result[i] = computed[keys[i]]
+            for key, value in computed.items():
+                self.cache.put(key, float(value))
+        return result
+
     def predict(self, house_data: Dict[str, Any]) -> float:
         if not self.is_loaded:
             raise ValueError("Модель не загружена")
 
         try:
-            df = pd.DataFrame([house_data])
-            prediction = self.model.predict(df)[0]
-            logger.info(f"Предсказание: ${prediction:,.2f}")
+            prediction = None
+            if self._fast_path is not None:
+                prediction = self._predict_fast(house_data)
+
+            if prediction is None:
+                prediction = self.predict_frame(self.records_frame([house_data]))[0]
+
+            # На каждый запрос — только debug: запись в лог под нагрузкой сама стоит времени
+            logger.debug(f"Предсказание: ${prediction:,.2f}")
             return float(prediction)
 
         except Exception as e:
@@ -121,20 +303,52 @@ class HousePricePredictor:
         if not self.is_loaded:
             raise ValueError("Модель не загружена")
 
+        # Одна строка — тот же быстрый путь, что и у predict
+        if len(houses_data) == 1:
+            return [self.predict(houses_data[0])]
+
         try:
-            df = pd.DataFrame(houses_data)
-            predictions = self.model.predict(df)
-            return [float(p) for p in predictions]
+            return self.predict_frame(self.records_frame(houses_data)).tolist()
 
         except Exception as e:
             logger.error(f"Ошибка пакетного предсказания: {e}")
             raise
 
+    def predict_frame_intervals(self, df: pd.DataFrame) -> np.ndarray:
+        """Как predict_frame, но столбцы predicted, low, high; кэш предсказаний не участвует"""
+        if self.intervals is None:
+            raise ValueError("Интервалы недоступны: в манифесте модели нет калибровки")
+        PREDICTIONS.inc("frame", amount=len(df))
+        return self._predict_intervals(self._frame_matrix(df))
+
+    def predict_batch_intervals(self, houses_data: List[Dict[str, Any]]) -> List[Tuple[float, float, float]]:
+        """Цена и интервал для пакета объявлений; одна строка — без pandas, как у predict"""
+        if not self.is_loaded:
+            raise ValueError("Модель не загружена")
+        if self.intervals is None:
+            raise ValueError("Интервалы недоступны: в манифесте модели нет калибровки")
+
+        vector = self._record_vector(houses_data[0]) if len(houses_data) == 1 else None
+        if vector is not None:
+            PREDICTIONS.inc("fast")
+            result = self._predict_intervals(np.array([vector], dtype=float))
+        else:
+            result = self.predict_frame_intervals(self.records_frame(houses_data))
+        return [tuple(row) for row in result.tolist()]
+
     def get_model_info(self) -> Dict[str, Any]:
         info = {
             "is_loaded": self.is_loaded,
             "model_type": type(self.model).__name__ if self.is_loaded else None,
+            "model_format": self.model_format if self.is_loaded else None,
+            "model_version": self.version,
         }
+        if self.is_loaded and self.manifest is not None:
+            info["preprocessing_version"] = self.manifest["preprocessing_version"]
+            info["target_transform"] = self.manifest["target_transform"]
+            info["preprocessing_fitted"] = self.preprocessor.fitted
+            info["intervals"] = self.intervals
+            info["vocabulary_size"] = {name: len(v) for name, v in self.manifest.get("vocabulary", {}).items()}
 
         if self.is_loaded and hasattr(self.model, 'named_steps'):
             steps = {}
@@ -2,1036 +2,1521 @@
 import pandas as pd
 import numpy as np
 import re
-import ast
-import json
-from collections import Counter
+from functools import lru_cache
+
+import partitions
+import profiling
+from parsers import coerce_home_facts, count_fact_labels, extract_home_facts, home_fact_labels, \
+    home_facts_columns, home_facts_records, parse_schools, schools_columns
+
+# Версия предобработки: пишется в манифест модели и сверяется при загрузке.
+# Меняю, когда меняются признаки или их значения
+PREPROCESSING_VERSION = "1"
+
+# Перечень признаков которые пойдут в модель
+cols_to_use = ['status_cat', 'city_tier', 'street_cat', 'sqft_category', 'propertyType_cat',
+               'lotsize_cat', 'heating_cat', 'cooling_cat', 'parking_cat',
+               'stories_clean', 'pool', 'baths_clean', 'sqft_clean', 'beds_clean',
+               'fireplace_type', 'has_fireplace', 'fireplace_count', 'fireplace_location',
+               'Year built', 'Remodeled year',
+               'lotsize_clean',
+               'avg_school_rating', 'max_school_rating', 'num_good_schools',
+               'min_school_distance_mi', 'avg_school_distance_mi',
+               'schools_within_1mi', 'has_elementary_school',
+               'has_middle_school', 'has_high_school', 'has_special_school',
+               'school_levels_count', 'num_elementary_schools', 'num_middle_schools', 'num_high_schools',
+               'num_charter_schools', 'school_district_score', 'school_district_cat', 'has_prestige_school',
+               'has_famous_name_school']
+
+# Сырые столбцы, которые предобработка читает обязательно; бассейн — любой из
+# 'PrivatePool' и 'private pool', их отсутствие она обрабатывает сама
+raw_columns = ['status', 'propertyType', 'street', 'baths', 'homeFacts', 'fireplace',
+               'city', 'schools', 'sqft', 'beds', 'stories']
+
+# Були
+columns_bool = ['pool', 'has_elementary_school', 'has_middle_school', 'has_high_school',
+                'has_special_school', 'has_prestige_school', 'has_famous_name_school']
+
+# Разметка сокращенных статусов
+short_status_map = {
+    "C": "Continue Show",
+    "P": "Pending Sale",
+    "U": "Under Contract"
+}
+
+# Список значений, которые считаем как «неизвестный адрес»
+undisclosed = ["MISSING", "Address Not Disclosed", "Undisclosed Address",
+               "(undisclosed Address)", "Address Not Available", "Unknown Address"]
+
+# ТОП-50 городов США по населению
+top_50_cities = [
+    'New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix',
+    'Philadelphia', 'San Antonio', 'San Diego', 'Dallas', 'San Jose',
+    'Austin', 'Jacksonville', 'Fort Worth', 'Columbus', 'Charlotte',
+    'San Francisco', 'Indianapolis', 'Seattle', 'Denver', 'Washington',
+    'Boston', 'El Paso', 'Nashville', 'Detroit', 'Oklahoma City',
+    'Portland', 'Las Vegas', 'Memphis', 'Louisville', 'Baltimore',
+    'Milwaukee', 'Albuquerque', 'Tucson', 'Fresno', 'Sacramento',
+    'Kansas City', 'Long Beach', 'Mesa', 'Atlanta', 'Colorado Springs',
+    'Virginia Beach', 'Raleigh', 'Omaha', 'Miami', 'Oakland',
+    'Minneapolis', 'Tulsa', 'Arlington', 'New Orleans', 'Wichita'
+]
+tier_1_cities = ['New York', 'Los Angeles', 'Chicago']
+tier_2_cities = ['Houston', 'Phoenix', 'Philadelphia', 'San Antonio',
+                 'San Diego', 'Dallas', 'San Jose']
+
+# Словарь для текстовых значений этажности
+stories_text_mapping = {
+    # Один этаж
+    'one': 1, 'one story': 1, 'one level': 1, 'ranch': 1,
+    'ranch/1 story': 1, '1 story/ranch': 1, 'one story/ranch': 1,
+    '1 story': 1, '1 level': 1,
+
+    # Два этажа
+    'two': 2, 'two story': 2, '2 story': 2, '2 stories': 2,
+    'two stories': 2, 'two story or more': 2, '2 story or more': 2,
+    'two story/basement': 2, '2 story/basement': 2,
+    '2 or more stories': 2, 'townhouse': 2, 'condominium': 2,
+
+    # Три и более
+    'three or more': 3, 'three': 3, '3 story': 3, '3+': 3,
+    'tri-level': 3,
+
+    # Дробные
+    'one and one half': 1.5, '1.5 story': 1.5, '1.5 level': 1.5,
+    '2.5 story': 2.5,
+
+    # Нулевые значения
+    'lot': 0, 'acreage': 0,
+
+    # Типы зданий
+    'mid-rise': 5, 'high-rise': 10,
+    'multi/split': 2, 'split level': 2, 'bi-level': 2,
+}
+
+# Комнаты, в которых может находиться камин (порядок важен)
+fireplace_rooms = ['living', 'family', 'great', 'master', 'bedroom', 'den', 'basement', 'kitchen', 'dining']
+
+# Признаки камина в порядке fireplace_value
+fireplace_outputs = ['has_fireplace', 'fireplace_count', 'fireplace_type', 'fireplace_location']
+
+# Уровни школ по диапазону классов
+elementary_grades = ['PK-5', 'K-5', 'PK-6', 'K-6', 'PK-8', '1-5', '1-6']
+middle_grades = ['6-8', '7-8', '6-9', '5-8']
+high_grades = ['9-12', '10-12', '9-10']
+special_grades = ['K-9', 'K-12', 'PK-12', '6-12']
+
+# Популярные "престижные" ключевые слова
+prestige_keywords = ['ACADEMY', 'MAGNET', 'CHARTER', 'PREP', 'PREPARATORY']
+
+# Школы с именами известных людей (часто показатель качества)
+famous_names_keywords = ['WASHINGTON', 'LINCOLN', 'JEFFERSON', 'ROOSEVELT', 'KENNEDY']
+
+# Числа в сырых строках
+number_pattern = re.compile(r"(\d+(?:\.\d+)?)")
+integer_pattern = re.compile(r"(\d+)")
+distance_pattern = re.compile(r"(\d+\.?\d*)")
+lotsize_pattern = re.compile(r"([\d\.]+)")
+
+# Размер куска строк для разбора homeFacts и schools в режиме low_memory
+LOW_MEMORY_SLICE_ROWS = 10000
+
+
+@lru_cache(maxsize=None)
+def _alternation(keywords):
+    """Компилирую альтернацию подстрок в одно регулярное выражение"""
+    return re.compile('|'.join(re.escape(k) for k in keywords))
+
+
+def _has(text, *keywords):
+    """Векторная проверка: есть ли в строке хотя бы одна из подстрок"""
+    return text.str.contains(_alternation(keywords), regex=True, na=False).to_numpy()
+
+
+def _extract_number(text, pattern):
+    """Достаю первое число из строки (NaN, если числа нет)"""
+    return pd.to_numeric(text.str.extract(pattern, expand=False), errors='coerce').to_numpy()
+
+
+def _like_apply(values, is_float):
+    """Тип колонки как у apply по строкам: float64, если хоть одно значение пришло из float(...), иначе int64"""
+    return values.astype(np.float64 if is_float.any() else np.int64)
+
+
+def _as_text(series):
+    """Привожу колонку к строкам так же, как str(x)"""
+    return series.astype(object).astype(str)
+
+
+def _str_values(series):
+    """Оставляю только строковые значения (остальное → NaN), чтобы работал .str"""
+    series = series.astype(object)
+    is_str = series.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    return series.where(is_str)
+
+
+# ---------------------------------------------------------------------------
+# Словари категорий: сырое значение → результат правил.
+# Собираются на обучающих данных и едут в манифесте модели; новые значения
+# прогоняю через правила и дописываю, пока словарь не вырос до лимита
+# ---------------------------------------------------------------------------
 
-def _do_preprocessing(df):
-    df = df.copy()
+_vocabulary = {}
+VOCABULARY_MEMO_LIMIT = 100000
 
-    # Сбрасываю индексы в начале
-    df = df.reset_index(drop=True)
 
-    # Удаляю ненужные модели параметры
-    columns_to_drop = []
-    for col in ['mls-id', 'MlsId']:
-        if col in df.columns:
-            columns_to_drop.append(col)
-    if columns_to_drop:
-        df.drop(columns_to_drop, axis=1, inplace=True)
+def _value_key(value):
+    """Ключ словаря: строка как есть, остальное — с типом (1, 1.0 и '1' правила различают)"""
+    if type(value) is str:
+        return value
+    return f'\x01{type(value).__name__}:{value!r}'
+
+
+def _column_keys(values):
+    """Ключи словаря для всей колонки"""
+    arr = values.to_numpy(dtype=object)
+    if pd.api.types.infer_dtype(arr, skipna=False) == 'string':
+        return arr
+    return np.array([_value_key(v) for v in arr], dtype=object)
+
+
+def _to_python(value):
+    """numpy-скаляр → обычный int/str, чтобы словарь сохранялся в JSON"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _categorize(name, values, rules, outputs):
+    """
+    Прогоняю векторные правила только по уникальным значениям колонки:
+    известные беру из словаря, новые считаю через rules и запоминаю.
+    Результат разворачиваю обратно по кодам
+    """
+    if len(values) == 0:
+        return rules(values)
+
+    codes, uniques = pd.factorize(_column_keys(values))
+    vocab = _vocabulary.setdefault(name, {})
+    missing = [i for i, key in enumerate(uniques) if key not in vocab]
+
+    table = {}
+    if missing:
+        # Правила считаю по первому вхождению каждого нового значения
+        first = np.empty(len(uniques), dtype=np.int64)
+        first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+        raw = pd.Series(values.to_numpy(dtype=object)[first[missing]], dtype=object)
+        result = rules(raw)
+        columns = [[_to_python(v) for v in np.asarray(result[col])] for col in outputs]
+        table = {uniques[i]: tuple(col[j] for col in columns) for j, i in enumerate(missing)}
+        if len(vocab) < VOCABULARY_MEMO_LIMIT:
+            vocab.update(table)
+
+    rows = [table[key] if key in table else vocab[key] for key in uniques]
+    return {col: np.array([row[pos] for row in rows])[codes] for pos, col in enumerate(outputs)}
+
+
+def _lookup(name, value, rule):
+    """Скалярный вариант _categorize: словарь, иначе правило rule"""
+    key = _value_key(value)
+    vocab = _vocabulary.setdefault(name, {})
+    if key not in vocab:
+        result = rule(value)
+        result = tuple(result) if isinstance(result, tuple) else (result,)
+        if len(vocab) >= VOCABULARY_MEMO_LIMIT:
+            return result if len(result) > 1 else result[0]
+        vocab[key] = tuple(_to_python(v) for v in result)
+    row = vocab[key]
+    return row if len(row) > 1 else row[0]
+
+
+def build_vocabulary(df):
+    """
+    Собираю словари категорий по обучающим данным (сырые столбцы датасета).
+    Результат сохраняется в манифест модели
+    """
+    global _vocabulary
+    previous, _vocabulary = _vocabulary, {}
+    try:
+        _do_preprocessing(df.copy())
+        return get_vocabulary()
+    finally:
+        _vocabulary = previous
+
+
+def get_vocabulary():
+    """Текущие словари в JSON-совместимом виде"""
+    return {name: {key: list(row) for key, row in vocab.items()} for name, vocab in _vocabulary.items()}
+
+
+def set_vocabulary(vocabulary):
+    """Подменяю словари (при загрузке модели); None — начать с пустых"""
+    global _vocabulary
+    _vocabulary = {name: {key: tuple(row) for key, row in vocab.items()}
+                   for name, vocab in (vocabulary or {}).items()}
+
+
+def _pool_features(df):
+    """Объединяю два признака с бассейном"""
 
     if 'PrivatePool' in df.columns and 'private pool' in df.columns:
-        df['pool'] = df['PrivatePool'].combine_first(df['private pool'])
+        pool = df['PrivatePool'].combine_first(df['private pool'])
     elif 'PrivatePool' in df.columns:
-        df['pool'] = df['PrivatePool']
+        pool = df['PrivatePool']
     elif 'private pool' in df.columns:
-        df['pool'] = df['private pool']
+        pool = df['private pool']
     else:
-        df['pool'] = 'no'  # или pd.NA
+        return {'pool': np.zeros(len(df), dtype=bool)}
 
-    df['pool'] = df['pool'].fillna('no').str.lower().str.strip().eq('yes')
+    pool = _str_values(pool.fillna('no')).str.lower().str.strip().eq('yes')
+    return {'pool': pool.to_numpy()}
 
-    # Удаляю старые признаки с бассейном - ТОЛЬКО ЕСЛИ ОНИ ЕСТЬ
-    columns_to_drop = []
-    for col in ['PrivatePool', 'private pool']:
-        if col in df.columns:
-            columns_to_drop.append(col)
 
-    if columns_to_drop:
-        df.drop(columns_to_drop, axis=1, inplace=True)
+def _status_features(status):
+    """Нормализую признак статуса"""
 
-    # Разметка сокращенных статусов
-    short_status_map = {
-        "C": "Continue Show",
-        "P": "Pending Sale",
-        "U": "Under Contract"
-    }
+    status = status.astype(object)
+    text = _str_values(status).str.lower()
 
-    def normalize_status(s):
-        """Нормальзую признак статуса"""
+    conditions = [
+        status.isna().to_numpy(),
+        status.isin(list(short_status_map)).to_numpy(),
+        _has(text, 'missing'),
+        _has(text, 'active', 'for sale', 'continue show'),
+        _has(text, 'pending', 'contract', 'option'),
+        _has(text, 'contingent'),
+        _has(text, 'auction', 'foreclos', 'pre-fore'),
+        _has(text, 'new', 'coming', 'extended', 'price change', 'back on market'),
+        _has(text, 'sold', 'closed'),
+        _has(text, 'rent'),
+    ]
+    choices = [
+        'missing',
+        status.map(short_status_map).to_numpy(),
+        'missing',
+        'active',
+        'pending/under Contract',
+        'contingent',
+        'auction/foreclosure',
+        'new/coming Soon',
+        'sold',
+        'rent',
+    ]
+    return {'status_cat': np.select(conditions, choices, default='other')}
 
-        if pd.isna(s):
-            return "missing"
 
-        if s in short_status_map:
-            return short_status_map[s]
+def _property_type_features(property_type):
+    """Нормализую признак типа постройки"""
 
-        s = s.lower()
+    text = _str_values(property_type).str.lower().str.strip()
 
-        if "missing" in s:
-            return "missing"
+    conditions = [
+        property_type.isna().to_numpy(),
+        _has(text, 'missing') | text.eq('').to_numpy(),
+        # Single Family (самая широкая группа)
+        _has(text, 'single', 'detached', 'story', 'traditional', 'colonial', 'craftsman',
+             'ranch', 'bungalow', 'cape cod', 'contemporary', 'modern', 'transitional'),
+        _has(text, 'condo'),
+        _has(text, 'town', 'row home'),
+        _has(text, 'multi', 'multiple occupancy'),
+        _has(text, 'land', 'lot'),
+        _has(text, 'apart', 'coop', 'cooperative', 'high rise'),
+        _has(text, 'mobile', 'manufact', 'mfd'),
+        _has(text, 'farm', 'ranch'),
+    ]
+    choices = ['Missing', 'Missing', 'single Family', 'condo', 'townhouse', 'multi-family',
+               'land', 'apartment/co-Op', 'mobile/manufactured', 'farm/ranch']
+    return {'propertyType_cat': np.select(conditions, choices, default='other')}
 
-        if "active" in s or "for sale" in s or "continue show" in s:
-            return "active"
 
-        if "pending" in s or "contract" in s or "option" in s:
-            return "pending/under Contract"
+def _street_features(street):
+    """Нормализую признак улицы"""
 
-        if "contingent" in s:
-            return "contingent"
+    street = street.fillna("MISSING")
+    return {'street_cat': np.where(street.isin(undisclosed), 'undisclosed', 'known')}
 
-        if "auction" in s or "foreclos" in s or "pre-fore" in s:
-            return "auction/foreclosure"
 
-        if "new" in s or "coming" in s or "extended" in s or "price change" in s or "back on market" in s:
-            return "new/coming Soon"
+def _baths_counts(baths):
+    """Нормальные значения baths (1–10): уникальные, позиция первой встречи и частоты"""
 
-        if "sold" in s or "closed" in s:
-            return "sold"
+    text = _as_text(baths).str.replace(",", "", regex=False)
+    values = _extract_number(text, number_pattern)
+    in_range = (values >= 1) & (values <= 10)
+    uniques, first_seen, counts = np.unique(values[in_range], return_index=True, return_counts=True)
+    # Позиции — в строках самой колонки, чтобы их можно было сдвигать между кусками
+    return uniques, np.flatnonzero(in_range)[first_seen], counts
 
-        if "rent" in s:
-            return "rent"
 
-        return "other"
+def _mode_of_counts(uniques, first_seen, counts):
+    """Как у Counter.most_common: при равенстве частот побеждает встреченное раньше"""
 
-    # Применяю
-    df["status_cat"] = df["status"].apply(normalize_status)
+    if len(uniques) == 0:
+        raise ValueError("Не удалось вычислить моду baths: нет значений в диапазоне 1–10")
+    best = np.flatnonzero(counts == counts.max())
+    return uniques[best[np.argmin(first_seen[best])]]
 
 
-    def normalize_property_type(s):
-        """Нормализую признак типа постройки"""
+def _baths_mode(baths):
+    """Вычисляю моду среди нормальных значений (1–10)"""
 
-        if pd.isna(s):
-            return "Missing"
-        s = s.lower().strip()
+    return _mode_of_counts(*_baths_counts(baths))
 
-        if "missing" in s or s == "":
-            return "Missing"
 
-        # Single Family (самая широкая группа)
-        if "single" in s or "detached" in s or "story" in s:
-            return "single Family"
-        if "traditional" in s or "colonial" in s or "craftsman" in s:
-            return "single Family"
-        if "ranch" in s or "bungalow" in s or "cape cod" in s:
-            return "single Family"
-        if "contemporary" in s or "modern" in s or "transitional" in s:
-            return "single Family"
+def _baths_features(baths, mode_baths=None):
+    """Очищаю признак кол-ва ван; mode_baths — мода с обучения (None — мода самого пакета)"""
 
-        # Condo
-        if "condo" in s:
-            return "condo"
+    if mode_baths is None:
+        mode_baths = _baths_mode(baths)
 
-        # Townhouse
-        if "town" in s or "row home" in s:
-            return "townhouse"
+    text = _as_text(baths).str.lower().str.strip()
+    missing = baths.isna().to_numpy() | text.isin(["missing", ""]).to_numpy()
+    values = _extract_number(text.str.replace(",", ".", regex=False), number_pattern)
 
-        # Multi-family
-        if "multi" in s or "multiple occupancy" in s:
-            return "multi-family"
+    baths_clean = np.where(np.isnan(values) | (values > 10), mode_baths, values)
+    return {'baths_clean': _like_apply(np.where(missing, 0, baths_clean), ~missing)}
 
-        # Land
-        if "land" in s or "lot" in s:
-            return "land"
 
-        # Apartment / Co-op
-        if "apart" in s or "coop" in s or "cooperative" in s or "high rise" in s:
-            return "apartment/co-Op"
+def _heating_features(heating):
+    """Категоризирую признак отопления"""
 
-        # Mobile
-        if "mobile" in s or "manufact" in s or "mfd" in s:
-            return "mobile/manufactured"
+    text = heating.fillna('').astype(str)
+    text = text.str.replace(',', '', regex=False).str.lower().str.strip()
 
-        # Farm
-        if "farm" in s or "ranch" in s:
-            return "farm/ranch"
+    conditions = [
+        text.eq('missing').to_numpy(),
+        _has(text, 'forced air', 'forcedair'),
+        _has(text, 'heat pump'),
+        _has(text, 'central'),
+        _has(text, 'electric'),
+        _has(text, 'gas', 'natural'),
+        _has(text, 'baseboard'),
+        _has(text, 'wall') & ~_has(text, 'window'),
+        _has(text, 'radiant', 'hot water', 'steam'),
+        text.eq('other').to_numpy(),
+        _has(text, 'none', 'no cooling'),
+    ]
+    choices = ['Missing', 'forced air', 'heatpump', 'central', 'electric', 'gas',
+               'baseboard', 'wall heater', 'radiant/water', 'other', 'none']
+    return {'heating_cat': np.select(conditions, choices, default='other')}
+
+
+def _cooling_features(cooling):
+    """Категоризирую охлаждение"""
+
+    raw_text = _as_text(cooling)
+    text = raw_text.str.lower()
+
+    conditions = [
+        cooling.isna().to_numpy() | cooling.eq('missing').to_numpy() | raw_text.eq('0').to_numpy(),
+        _has(text, 'central air', 'central a/c', 'air conditioning-central'),
+        _has(text, 'central') & ~_has(text, 'cooling', 'electric', 'gas'),
+        _has(text, 'refrigeration'),
+        _has(text, 'evaporative', 'swamp'),
+        _has(text, 'heat pump'),
+        _has(text, 'window', 'wall/window', 'wall unit'),
+        _has(text, 'electric'),
+        _has(text, 'gas'),
+        _has(text, 'none', 'no heating'),
+        _has(text, 'other'),
+        _has(text, 'has cooling', 'cooling system'),
+    ]
+    choices = ['Missing', 'central air', 'central', 'refrigeration', 'evaporative', 'heat pump',
+               'window/wall unit', 'electric', 'gas', 'none', 'other', 'has cooling']
+    return {'cooling_cat': np.select(conditions, choices, default='other')}
+
+
+def _parking_features(parking):
+    """Категоризирую парковку"""
+
+    raw_text = _as_text(parking)
+    text = raw_text.str.lower()
+
+    # Количество мест, если значение — просто число
+    is_digit = text.str.isdigit().to_numpy(dtype=bool)
+    spaces = pd.to_numeric(text.where(is_digit), errors='coerce').to_numpy()
+
+    conditions = [
+        parking.isna().to_numpy() | raw_text.eq('0').to_numpy(),
+        _has(text, 'attached garage', 'garage-attached', 'garage attached'),
+        _has(text, 'detached garage', 'detached parking'),
+        _has(text, 'carport'),
+        _has(text, 'off street', 'offstreet'),
+        _has(text, 'on street', 'onstreet'),
+        _has(text, 'driveway'),
+        _has(text, 'none'),
+        is_digit & (spaces <= 0),
+        is_digit & (spaces == 1),
+        is_digit & (spaces == 2),
+        is_digit & (spaces == 3),
+        is_digit & (spaces <= 6),
+        is_digit,
+        _has(text, 'parking') & _has(text, 'desc', 'type', 'yn'),
+    ]
+    choices = ['Missing', 'attached garage', 'detached garage', 'carport', 'off street',
+               'on street', 'driveway', 'none', 'missing', '1 Space', '2 Spaces', '3 Spaces',
+               '4-6 Spaces', '7+ Spaces', 'Other Parking']
+    return {'parking_cat': np.select(conditions, choices, default='other')}
 
-        return "other"
 
-    # Применяю
-    df["propertyType_cat"] = df["propertyType"].apply(normalize_property_type)
+def _lotsize_features(lotsize):
+    """Очищаю и категоризирую размер участка"""
 
-    # Список значений, которые считаем как «неизвестный адрес»
-    undisclosed = ["MISSING", "Address Not Disclosed", "Undisclosed Address",
-                   "(undisclosed Address)", "Address Not Available", "Unknown Address"]
+    text = _as_text(lotsize).str.lower()
+    missing = lotsize.isna().to_numpy() | text.isin(["missing", "no data", "(other)"]).to_numpy()
 
-    def normalize_street(s):
-        """Нормальзую признак улицы"""
+    text = text.str.replace(",", "", regex=False).str.strip()
+    values = _extract_number(text, lotsize_pattern)
+    in_acres = _has(text, 'acre')
 
-        if pd.isna(s) or s in undisclosed:
-            return "undisclosed"
-        else:
-            return "known"
+    lotsize_clean = np.where(in_acres, np.trunc(values * 43560), values)
+    no_value = missing | np.isnan(values)
+    lotsize_clean = _like_apply(np.where(no_value, 0, lotsize_clean), ~(no_value | in_acres))
 
-    # Применяю
-    df["street"] = df["street"].fillna("MISSING")
+    # Категоризирую очищенный размер участка
+    bins = [1500, 3000, 5000, 7500, 10000, 21780, 43560, 108900, 217800]
+    labels = np.array(["urban_condo", "urban_rowhouse", "urban_small_lot", "urban_standard",
+                       "suburban_small", "suburban_quarter", "suburban_half", "suburban_full",
+                       "rural_small", "rural_large"], dtype=object)
+    lotsize_cat = labels[np.searchsorted(bins, lotsize_clean, side='right')]
 
-    df["street_cat"] = df["street"].apply(normalize_street)
+    return {'lotsize_clean': lotsize_clean, 'lotsize_cat': lotsize_cat}
 
-    # Вычисляю моду среди нормальных значений (1–10)
-    valid_baths = df["baths"].apply(lambda x: re.search(r"(\d+(\.\d+)?)", str(x).replace(",", "")))
-    valid_baths = valid_baths[valid_baths.notnull()].apply(lambda m: float(m.group(1)))
-    valid_baths = valid_baths[(valid_baths >= 1) & (valid_baths <= 10)]
-    mode_baths = Counter(valid_baths).most_common(1)[0][0]
 
-    def clean_baths(x, mode_val):
-        """Очищаю признак кол-ва ван"""
+def _home_facts_features(home_facts, n_labels=None):
+    """Разворачиваю homeFacts и считаю признаки отопления, охлаждения, парковки и участка"""
 
-        if pd.isna(x) or str(x).strip().lower() in ["missing", ""]:
-            return 0
-        x_str = str(x).lower().strip()
-        match = re.search(r"(\d+(\.\d+)?)", x_str.replace(",", "."))
-        if match:
-            val = float(match.group(1))
-            if val > 10:
-                return mode_val
-            return val
-        return mode_val
+    facts = home_facts_columns(home_facts, n_labels)
 
-    # Применяю
-    df["baths_clean"] = df["baths"].apply(lambda x: clean_baths(x, mode_baths))
+    features = {
+        'Year built': facts['Year built'],
+        'Remodeled year': facts['Remodeled year'],
+    }
+    features.update(_categorize('heating', facts['Heating'], _heating_features, ['heating_cat']))
+    features.update(_categorize('cooling', facts['Cooling'], _cooling_features, ['cooling_cat']))
+    features.update(_categorize('parking', facts['Parking'], _parking_features, ['parking_cat']))
+    features.update(_lotsize_features(facts['lotsize']))
+    return features
+
+
+def _group_reduce(ufunc, rows, values, n_rows):
+    """Агрегирую значения по строкам (rows отсортированы); пустые группы → 0"""
+
+    if len(rows) == 0:
+        # Все группы пустые: у apply колонка из одних 0 целая
+        return np.zeros(n_rows, dtype=np.int64)
+    result = np.zeros(n_rows, dtype=np.float64)
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    result[rows[starts]] = ufunc.reduceat(values, starts)
+    return result
+
+
+def _group_mean(rows, values, n_rows):
+    """
+    Среднее по строкам (rows отсортированы); пустые группы → 0.
+    Суммирую группы одинаковой длины как строки матрицы — порядок сложения
+    совпадает с np.mean по списку, поэтому результат бит-в-бит тот же
+    """
+    if len(rows) == 0:
+        # Все группы пустые: у apply колонка из одних 0 целая
+        return np.zeros(n_rows, dtype=np.int64)
+    result = np.zeros(n_rows, dtype=np.float64)
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    lengths = np.diff(np.r_[starts, len(rows)])
+    for length in np.unique(lengths):
+        group_starts = starts[lengths == length]
+        block = values[group_starts[:, None] + np.arange(length)]
+        result[rows[group_starts]] = block.sum(axis=1) / length
+    return result
+
+
+def _group_any(rows, mask, n_rows):
+    """Есть ли в строке хотя бы одно значение, удовлетворяющее маске"""
+    return np.bincount(rows[mask], minlength=n_rows) > 0
+
+
+def _schools_features(schools):
+    """Считаю признаки по школам: рейтинги, расстояния, уровни и типы"""
+
+    n_rows = len(schools)
+    flat = schools_columns(schools)
+    features = {}
+
+    # Рейтинги: NR → 0, иначе первое число
+    rows, ratings = flat['rating']
+    is_nr = ratings.str.strip().str.upper().eq('NR').to_numpy(dtype=bool)
+    values = np.where(is_nr, 0, _extract_number(ratings, integer_pattern))
+    valid = ~np.isnan(values)
+    rows, values = rows[valid], values[valid]
+
+    num_ratings = np.bincount(rows, minlength=n_rows)
+    features['avg_school_rating'] = np.round(_group_mean(rows, values, n_rows), 2)
+    features['max_school_rating'] = _group_reduce(np.maximum, rows, values, n_rows).astype(np.int64)
+    features['num_good_schools'] = np.bincount(rows[values >= 7], minlength=n_rows)
+
+    # Расстояния до школ
+    rows, distances = flat['distance']
+    values = _extract_number(distances, distance_pattern)
+    valid = ~np.isnan(values)
+    rows, values = rows[valid], values[valid]
+
+    features['min_school_distance_mi'] = _group_reduce(np.minimum, rows, values, n_rows)
+    features['avg_school_distance_mi'] = np.round(_group_mean(rows, values, n_rows), 2)
+    features['schools_within_1mi'] = np.bincount(rows[values <= 1], minlength=n_rows)
+
+    # Уровни школ по диапазонам классов
+    rows, grades = flat['grades']
+    features['has_elementary_school'] = _group_any(rows, _has(grades, *elementary_grades), n_rows)
+    features['has_middle_school'] = _group_any(rows, _has(grades, *middle_grades), n_rows)
+    features['has_high_school'] = _group_any(rows, _has(grades, *high_grades), n_rows)
+    features['has_special_school'] = _group_any(rows, _has(grades, *special_grades), n_rows)
+    features['school_levels_count'] = (
+            features['has_elementary_school'].astype(int) +
+            features['has_middle_school'].astype(int) +
+            features['has_high_school'].astype(int)
+    )
 
-    def extract_home_facts(x):
-        """Преобразую значение признака"""
+    # Тип школы по названию
+    rows, names = flat['name']
+    school_type = np.select(
+        [
+            _has(names, 'ELEMENTARY', 'PRIMARY'),
+            _has(names, 'MIDDLE', 'JUNIOR'),
+            _has(names, 'HIGH', 'SENIOR'),
+            _has(names, 'ACADEMY', 'CHARTER'),
+        ],
+        ['elementary', 'middle', 'high', 'charter'],
+        default='other'
+    )
+    for school_kind in ['elementary', 'middle', 'high', 'charter']:
+        features[f'num_{school_kind}_schools'] = np.bincount(
+            rows[school_type == school_kind], minlength=n_rows)
+
+    features['has_prestige_school'] = _group_any(rows, _has(names, *prestige_keywords), n_rows)
+    features['has_famous_name_school'] = _group_any(rows, _has(names, *famous_names_keywords), n_rows)
+
+    # Итоговая оценка школьного округа
+    score = (
+        np.select([num_ratings >= 5, num_ratings >= 3, num_ratings >= 1], [3, 2, 1], default=0) +
+        np.select([features['avg_school_rating'] >= 8, features['avg_school_rating'] >= 6,
+                   features['avg_school_rating'] >= 4], [3, 2, 1], default=0) +
+        np.select([features['min_school_distance_mi'] <= 0.5, features['min_school_distance_mi'] <= 1,
+                   features['min_school_distance_mi'] <= 2], [3, 2, 1], default=0) +
+        np.minimum(features['school_levels_count'], 3) +
+        np.select([features['num_good_schools'] >= 3, features['num_good_schools'] >= 2,
+                   features['num_good_schools'] >= 1], [3, 2, 1], default=0)
+    )
+    features['school_district_score'] = np.minimum(score, 10)
+    features['school_district_cat'] = np.select(
+        [score >= 8, score >= 6, score >= 4, score >= 2],
+        ['excellent', 'good', 'average', 'poor'],
+        default='very_poor'
+    )
 
-        def clean_value(v):
+    return features
 
-            if v in [None, '', '—', 'No Data']:
-                return 0
 
-            # Если это строка: убираю пробелы и мусор
-            if isinstance(v, str):
-                v = v.strip()
-                # Оставляю только цифры, если это похоже на число
-                v_digits = re.sub(r'[^0-9]', '', v)
-                if v_digits.isdigit():
-                    return int(v_digits)
-                return v  # Если нет цифр — оставить как есть (категориальное значение)
+def _sqft_features(sqft):
+    """Очищаю и категоризирую площадь"""
 
-            return v  # Числа вернуть как есть
+    # Оставляю только цифры и точку; всё, что не парсится как число, — 0
+    digits = _as_text(sqft).str.replace(r"[^\d.]", "", regex=True)
+    sqft_clean = pd.to_numeric(digits, errors='coerce').to_numpy()
+    no_value = sqft.isna().to_numpy() | np.isnan(sqft_clean)
+    sqft_clean = _like_apply(np.where(no_value, 0, sqft_clean), ~no_value)
 
-        result = {}
-        try:
-            data_list = ast.literal_eval(x)
-            for fact in data_list.get('atAGlanceFacts', []):
-                val = clean_value(fact.get('factValue'))
-                label = fact.get('factLabel')
-                result[label] = val
+    sqft_category = np.select([sqft_clean < 5000, sqft_clean <= 10000], ['small', 'medium'], default='large')
+    return {'sqft_clean': sqft_clean, 'sqft_category': sqft_category}
 
-        except:
-            result = {
-                'Year built': 0,
-                'Remodeled year': 0,
-                'Heating': 0,
-                'Cooling': 0,
-                'Parking': 0,
-                'lotsize': 0,
-                'Price/Sqft': 0
-            }
 
-        return result
+def _beds_features(beds):
+    """Очищаю признак спален"""
 
-    # Применяю и разворачиваю в отдельные колонки
-    home_facts_df = df['homeFacts'].apply(extract_home_facts).apply(pd.Series)
+    # Нестроковые значения превращаются в NaN
+    text = _str_values(beds).str.lower()
+    values = _extract_number(text, integer_pattern)
 
-    home_facts_df.index = df.index
-    # Объединяю с основным датафреймом
-    df = pd.concat([df, home_facts_df], axis=1)
+    beds_clean = np.select(
+        [
+            text.isna().to_numpy(),
+            # Если встречаются нечисловые единицы — сразу 0
+            _has(text, 'sqft', 'acre', 'bath'),
+            _has(text, '3 or more'),
+            ~np.isnan(values),
+        ],
+        [0, 0, 3, values],
+        default=0
+    )
+    return {'beds_clean': beds_clean.astype(np.int64)}
 
-    df['Heating'] = df['Heating'].fillna('').astype(str)
-    df['Heating'] = df['Heating'].str.replace(',', '', regex=False).str.lower()
-    df['Heating'] = df['Heating'].str.strip()
 
-    def categorize_heating(value):
-        """Категоризирую признак отопления"""
+def _fireplace_features(fireplace):
+    """Разбираю описание камина: наличие, количество, тип, расположение"""
 
-        if pd.isna(value) or value == 'missing':
-            return 'Missing'
+    text = _as_text(fireplace).str.lower()
 
-        text = str(value).lower()
+    # 1. Количество
+    fireplace_count = np.select(
+        [_has(text, '3', 'three', '4', 'four'), _has(text, '2', 'two'), _has(text, '1', 'one')],
+        [3, 2, 1],
+        default=0
+    )
 
-        # Основные 10 категорий
-        if 'forced air' in text or 'forcedair' in text:
-            return 'forced air'
+    # 2. Тип
+    fireplace_type = np.select(
+        [_has(text, 'wood'), _has(text, 'gas'), _has(text, 'electric'),
+         _has(text, 'decorative'), _has(text, 'pellet')],
+        ['wood', 'gas', 'electric', 'decorative', 'pellet'],
+        default='unknown'
+    )
 
-        if 'heat pump' in text:
-            return 'heatpump'
+    # 3. Расположение
+    room_hits = [_has(text, room) for room in fireplace_rooms]
+    room_count = np.sum(room_hits, axis=0)
+    fireplace_location = np.select(
+        [room_count == 0, room_count > 1] + room_hits,
+        ['unknown', 'multiple'] + fireplace_rooms,
+        default='unknown'
+    )
 
-        if 'central' in text:
-            return 'central'
+    # 4. Есть ли камин?
+    has_fireplace = (fireplace_count > 0) | (room_count > 0) | (fireplace_type != 'unknown')
 
-        if 'electric' in text:
-            return 'electric'
+    return {
+        'has_fireplace': has_fireplace.astype(np.int64),
+        'fireplace_count': fireplace_count,
+        'fireplace_type': fireplace_type,
+        'fireplace_location': fireplace_location,
+    }
 
-        if 'gas' in text or 'natural' in text:
-            return 'gas'
 
-        if 'baseboard' in text:
-            return 'baseboard'
+def _city_features(city):
+    """Признак крупного города и разбиение городов по категориям"""
 
-        if 'wall' in text and 'window' not in text:
-            return 'wall heater'
+    city_cat = _as_text(city).str.title().isin(top_50_cities).astype(int).to_numpy()
 
-        if 'radiant' in text or 'hot water' in text or 'steam' in text:
-            return 'radiant/water'
+    city_name = _as_text(city.fillna("MISSING")).str.title()
+    city_tier = np.select(
+        [
+            city_name.isin(tier_1_cities).to_numpy(),
+            city_name.isin(tier_2_cities).to_numpy(),
+            city_name.isin(top_50_cities).to_numpy(),
+            city_name.ne('').to_numpy(),
+        ],
+        ['tier_1 - Megacity', 'tier_2 - Major', 'tier_3 - Large', 'tier_4 - Other'],
+        default='unknown'
+    )
+    return {'city_cat': city_cat, 'city_tier': city_tier}
 
-        if text == 'other':
-            return 'other'
 
-        if 'none' in text or 'no cooling' in text:
-            return 'none'
+def _parse_stories_number(value_str):
+    """Попытка преобразовать в число; если не удалось распознать - ставим 1"""
+    try:
+        num_val = float(value_str)
+        return int(num_val) if num_val.is_integer() else num_val
+    except (ValueError, OverflowError):
+        return 1
 
-        return 'other'
 
-    # Применяю
-    df["heating_cat"] = df["Heating"].apply(categorize_heating)
+def _stories_features(stories):
+    """Очищаю признак этажность"""
 
-    def categorize_cooling(value):
-        """Категоризирую охлаждение"""
+    value_str = _as_text(stories).str.strip()
+    missing = stories.isna().to_numpy() | value_str.isin(['', 'MISSING']).to_numpy()
 
-        if pd.isna(value) or value == 'missing' or str(value) == '0':
-            return 'Missing'
+    # Текстовые значения и числа вида "2 Level, Site Built"
+    mapped = value_str.str.lower().map(stories_text_mapping).to_numpy(dtype=float)
+    values = _extract_number(value_str, number_pattern)
 
-        text = str(value).lower()
+    # Оставшиеся строки (без цифр) разбираю по одной — их немного
+    rest = ~missing & np.isnan(mapped) & np.isnan(values)
+    fallback = np.ones(len(value_str))
+    if rest.any():
+        fallback[rest] = [_parse_stories_number(v) for v in value_str[rest]]
 
-        # Основные категории охлаждения
-        if 'central air' in text or 'central a/c' in text or 'air conditioning-central' in text:
-            return 'central air'
+    stories_clean = np.select(
+        [missing, ~np.isnan(mapped), ~np.isnan(values)],
+        [1, mapped, values],
+        default=fallback
+    )
+    # float(...) — число из строки и дробные значения словаря или разбора; остальные целые
+    fallback_float = ~np.isfinite(fallback) | (fallback != np.trunc(fallback))
+    is_float = ~missing & np.where(np.isnan(mapped), ~np.isnan(values) | fallback_float, mapped != np.trunc(mapped))
+    return {'stories_clean': _like_apply(stories_clean, is_float)}
+
+
+def clean_string_columns(df, categorical=False):
+    """
+    Финальная очистка всех строковых колонок.
+    categorical=True — результат в category вместо object (режим low_memory)
+    """
+    # Нахожу все строковые колонки
+    string_cols = df.select_dtypes(include=['object', 'string', 'category']).columns.tolist()
+
+    for col in string_cols:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Категории уже уникальны; пропуск (код -1) — отдельная категория 'unknown'
+            uniques = df[col].cat.categories.astype(str).append(pd.Index(['unknown']))
+            codes = df[col].cat.codes.to_numpy()
+            codes = np.where(codes < 0, len(uniques) - 1, codes)
+        else:
+            # Заполняю пропуски и преобразую в строку
+            values = df[col].fillna('unknown').astype(str)
+
+            # Чищу только уникальные значения и разворачиваю обратно по кодам
+            codes, uniques = pd.factorize(values)
+        cleaned = pd.Index(uniques, dtype=object).str.strip().str.lower()
+        cleaned = cleaned.str.replace(',', '', regex=False)
+
+        # Заменяю пустые и 'nan' строки
+        cleaned = np.where(cleaned.isin(['', 'nan', 'none', 'null']), 'unknown', cleaned)
+        if categorical:
+            # После очистки разные исходные значения могут совпасть — категории уникализирую.
+            # Сортирую, чтобы категории не зависели от того, как пакет порезан на части
+            cleaned_codes, categories = pd.factorize(cleaned, sort=True)
+            df[col] = pd.Categorical.from_codes(cleaned_codes[codes], categories)
+        else:
+            df[col] = np.asarray(cleaned, dtype=object)[codes]
+
+    return df
+
+
+def _compact_column(col, values):
+    """
+    Компактный тип колонки для low_memory: флаги — int8, счётчики — наименьший
+    целый тип, дробные — float32 (CatBoost всё равно считает во float32).
+    Строки сразу в category, очищает их категории clean_string_columns
+    """
+    values = np.asarray(values)
+    if col in columns_bool:
+        return values.astype(np.int8)
+    if values.dtype.kind in 'iu':
+        return pd.to_numeric(values, downcast='integer')
+    if values.dtype.kind == 'f':
+        return values.astype(np.float32)
+    if values.dtype.kind in 'OU':
+        return pd.Categorical(values)
+    return values
+
+
+def _in_slices(block, values, *args):
+    """
+    Считаю построчный блок признаков кусками по LOW_MEMORY_SLICE_ROWS строк и склеиваю.
+    Так разобранные списки школ и фактов живут только для одного куска
+    """
+    if len(values) <= LOW_MEMORY_SLICE_ROWS:
+        return block(values, *args)
+
+    parts = [block(values.iloc[start:start + LOW_MEMORY_SLICE_ROWS], *args)
+             for start in range(0, len(values), LOW_MEMORY_SLICE_ROWS)]
+    features = {}
+    for col in parts[0]:
+        pieces = [part[col] for part in parts]
+        if isinstance(pieces[0], pd.Series):
+            features[col] = pd.concat(pieces, ignore_index=True)
+        else:
+            features[col] = np.concatenate(pieces)
+    return features
+
+
+def _do_preprocessing(df, state=None, low_memory=False):
+    """
+    Строю признаки модели из сырых столбцов объявлений.
+    Все признаки считаются целыми колонками (без построчного apply).
+    state — статистики с обучения (Preprocessor.state); без него мода baths
+    и число меток homeFacts считаются по самому пакету, как при обучении.
+    low_memory — промежуточные признаки не копятся до конца, строковые
+    признаки выходят в category, числа — в int8/int16/float32
+    """
+    state = state or {}
+    # Блоки признаков по имени — так их видно по отдельности в профиле (profiling.py)
+    blocks = [
+        ('pool', lambda: _pool_features(df)),
+        ('status', lambda: _categorize('status', df['status'], _status_features, ['status_cat'])),
+        ('property_type', lambda: _categorize('propertyType', df['propertyType'], _property_type_features,
+                                              ['propertyType_cat'])),
+        ('street', lambda: _street_features(df['street'])),
+        ('baths', lambda: _baths_features(df['baths'], state.get('mode_baths'))),
+        ('home_facts', lambda: _home_facts_features(df['homeFacts'], state.get('home_fact_labels'))
+         if not (low_memory and state.get('home_fact_labels') is not None)
+         # Кусками — только с числом меток с обучения: без него оно считается по всему пакету
+         else _in_slices(_home_facts_features, df['homeFacts'], state['home_fact_labels'])),
+        ('schools', lambda: _in_slices(_schools_features, df['schools']) if low_memory
+         else _schools_features(df['schools'])),
+        ('sqft', lambda: _sqft_features(df['sqft'])),
+        ('beds', lambda: _beds_features(df['beds'])),
+        ('fireplace', lambda: _categorize('fireplace', df['fireplace'], _fireplace_features, fireplace_outputs)),
+        ('city', lambda: _city_features(df['city'])),
+        ('stories', lambda: _stories_features(df['stories'])),
+    ]
 
-        if 'central' in text and ('cooling' not in text and 'electric' not in text and 'gas' not in text):
-            return 'central'
+    with profiling.logged():
+        features = {}
+        for name, block in blocks:
+            with profiling.stage(name):
+                if low_memory:
+                    # Вспомогательные колонки блока, которые не идут в модель, сразу отпускаю
+                    features.update((col, values) for col, values in block().items() if col in cols_to_use)
+                else:
+                    features.update(block())
+
+        with profiling.stage('assemble'):
+            if low_memory:
+                # Каждый признак сразу в компактном типе; из словаря забираю, чтобы не держать две копии
+                data_to_use = pd.DataFrame(
+                    {col: _compact_column(col, features.pop(col)) for col in cols_to_use},
+                    index=pd.RangeIndex(len(df))
+                )
+            else:
+                # Создаю новый датафрейм (индекс сбрасывается)
+                data_to_use = pd.DataFrame(
+                    {col: np.asarray(features[col]) for col in cols_to_use},
+                    index=pd.RangeIndex(len(df))
+                )
+
+                for col in columns_bool:
+                    data_to_use[col] = data_to_use[col].astype(int)
+
+            # Категории из np.select приходят как numpy-строки — перевожу в object
+            for col in data_to_use.columns:
+                if data_to_use[col].dtype.kind == 'U':
+                    data_to_use[col] = data_to_use[col].astype(object)
+
+        # Применяю финальную очистку
+        with profiling.stage('string_cleanup'):
+            data_model = clean_string_columns(data_to_use, categorical=low_memory)
+
+    return data_model
+
+
+class Preprocessor:
+    """
+    Предобработка с состоянием. Статистики по данным (мода baths, число меток
+    homeFacts) считаются один раз в fit на обучающих данных и едут в манифесте модели.
+    После fit transform построчно независим: строка даёт один и тот же результат
+    в любом пакете и в одиночном запросе
+    """
+
+    def __init__(self, state=None, low_memory=False, workers=0):
+        self.state = dict(state) if state else {}
+        self.low_memory = low_memory
+        # workers > 1 — пакеты от partitions.PARALLEL_MIN_ROWS строк считаются по частям в процессах
+        self.workers = workers
+        # Накопленное partial_fit: {значение baths: [частота, первая строка]}, метки homeFacts, строки
+        self._baths_seen = {}
+        self._fact_labels = set()
+        self._rows_seen = 0
+
+    @property
+    def fitted(self):
+        return all(self.state.get(key) is not None for key in ('mode_baths', 'home_fact_labels'))
+
+    def fit(self, df):
+        """Считаю статистики по обучающим данным (сырые столбцы датасета)"""
+        self.state = {
+            'mode_baths': float(_baths_mode(df['baths'])),
+            'home_fact_labels': count_fact_labels(home_facts_records(df['homeFacts'])),
+        }
+        return self
 
-        if 'refrigeration' in text:
-            return 'refrigeration'
+    def partial_fit(self, df):
+        """
+        fit по кускам — для обучающих данных, которые не помещаются в память.
+        После всех кусков state тот же, что у fit на всех строках сразу
+        """
+        uniques, first_seen, counts = _baths_counts(df['baths'])
+        for value, first, count in zip(uniques.tolist(), first_seen.tolist(), counts.tolist()):
+            seen = self._baths_seen.setdefault(value, [0, self._rows_seen + first])
+            seen[0] += count
+        for record in home_facts_records(df['homeFacts']):
+            self._fact_labels.update(record)
+        self._rows_seen += len(df)
+
+        if self._baths_seen:
+            values = list(self._baths_seen)
+            counts, first_seen = np.array(list(self._baths_seen.values())).T
+            mode_baths = float(_mode_of_counts(np.array(values), first_seen, counts))
+        else:
+            mode_baths = None
+        self.state = {'mode_baths': mode_baths, 'home_fact_labels': len(self._fact_labels)}
+        return self
 
-        if 'evaporative' in text or 'swamp' in text:
-            return 'evaporative'
+    def transform(self, df):
+        # По частям — только со статистиками: без них мода baths и метки homeFacts зависят от пакета
+        if (self.workers > 1 and len(df) >= partitions.PARALLEL_MIN_ROWS and self.fitted
+                and partitions.available()):
+            return partitions.parallel_transform(df, self.state, self.low_memory, self.workers)
+        return _do_preprocessing(df, self.state, self.low_memory)
 
-        if 'heat pump' in text:
-            return 'heat pump'
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
 
-        if 'window' in text or 'wall/window' in text or 'wall unit' in text:
-            return 'window/wall unit'
+    def transform_record(self, record):
+        return _preprocess_record(record, self.state)
 
-        if 'electric' in text:
-            return 'electric'
 
-        if 'gas' in text:
-            return 'gas'
+# ---------------------------------------------------------------------------
+# Построчная версия для одиночных запросов: те же правила, без pandas
+# ---------------------------------------------------------------------------
 
-        if 'none' in text or 'no heating' in text:
-            return 'none'
+def _is_missing(value):
+    """Пропуск для скалярного значения (None / NaN)"""
+    return value is None or (isinstance(value, float) and value != value)
 
-        if 'other' in text:
-            return 'other'
 
-        if 'has cooling' in text or 'cooling system' in text:
-            return 'has cooling'
+def normalize_status(s):
+    """Нормализую признак статуса"""
 
-        # Цифры и мусор
-        if text in ['1', '2', '3', '90', 'has heating']:
-            return 'other'
+    if _is_missing(s):
+        return "missing"
 
-        # Всё остальное
-        return 'other'
+    if s in short_status_map:
+        return short_status_map[s]
 
-    # Применяю
-    df['cooling_cat'] = df['Cooling'].apply(categorize_cooling)
+    s = s.lower()
 
-    # Применяю
-    def categorize_parking(value):
-        """Категоризируем парковку"""
+    if "missing" in s:
+        return "missing"
 
-        if pd.isna(value) or str(value) == '0':
-            return 'Missing'
+    if "active" in s or "for sale" in s or "continue show" in s:
+        return "active"
 
-        text = str(value).lower()
+    if "pending" in s or "contract" in s or "option" in s:
+        return "pending/under Contract"
 
-        # Основные типы парковки
-        if 'attached garage' in text or 'garage-attached' in text or 'garage attached' in text:
-            return 'attached garage'
+    if "contingent" in s:
+        return "contingent"
 
-        if 'detached garage' in text or 'detached parking' in text:
-            return 'detached garage'
+    if "auction" in s or "foreclos" in s or "pre-fore" in s:
+        return "auction/foreclosure"
 
-        if 'carport' in text:
-            return 'carport'
+    if "new" in s or "coming" in s or "extended" in s or "price change" in s or "back on market" in s:
+        return "new/coming Soon"
 
-        if 'off street' in text or 'offstreet' in text:
-            return 'off street'
+    if "sold" in s or "closed" in s:
+        return "sold"
 
-        if 'on street' in text or 'onstreet' in text:
-            return 'on street'
+    if "rent" in s:
+        return "rent"
 
-        if 'driveway' in text:
-            return 'driveway'
+    return "other"
 
-        if 'none' in text:
-            return 'none'
 
-        if text.isdigit():
-            num = int(text)
-            if num <= 0:
-                return 'missing'
-            elif num == 1:
-                return '1 Space'
-            elif num == 2:
-                return '2 Spaces'
-            elif num == 3:
-                return '3 Spaces'
-            elif num <= 6:
-                return '4-6 Spaces'
-            else:
-                return '7+ Spaces'
+def normalize_property_type(s):
+    """Нормализую признак типа постройки"""
 
-        if 'parking' in text and ('desc' in text or 'type' in text or 'yn' in text):
-            return 'Other Parking'
+    if _is_missing(s):
+        return "Missing"
+    s = s.lower().strip()
 
-        # Всё остальное
-        return 'other'
+    if "missing" in s or s == "":
+        return "Missing"
 
-    # Применяю
-    df['parking_cat'] = df['Parking'].apply(categorize_parking)
-
-    def clean_lotsize(x):
-        """Очищаю признак размера участка"""
-
-        if pd.isna(x) or str(x).lower() in ["missing", "no data", "(other)"]:
-            return 0
-        x_str = str(x).lower().replace(",", "").strip()
-        if "acre" in x_str:
-            match = re.search(r"([\d\.]+)", x_str)
-            if match:
-                return int(float(match.group(1)) * 43560)
-        elif "sqft" in x_str or "sq. ft." in x_str:
-            match = re.search(r"([\d\.]+)", x_str)
-            if match:
-                return float(match.group(1))
-        else:
-            match = re.search(r"([\d\.]+)", x_str)
-            if match:
-                return float(match.group(1))
-        return 0
+    # Single Family (самая широкая группа)
+    if "single" in s or "detached" in s or "story" in s:
+        return "single Family"
+    if "traditional" in s or "colonial" in s or "craftsman" in s:
+        return "single Family"
+    if "ranch" in s or "bungalow" in s or "cape cod" in s:
+        return "single Family"
+    if "contemporary" in s or "modern" in s or "transitional" in s:
+        return "single Family"
 
-    # Применяю
-    df["lotsize_clean"] = df["lotsize"].apply(clean_lotsize)
-
-    def categorize_lotsize(x):
-        """Категоризирую очищенный размер участка"""
-        if pd.isna(x):
-            return "missing"
-        elif x < 1500:
-            return "urban_condo"
-        elif x < 3000:
-            return "urban_rowhouse"
-        elif x < 5000:
-            return "urban_small_lot"
-        elif x < 7500:
-            return "urban_standard"
-        elif x < 10000:
-            return "suburban_small"
-        elif x < 21780:
-            return "suburban_quarter"
-        elif x < 43560:
-            return "suburban_half"
-        elif x < 108900:
-            return "suburban_full"
-        elif x < 217800:
-            return "rural_small"
-        else:
-            return "rural_large"
+    if "condo" in s:
+        return "condo"
 
-    # Применяю
-    df["lotsize_cat"] = df["lotsize_clean"].apply(categorize_lotsize)
+    if "town" in s or "row home" in s:
+        return "townhouse"
 
-    def parse_schools(schools_str):
-        """Меняю значение признака школы"""
+    if "multi" in s or "multiple occupancy" in s:
+        return "multi-family"
 
-        if pd.isna(schools_str) or schools_str == '':
-            return []
+    if "land" in s or "lot" in s:
+        return "land"
 
-        # Если уже список
-        if isinstance(schools_str, list):
-            return schools_str
+    if "apart" in s or "coop" in s or "cooperative" in s or "high rise" in s:
+        return "apartment/co-Op"
 
-        # Пробую разные методы парсинга
-        try:
-            # Метод 1: ast.literal_eval
-            parsed = ast.literal_eval(str(schools_str))
-            if isinstance(parsed, list):
-                return parsed
-        except:
-            try:
-                # Метод 2: json с заменой None
-                json_str = str(schools_str).replace("'", '"').replace('None', 'null')
-                parsed = json.loads(json_str)
-                if isinstance(parsed, list):
-                    return parsed
-            except:
-                pass
+    if "mobile" in s or "manufact" in s or "mfd" in s:
+        return "mobile/manufactured"
 
-        return []
+    if "farm" in s or "ranch" in s:
+        return "farm/ranch"
 
-    # Применяю
-    df['schools_parsed'] = df['schools'].apply(parse_schools)
+    return "other"
 
-    def extract_numeric_ratings(schools_list):
-        """Извлекаю рейтинг школ"""
 
-        if not isinstance(schools_list, list):
-            return []
+def clean_baths(x, mode_val):
+    """Очищаю признак кол-ва ван"""
 
-        numeric_ratings = []
+    if _is_missing(x) or str(x).strip().lower() in ["missing", ""]:
+        return 0
+    x_str = str(x).lower().strip()
+    match = number_pattern.search(x_str.replace(",", "."))
+    if match:
+        val = float(match.group(1))
+        if val > 10:
+            return mode_val
+        return val
+    return mode_val
 
-        for school in schools_list:
-            if not isinstance(school, dict):
-                continue
 
-            ratings = school.get('rating', [])
-            if not isinstance(ratings, list):
-                continue
+def categorize_heating(value):
+    """Категоризирую признак отопления"""
 
-            for rating_str in ratings:
-                if not isinstance(rating_str, str):
-                    continue
+    text = ('' if _is_missing(value) else str(value)).replace(',', '').lower().strip()
 
-                # NR → 0
-                if rating_str.strip().upper() == "NR":
-                    numeric_ratings.append(0)
-                    continue
+    if text == 'missing':
+        return 'Missing'
 
-                # Берём первое число
-                match = re.search(r'\d+', rating_str)
-                if match:
-                    try:
-                        numeric_ratings.append(int(match.group()))
-                    except:
-                        pass
+    if 'forced air' in text or 'forcedair' in text:
+        return 'forced air'
 
-        return numeric_ratings
+    if 'heat pump' in text:
+        return 'heatpump'
 
-    # Применяю и создаю признаки
-    df['school_ratings_list'] = df['schools_parsed'].apply(extract_numeric_ratings)
+    if 'central' in text:
+        return 'central'
 
-    # Средний рейтинг
-    df['avg_school_rating'] = df['school_ratings_list'].apply(
-        lambda x: round(np.mean(x), 2) if x else 0
-    )
+    if 'electric' in text:
+        return 'electric'
 
-    # Максимальный рейтинг
-    df['max_school_rating'] = df['school_ratings_list'].apply(
-        lambda x: max(x) if x else 0
-    )
+    if 'gas' in text or 'natural' in text:
+        return 'gas'
 
-    # Количество школ с рейтингом >= 7/10
-    df['num_good_schools'] = df['school_ratings_list'].apply(
-        lambda x: sum(1 for r in x if r >= 7) if x else 0
-    )
+    if 'baseboard' in text:
+        return 'baseboard'
 
-    def extract_distances(schools_list):
-        """Извлекаю расстояние до школ"""
-
-        if not isinstance(schools_list, list):
-            return []
-
-        distances = []
-        for school in schools_list:
-            if isinstance(school, dict):
-                data_dict = school.get('data', {})
-                if isinstance(data_dict, dict):
-                    dist_list = data_dict.get('Distance', [])
-                    if isinstance(dist_list, list):
-                        for dist_str in dist_list:
-                            if dist_str and isinstance(dist_str, str):
-                                # Ищем число перед 'mi'
-                                match = re.search(r'(\d+\.?\d*)', dist_str)
-                                if match:
-                                    try:
-                                        distances.append(float(match.group(1)))
-                                    except:
-                                        pass
-
-        return distances
-
-    # Применяю и создаю признаки
-    df['school_distances'] = df['schools_parsed'].apply(extract_distances)
-
-    # Минимальное расстояние
-    df['min_school_distance_mi'] = df['school_distances'].apply(
-        lambda x: min(x) if x else 0
-    )
+    if 'wall' in text and 'window' not in text:
+        return 'wall heater'
 
-    # Среднее расстояние
-    df['avg_school_distance_mi'] = df['school_distances'].apply(
-        lambda x: round(np.mean(x), 2) if x else 0
-    )
+    if 'radiant' in text or 'hot water' in text or 'steam' in text:
+        return 'radiant/water'
 
-    # Количество школ в пределах 1 мили
-    df['schools_within_1mi'] = df['school_distances'].apply(
-        lambda x: sum(1 for d in x if d <= 1) if x else 0
-    )
+    if 'none' in text or 'no cooling' in text:
+        return 'none'
 
-    def analyze_grades(schools_list):
-        """Разбираю уровни школ"""
-
-        if not isinstance(schools_list, list):
-            return {
-                'elementary': False, 'middle': False, 'high': False,
-                'special': False, 'grades_list': []
-            }
-
-        grades_found = []
-        for school in schools_list:
-            if isinstance(school, dict):
-                data_dict = school.get('data', {})
-                if isinstance(data_dict, dict):
-                    grades_list = data_dict.get('Grades', [])
-                    if isinstance(grades_list, list):
-                        grades_found.extend([str(g).upper() for g in grades_list])
-
-        # Анализирую найденные grades
-        grades_str = ' '.join(grades_found)
-
-        # Более точное определение
-        has_elementary = any(g in grades_str for g in ['PK-5', 'K-5', 'PK-6', 'K-6', 'PK-8', '1-5', '1-6'])
-        has_middle = any(g in grades_str for g in ['6-8', '7-8', '6-9', '5-8'])
-        has_high = any(g in grades_str for g in ['9-12', '10-12', '9-10'])
-        has_special = any(g in grades_str for g in ['K-9', 'K-12', 'PK-12', '6-12'])
-
-        return {
-            'has_elementary': has_elementary,
-            'has_middle': has_middle,
-            'has_high': has_high,
-            'has_special': has_special,
-            'grades_list': list(set(grades_found))
-        }
+    return 'other'
 
-    grades_info = df['schools_parsed'].apply(analyze_grades)
 
-    # Создаю бинарные признаки
-    df['has_elementary_school'] = grades_info.apply(lambda x: x['has_elementary'])
-    df['has_middle_school'] = grades_info.apply(lambda x: x['has_middle'])
-    df['has_high_school'] = grades_info.apply(lambda x: x['has_high'])
-    df['has_special_school'] = grades_info.apply(lambda x: x['has_special'])
+def categorize_cooling(value):
+    """Категоризирую охлаждение"""
 
-    # Создаем комбинированный признак
-    df['school_levels_count'] = (
-            df['has_elementary_school'].astype(int) +
-            df['has_middle_school'].astype(int) +
-            df['has_high_school'].astype(int)
-    )
+    if _is_missing(value) or value == 'missing' or str(value) == '0':
+        return 'Missing'
 
-    def extract_school_names_info(schools_list):
-        """Извлекаем название школ"""
-
-        if not isinstance(schools_list, list):
-            return {'names': [], 'types': []}
-
-        names = []
-        school_types = []
-
-        for school in schools_list:
-            if isinstance(school, dict):
-                name_list = school.get('name', [])
-                if name_list and isinstance(name_list, list) and len(name_list) > 0:
-                    name = str(name_list[0]).upper()
-                    names.append(name)
-
-                    # Определяю тип школы по названию
-                    if any(word in name for word in ['ELEMENTARY', 'PRIMARY']):
-                        school_types.append('elementary')
-                    elif any(word in name for word in ['MIDDLE', 'JUNIOR']):
-                        school_types.append('middle')
-                    elif any(word in name for word in ['HIGH', 'SENIOR']):
-                        school_types.append('high')
-                    elif any(word in name for word in ['ACADEMY', 'CHARTER']):
-                        school_types.append('charter')
-                    elif any(word in name for word in ['INSTITUTE', 'TECH', 'VOC']):
-                        school_types.append('vocational')
-                    elif any(word in name for word in ['MAGNET', 'MONTESSORI']):
-                        school_types.append('special')
-                    else:
-                        school_types.append('other')
-
-        return {'names': names, 'types': school_types}
-
-    # Применяю
-    schools_info = df['schools_parsed'].apply(extract_school_names_info)
-
-    # Создаю признаки по типам школ
-    def count_school_type(info, school_type):
-        return sum(1 for t in info['types'] if t == school_type)
-
-    df['num_elementary_schools'] = schools_info.apply(lambda x: count_school_type(x, 'elementary'))
-    df['num_middle_schools'] = schools_info.apply(lambda x: count_school_type(x, 'middle'))
-    df['num_high_schools'] = schools_info.apply(lambda x: count_school_type(x, 'high'))
-    df['num_charter_schools'] = schools_info.apply(lambda x: count_school_type(x, 'charter'))
-
-    def calculate_school_district_score(row):
-        """Расчет оценок"""
-        score = 0
-
-        # Базовые баллы за количество школ
-        num_schools = len(row.get('school_ratings_list', []))
-        if num_schools >= 5:
-            score += 3
-        elif num_schools >= 3:
-            score += 2
-        elif num_schools >= 1:
-            score += 1
-
-        # Качество школ (средний рейтинг)
-        avg_rating = row.get('avg_school_rating', 0)
-        if avg_rating >= 8:
-            score += 3
-        elif avg_rating >= 6:
-            score += 2
-        elif avg_rating >= 4:
-            score += 1
-
-        # Близость школ
-        min_dist = row.get('min_school_distance_mi', 100)
-        if min_dist <= 0.5:
-            score += 3
-        elif min_dist <= 1:
-            score += 2
-        elif min_dist <= 2:
-            score += 1
-
-        # Разнообразие уровней
-        levels_count = row.get('school_levels_count', 0)
-        score += min(levels_count, 3)  # максимум 3 балла
-
-        # Наличие хороших школ (рейтинг >= 7)
-        good_schools = row.get('num_good_schools', 0)
-        if good_schools >= 3:
-            score += 3
-        elif good_schools >= 2:
-            score += 2
-        elif good_schools >= 1:
-            score += 1
-
-        return min(score, 10)  # Ограничиваю максимум 10
-
-    df['school_district_score'] = df.apply(calculate_school_district_score, axis=1)
-
-    def categorize_school_score(score):
-        """Категоризируем школы по очкам"""
-        if score >= 8:
-            return 'excellent'
-        elif score >= 6:
-            return 'good'
-        elif score >= 4:
-            return 'average'
-        elif score >= 2:
-            return 'poor'
-        else:
-            return 'very_poor'
+    text = str(value).lower()
 
-    df['school_district_cat'] = df['school_district_score'].apply(categorize_school_score)
+    if 'central air' in text or 'central a/c' in text or 'air conditioning-central' in text:
+        return 'central air'
 
-    # Проверяю наличие школ определенных типов в названиях
-    def check_school_keywords(info, keywords):
-        """Признак престижных школ"""
-        names = ' '.join(info['names'])
-        return any(keyword.upper() in names for keyword in keywords)
+    if 'central' in text and ('cooling' not in text and 'electric' not in text and 'gas' not in text):
+        return 'central'
 
-    # Популярные "престижные" ключевые слова
-    prestige_keywords = ['ACADEMY', 'MAGNET', 'CHARTER', 'PREP', 'PREPARATORY']
-    df['has_prestige_school'] = schools_info.apply(
-        lambda x: check_school_keywords(x, prestige_keywords)
-    )
+    if 'refrigeration' in text:
+        return 'refrigeration'
 
-    # Школы с именами известных людей (часто показатель качества)
-    famous_names_keywords = ['WASHINGTON', 'LINCOLN', 'JEFFERSON', 'ROOSEVELT', 'KENNEDY']
-    df['has_famous_name_school'] = schools_info.apply(
-        lambda x: check_school_keywords(x, famous_names_keywords)
-    )
+    if 'evaporative' in text or 'swamp' in text:
+        return 'evaporative'
 
-    def clean_sqft(value):
-        """Очищаю площадь"""
+    if 'heat pump' in text:
+        return 'heat pump'
 
-        if pd.isna(value):
-            return 0
+    if 'window' in text or 'wall/window' in text or 'wall unit' in text:
+        return 'window/wall unit'
 
-        # привожу к строке
-        s = str(value).lower().strip()
+    if 'electric' in text:
+        return 'electric'
 
-        s = s.replace("total interior livable area:", "")
+    if 'gas' in text:
+        return 'gas'
 
-        s = s.replace("sqft", "").replace('"', "").replace("'", "")
+    if 'none' in text or 'no heating' in text:
+        return 'none'
 
-        s = s.replace(",", "")
+    if 'other' in text:
+        return 'other'
 
-        s = re.sub(r"[^\d.]", "", s)
+    if 'has cooling' in text or 'cooling system' in text:
+        return 'has cooling'
 
-        try:
-            return float(s)
-        except:
-            return 0
+    return 'other'
 
-    def categorize_sqft(x):
-        """Категоризирую площадь"""
 
-        if pd.isna(x):
-            return "missing"
-        elif x < 5000:
-            return "small"
-        elif x <= 10000:
-            return "medium"
-        else:
-            return "large"
+def categorize_parking(value):
+    """Категоризирую парковку"""
 
-    df["sqft_clean"] = df["sqft"].apply(clean_sqft)
-    df["sqft_category"] = df["sqft_clean"].apply(categorize_sqft)
+    if _is_missing(value) or str(value) == '0':
+        return 'Missing'
 
-    def clean_beds(value):
-        """Очищаю признак спален"""
+    text = str(value).lower()
 
-        if not isinstance(value, str):
-            return 0
+    if 'attached garage' in text or 'garage-attached' in text or 'garage attached' in text:
+        return 'attached garage'
 
-        val = value.lower()
+    if 'detached garage' in text or 'detached parking' in text:
+        return 'detached garage'
 
-        # Если встречаются нечисловые единицы — сразу 0
-        if re.search(r"sqft|acres?|bath", val):
-            return 0
+    if 'carport' in text:
+        return 'carport'
 
-        # '3 or more' → 3
-        if '3 or more' in val:
-            return 3
+    if 'off street' in text or 'offstreet' in text:
+        return 'off street'
 
-        # Ищу цифру в начале строки
-        match = re.search(r'\d+', val)
-        if match:
-            return int(match.group())
+    if 'on street' in text or 'onstreet' in text:
+        return 'on street'
+
+    if 'driveway' in text:
+        return 'driveway'
+
+    if 'none' in text:
+        return 'none'
+
+    if text.isdigit():
+        num = int(text)
+        if num <= 0:
+            return 'missing'
+        elif num == 1:
+            return '1 Space'
+        elif num == 2:
+            return '2 Spaces'
+        elif num == 3:
+            return '3 Spaces'
+        elif num <= 6:
+            return '4-6 Spaces'
+        else:
+            return '7+ Spaces'
 
+    if 'parking' in text and ('desc' in text or 'type' in text or 'yn' in text):
+        return 'Other Parking'
+
+    return 'other'
+
+
+def clean_lotsize(x):
+    """Очищаю признак размера участка"""
+
+    if _is_missing(x) or str(x).lower() in ["missing", "no data", "(other)"]:
         return 0
+    x_str = str(x).lower().replace(",", "").strip()
+    match = lotsize_pattern.search(x_str)
+    if not match:
+        return 0
+    if "acre" in x_str:
+        return int(float(match.group(1)) * 43560)
+    return float(match.group(1))
+
+
+def categorize_lotsize(x):
+    """Категоризирую очищенный размер участка"""
+    if x < 1500:
+        return "urban_condo"
+    elif x < 3000:
+        return "urban_rowhouse"
+    elif x < 5000:
+        return "urban_small_lot"
+    elif x < 7500:
+        return "urban_standard"
+    elif x < 10000:
+        return "suburban_small"
+    elif x < 21780:
+        return "suburban_quarter"
+    elif x < 43560:
+        return "suburban_half"
+    elif x < 108900:
+        return "suburban_full"
+    elif x < 217800:
+        return "rural_small"
+    else:
+        return "rural_large"
 
-    df['beds_clean'] = df['beds'].apply(clean_beds)
-
-    def fireplace_value(value):
-        v = str(value).lower()
-
-        # 1. Количество
-        count = 0
-        if '1' in v or 'one' in v:
-            count = 1
-        if '2' in v or 'two' in v:
-            count = 2
-        if '3' in v or 'three' in v or '4' in v or 'four' in v:
-            count = 3
-
-        # 2. Тип
-        fp_type = 'unknown'
-        if 'wood' in v:
-            fp_type = 'wood'
-        elif 'gas' in v:
-            fp_type = 'gas'
-        elif 'electric' in v:
-            fp_type = 'electric'
-        elif 'decorative' in v:
-            fp_type = 'decorative'
-        elif 'pellet' in v:
-            fp_type = 'pellet'
-
-        # 3. Расположение
-        room_count = 0
-        rooms = ['living', 'family', 'great', 'master', 'bedroom', 'den', 'basement', 'kitchen', 'dining']
-
-        for room in rooms:
-            if room in v:
-                room_count += 1
 
-        location = 'unknown'
-        if room_count == 0:
-            location = 'unknown'
-        elif room_count == 1:
-            if 'living' in v:
-                location = 'living'
-            elif 'family' in v:
-                location = 'family'
-            elif 'great' in v:
-                location = 'great'
-            elif 'master' in v:
-                location = 'master'
-            elif 'bedroom' in v:
-                location = 'bedroom'
-            elif 'den' in v:
-                location = 'den'
-            elif 'basement' in v:
-                location = 'basement'
-            elif 'kitchen' in v:
-                location = 'kitchen'
-            elif 'dining' in v:
-                location = 'dining'
+def school_features(schools_list):
+    """Считаю признаки по школам для одного объекта"""
+
+    ratings, distances, grades_found, names = [], [], [], []
+    for school in schools_list:
+        if not isinstance(school, dict):
+            continue
+
+        rating_list = school.get('rating', [])
+        if isinstance(rating_list, list):
+            for rating_str in rating_list:
+                if not isinstance(rating_str, str):
+                    continue
+                # NR → 0, иначе первое число
+                if rating_str.strip().upper() == "NR":
+                    ratings.append(0)
+                    continue
+                match = integer_pattern.search(rating_str)
+                if match:
+                    ratings.append(int(match.group()))
+
+        data_dict = school.get('data', {})
+        if isinstance(data_dict, dict):
+            dist_list = data_dict.get('Distance', [])
+            if isinstance(dist_list, list):
+                for dist_str in dist_list:
+                    if dist_str and isinstance(dist_str, str):
+                        match = distance_pattern.search(dist_str)
+                        if match:
+                            distances.append(float(match.group(1)))
+
+            grades_list = data_dict.get('Grades', [])
+            if isinstance(grades_list, list):
+                grades_found.extend([str(g).upper() for g in grades_list])
+
+        name_list = school.get('name', [])
+        if name_list and isinstance(name_list, list) and len(name_list) > 0:
+            names.append(str(name_list[0]).upper())
+
+    grades_str = ' '.join(grades_found)
+    names_str = ' '.join(names)
+
+    school_types = []
+    for name in names:
+        if any(word in name for word in ['ELEMENTARY', 'PRIMARY']):
+            school_types.append('elementary')
+        elif any(word in name for word in ['MIDDLE', 'JUNIOR']):
+            school_types.append('middle')
+        elif any(word in name for word in ['HIGH', 'SENIOR']):
+            school_types.append('high')
+        elif any(word in name for word in ['ACADEMY', 'CHARTER']):
+            school_types.append('charter')
         else:
-            location = 'multiple'
-
-        # 4. Есть ли камин?
-        has_fp = 0  # предполагаем что нет
-
-        # Проверяю отсутствия
-        if count > 0 or room_count > 0 or fp_type != 'unknown':
-            has_fp = 1
-
-        if has_fp == 0:
-            return 0, 0, 'unknown', 'unknown'
-
-        return has_fp, count, fp_type, location
-
-    # Создаю новый DataFrame из результатов
-    fireplace_features = df['fireplace'].apply(lambda x: pd.Series(fireplace_value(x)))
-
-    # Объединяю с исходными данными
-    df = pd.concat([df, fireplace_features], axis=1)
-
-    # Переименовываю
-    df = df.rename(columns={
-        0: 'has_fireplace',
-        1: 'fireplace_count',
-        2: 'fireplace_type',
-        3: 'fireplace_location'
-    })
-
-    # ТОП-50 городов США по населению
-    top_50_cities = [
-        'New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix',
-        'Philadelphia', 'San Antonio', 'San Diego', 'Dallas', 'San Jose',
-        'Austin', 'Jacksonville', 'Fort Worth', 'Columbus', 'Charlotte',
-        'San Francisco', 'Indianapolis', 'Seattle', 'Denver', 'Washington',
-        'Boston', 'El Paso', 'Nashville', 'Detroit', 'Oklahoma City',
-        'Portland', 'Las Vegas', 'Memphis', 'Louisville', 'Baltimore',
-        'Milwaukee', 'Albuquerque', 'Tucson', 'Fresno', 'Sacramento',
-        'Kansas City', 'Long Beach', 'Mesa', 'Atlanta', 'Colorado Springs',
-        'Virginia Beach', 'Raleigh', 'Omaha', 'Miami', 'Oakland',
-        'Minneapolis', 'Tulsa', 'Arlington', 'New Orleans', 'Wichita'
-    ]
+            school_types.append('other')
+
+    features = {
+        'avg_school_rating': round(np.mean(ratings), 2) if ratings else 0,
+        'max_school_rating': max(ratings) if ratings else 0,
+        'num_good_schools': sum(1 for r in ratings if r >= 7),
+        'min_school_distance_mi': min(distances) if distances else 0,
+        'avg_school_distance_mi': round(np.mean(distances), 2) if distances else 0,
+        'schools_within_1mi': sum(1 for d in distances if d <= 1),
+        'has_elementary_school': any(g in grades_str for g in elementary_grades),
+        'has_middle_school': any(g in grades_str for g in middle_grades),
+        'has_high_school': any(g in grades_str for g in high_grades),
+        'has_special_school': any(g in grades_str for g in special_grades),
+        'num_elementary_schools': school_types.count('elementary'),
+        'num_middle_schools': school_types.count('middle'),
+        'num_high_schools': school_types.count('high'),
+        'num_charter_schools': school_types.count('charter'),
+        'has_prestige_school': any(k in names_str for k in prestige_keywords),
+        'has_famous_name_school': any(k in names_str for k in famous_names_keywords),
+    }
+    features['school_levels_count'] = (
+            int(features['has_elementary_school']) +
+            int(features['has_middle_school']) +
+            int(features['has_high_school'])
+    )
 
-    # Создаю признак: 1 если город в топ-50, 0 если нет
-    df['city_cat'] = df['city'].apply(
-        lambda x: 1 if str(x).title() in top_50_cities else 0
+    # Итоговая оценка школьного округа
+    score = 0
+    num_ratings = len(ratings)
+    score += 3 if num_ratings >= 5 else 2 if num_ratings >= 3 else 1 if num_ratings >= 1 else 0
+    avg_rating = features['avg_school_rating']
+    score += 3 if avg_rating >= 8 else 2 if avg_rating >= 6 else 1 if avg_rating >= 4 else 0
+    min_dist = features['min_school_distance_mi']
+    score += 3 if min_dist <= 0.5 else 2 if min_dist <= 1 else 1 if min_dist <= 2 else 0
+    score += min(features['school_levels_count'], 3)
+    good_schools = features['num_good_schools']
+    score += 3 if good_schools >= 3 else 2 if good_schools >= 2 else 1 if good_schools >= 1 else 0
+
+    features['school_district_score'] = min(score, 10)
+    features['school_district_cat'] = (
+        'excellent' if score >= 8 else 'good' if score >= 6 else
+        'average' if score >= 4 else 'poor' if score >= 2 else 'very_poor'
     )
+    return features
 
-    def city_size_tier(city):
-        """Разбиваю города по категориям"""
 
-        city_name = str(city).title() if pd.notna(city) else ""
+def clean_sqft(value):
+    """Очищаю площадь"""
 
-        if city_name in ['New York', 'Los Angeles', 'Chicago']:
-            return 'tier_1 - Megacity'
-        elif city_name in ['Houston', 'Phoenix', 'Philadelphia', 'San Antonio',
-                           'San Diego', 'Dallas', 'San Jose']:
-            return 'tier_2 - Major'
-        elif city_name in top_50_cities:
-            return 'tier_3 - Large'
-        elif city_name:
-            return 'tier_4 - Other'
-        else:
-            return 'unknown'
+    if _is_missing(value):
+        return 0
+    s = re.sub(r"[^\d.]", "", str(value))
+    try:
+        return float(s)
+    except ValueError:
+        return 0
 
-    df["city"] = df["city"].fillna("MISSING")
 
-    df['city_tier'] = df['city'].apply(city_size_tier)
+def categorize_sqft(x):
+    """Категоризирую площадь"""
+    if x < 5000:
+        return "small"
+    elif x <= 10000:
+        return "medium"
+    return "large"
 
-    def clean_stories(value):
-        """Очищаю признак этажность"""
 
-        if pd.isna(value) or str(value).strip() in ['', 'MISSING']:
-            return 1
+def clean_beds(value):
+    """Очищаю признак спален"""
 
-        value_str = str(value).strip()
+    if not isinstance(value, str):
+        return 0
 
-        # Словарь для текстовых значений
-        text_mapping = {
-            # Один этаж
-            'one': 1, 'one story': 1, 'one level': 1, 'ranch': 1,
-            'ranch/1 story': 1, '1 story/ranch': 1, 'one story/ranch': 1,
-            '1 story': 1, '1 level': 1,
+    val = value.lower()
 
-            # Два этажа
-            'two': 2, 'two story': 2, '2 story': 2, '2 stories': 2,
-            'two stories': 2, 'two story or more': 2, '2 story or more': 2,
-            'two story/basement': 2, '2 story/basement': 2,
-            '2 or more stories': 2, 'townhouse': 2, 'condominium': 2,
+    # Если встречаются нечисловые единицы — сразу 0
+    if 'sqft' in val or 'acre' in val or 'bath' in val:
+        return 0
 
-            # Три и более
-            'three or more': 3, 'three': 3, '3 story': 3, '3+': 3,
-            'tri-level': 3,
+    if '3 or more' in val:
+        return 3
 
-            # Дробные
-            'one and one half': 1.5, '1.5 story': 1.5, '1.5 level': 1.5,
-            '2.5 story': 2.5,
+    match = integer_pattern.search(val)
+    if match:
+        return int(match.group())
 
-            # Нулевые значения
-            'lot': 0, 'acreage': 0,
+    return 0
 
-            # Типы зданий
-            'mid-rise': 5, 'high-rise': 10,
-            'multi/split': 2, 'split level': 2, 'bi-level': 2,
-        }
 
-        # Проверяю текстовые значений
-        lower_val = value_str.lower()
-        if lower_val in text_mapping:
-            return text_mapping[lower_val]
-
-        # Извлекаю числа из строк вида "2 Level, Site Built"
-        match = re.search(r'(\d+(?:\.\d+)?)', value_str)
-        if match:
-            return float(match.group(1))
-
-        # Попытка преобразовать в число
-        try:
-            num_val = float(value_str)
-            return int(num_val) if num_val.is_integer() else num_val
-        except:
-            # Если не удалось распознать - ставим 1
-            return 1
-
-    df['stories_clean'] = df['stories'].apply(clean_stories)
-
-    # Перечень признаков которые пойдут в модель
-    cols_to_use = ['status_cat', 'city_tier', 'street_cat', 'sqft_category', 'propertyType_cat',
-                   'lotsize_cat', 'heating_cat', 'cooling_cat', 'parking_cat',
-                   'stories_clean', 'pool', 'baths_clean', 'sqft_clean', 'beds_clean',
-                   'fireplace_type', 'has_fireplace', 'fireplace_count', 'fireplace_location',
-                   'Year built', 'Remodeled year',
-                   'lotsize_clean',
-                   'avg_school_rating', 'max_school_rating', 'num_good_schools',
-                   'min_school_distance_mi', 'avg_school_distance_mi',
-                   'schools_within_1mi', 'has_elementary_school',
-                   'has_middle_school', 'has_high_school', 'has_special_school',
-                   'school_levels_count', 'num_elementary_schools', 'num_middle_schools', 'num_high_schools',
-                   'num_charter_schools', 'school_district_score', 'school_district_cat', 'has_prestige_school',
-                   'has_famous_name_school']
-
-    # Создаю новый датафрейм
-    data_to_use = df[cols_to_use].copy()
-
-    # Були
-    columns_bool = ['pool', 'has_elementary_school', 'has_middle_school', 'has_high_school',
-                    'has_special_school', 'has_prestige_school', 'has_famous_name_school']
+def fireplace_value(value):
+    """Разбираю описание камина: (есть ли, количество, тип, расположение)"""
+    v = str(value).lower()
 
-    for col in columns_bool:
-        if col in data_to_use.columns:
-            data_to_use[col] = data_to_use[col].fillna(0).astype(int)
+    # 1. Количество
+    count = 0
+    if '3' in v or 'three' in v or '4' in v or 'four' in v:
+        count = 3
+    elif '2' in v or 'two' in v:
+        count = 2
+    elif '1' in v or 'one' in v:
+        count = 1
 
-    # Пост-обработка строковых колонок
-    def clean_string_columns(df):
-        """
-        Финальная очистка всех строковых колонок
-        """
-        # Нахожу все строковые колонки
-        string_cols = df.select_dtypes(include=['object', 'string']).columns.tolist()
+    # 2. Тип
+    fp_type = 'unknown'
+    for candidate in ['wood', 'gas', 'electric', 'decorative', 'pellet']:
+        if candidate in v:
+            fp_type = candidate
+            break
+
+    # 3. Расположение
+    found_rooms = [room for room in fireplace_rooms if room in v]
+    if not found_rooms:
+        location = 'unknown'
+    elif len(found_rooms) == 1:
+        location = found_rooms[0]
+    else:
+        location = 'multiple'
+
+    # 4. Есть ли камин?
+    has_fp = int(count > 0 or len(found_rooms) > 0 or fp_type != 'unknown')
+
+    return has_fp, count, fp_type, location
 
-        for col in string_cols:
-            # Заполняю пропуски
-            df[col] = df[col].fillna('unknown')
 
-            # Преобразую в строку
-            df[col] = df[col].astype(str)
+def city_size_tier(city):
+    """Разбиваю города по категориям"""
 
-            # Очищаю
-            df[col] = df[col].str.strip().str.lower()
-            df[col] = df[col].str.replace(',', '', regex=False)
+    city_name = str(city).title()
 
-            # Заменяю пустые и 'nan' строки
-            df[col] = df[col].replace(['', 'nan', 'none', 'null'], 'unknown')
+    if city_name in tier_1_cities:
+        return 'tier_1 - Megacity'
+    elif city_name in tier_2_cities:
+        return 'tier_2 - Major'
+    elif city_name in top_50_cities:
+        return 'tier_3 - Large'
+    elif city_name:
+        return 'tier_4 - Other'
+    return 'unknown'
 
-        return df
 
-    # Применяю финальную очистку
-    data_model = clean_string_columns(data_to_use)
+def clean_stories(value):
+    """Очищаю признак этажность"""
+
+    if _is_missing(value) or str(value).strip() in ['', 'MISSING']:
+        return 1
+
+    value_str = str(value).strip()
+
+    lower_val = value_str.lower()
+    if lower_val in stories_text_mapping:
+        return stories_text_mapping[lower_val]
+
+    # Извлекаю числа из строк вида "2 Level, Site Built"
+    match = number_pattern.search(value_str)
+    if match:
+        return float(match.group(1))
+
+    return _parse_stories_number(value_str)
+
+
+def _clean_string_value(value):
+    """Финальная очистка строкового значения (как в clean_string_columns)"""
+    value = str(value).strip().lower().replace(',', '')
+    return 'unknown' if value in ['', 'nan', 'none', 'null'] else value
+
+
+def _preprocess_record(record, state=None):
+    """
+    Строю признаки модели для одного объекта без pandas.
+    Результат совпадает со строкой _do_preprocessing(pd.DataFrame([record]), state)
+    """
+    state = state or {}
+
+    # Бассейн: PrivatePool приоритетнее, чем 'private pool'
+    pool = None
+    for col in ['PrivatePool', 'private pool']:
+        if col in record and not _is_missing(record[col]):
+            pool = record[col]
+            break
+    if pool is None:
+        pool = 'no'
+    pool = isinstance(pool, str) and pool.lower().strip() == 'yes'
+
+    baths = record['baths']
+    mode_baths = state.get('mode_baths')
+    if mode_baths is None:
+        # Без состояния мода baths в одной строке — само значение (если оно в диапазоне 1–10)
+        match = number_pattern.search(str(baths).replace(",", ""))
+        mode_baths = float(match.group(1)) if match else None
+        if mode_baths is None or not 1 <= mode_baths <= 10:
+            raise ValueError("Не удалось вычислить моду baths: нет значений в диапазоне 1–10")
+
+    home_facts = extract_home_facts(record['homeFacts'])
+    n_labels = state.get('home_fact_labels')
+    home_facts = coerce_home_facts(home_facts, len(home_facts) if n_labels is None else n_labels)
+    # Метки, которых нет в строке, — NaN, как у home_facts_columns в общем пути
+    home_facts = {label: home_facts.get(label, np.nan) for label in home_fact_labels}
+
+    lotsize_clean = clean_lotsize(home_facts['lotsize'])
+    sqft_clean = clean_sqft(record['sqft'])
+    has_fireplace, fireplace_count, fireplace_type, fireplace_location = _lookup(
+        'fireplace', record['fireplace'], fireplace_value)
+    city = record['city']
+    street = record['street']
+
+    features = {
+        'status_cat': _lookup('status', record['status'], normalize_status),
+        'city_tier': city_size_tier("MISSING" if _is_missing(city) else city),
+        'street_cat': 'undisclosed' if _is_missing(street) or street in undisclosed else 'known',
+        'sqft_category': categorize_sqft(sqft_clean),
+        'propertyType_cat': _lookup('propertyType', record['propertyType'], normalize_property_type),
+        'lotsize_cat': categorize_lotsize(lotsize_clean),
+        'heating_cat': _lookup('heating', home_facts['Heating'], categorize_heating),
+        'cooling_cat': _lookup('cooling', home_facts['Cooling'], categorize_cooling),
+        'parking_cat': _lookup('parking', home_facts['Parking'], categorize_parking),
+        'stories_clean': clean_stories(record['stories']),
+        'pool': int(pool),
+        'baths_clean': clean_baths(baths, mode_baths),
+        'sqft_clean': sqft_clean,
+        'beds_clean': clean_beds(record['beds']),
+        'fireplace_type': fireplace_type,
+        'has_fireplace': has_fireplace,
+        'fireplace_count': fireplace_count,
+        'fireplace_location': fireplace_location,
+        'Year built': home_facts['Year built'],
+        'Remodeled year': home_facts['Remodeled year'],
+        'lotsize_clean': lotsize_clean,
+    }
+    features.update(school_features(parse_schools(record['schools'])))
+
+    for col in columns_bool:
+        features[col] = int(features[col])
+
+    # Строковые значения чищу так же, как clean_string_columns
+    for col, value in features.items():
+        if isinstance(value, str):
+            features[col] = _clean_string_value(value)
 
-    return  data_model
\ No newline at end of file
+    return {col: features[col] for col in cols_to_use}
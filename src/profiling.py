@@ -0,0 +1,209 @@
+"""
+Профилирование предобработки по блокам признаков
+
+Включается по требованию:
+- PREPROCESS_PROFILE=1 — каждый вызов _do_preprocessing пишет разбивку в лог
+  (удобно для ночной оценки: python -m score ... с этой переменной);
+- заголовок X-Profile: 1 у /predict — разбивка приходит в поле profile ответа
+  (только если сервис запущен с PREPROCESS_PROFILE_HEADER=1).
+
+Для каждого блока считаю время и число копий — вызовов DataFrame/Series.copy и .astype
+из кода блока. Вызовы внутри них (copy, вызванный из astype) не считаю: одна операция —
+одна копия. Это число вызовов, а не байт: copy(deep=False) и astype к тому же типу данных
+почти не копируют, а копии через numpy и конструкторы pandas сюда не попадают.
+Счётчики ставятся на NDFrame, пока открыт хотя бы один профиль, и снимаются с закрытием
+последнего. Значение memory вместо 1 добавляет пик памяти через tracemalloc —
+он замедляет выделения в разы, поэтому время в таком режиме завышено.
+Без активного профиля stage() стоит одно чтение ContextVar
+"""
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Профилировать каждый вызов предобработки и писать результат в лог: 0, 1 или memory
+PROFILE_MODE = os.getenv("PREPROCESS_PROFILE", "0")
+PROFILE_MODES = ("1", "memory")
+# Разрешить профилирование отдельного запроса заголовком X-Profile
+PROFILE_HEADER_ENABLED = os.getenv("PREPROCESS_PROFILE_HEADER", "0") == "1"
+
+_active: contextvars.ContextVar = contextvars.ContextVar("preprocessing_profile", default=None)
+
+# tracemalloc и счётчик копий общие на процесс: включаю, пока жив хотя бы один профиль
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_copy_hook_users = 0
+# Исходные NDFrame.copy и astype, пока на их месте стоят счётчики
+_copy_originals: Dict[str, Any] = {}
+
+# Глубина вложенных copy/astype в текущем потоке: считаю только внешний вызов
+_copy_depth: contextvars.ContextVar = contextvars.ContextVar("profile_copy_depth", default=0)
+
+
+class Profile:
+    """Разбивка одного прогона по блокам"""
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.copies = 0
+        self.peak_bytes = 0
+        self.seconds = 0.0
+        self._baseline = 0
+
+    def report(self) -> Dict[str, Any]:
+        """Разбивка для ответа API и лога: время в мс, память в МБ"""
+        report = {"total_ms": round(self.seconds * 1000, 3), "copies": self.copies, "stages": {}}
+        if self.memory:
+            report["peak_memory_mb"] = round(self.peak_bytes / 2 ** 20, 3)
+        for name, stage in self.stages.items():
+            report["stages"][name] = {
+                "ms": round(stage["seconds"] * 1000, 3),
+                "calls": stage["calls"],
+                "copies": stage["copies"],
+            }
+            if self.memory:
+                report["stages"][name]["peak_memory_mb"] = round(stage["peak_bytes"] / 2 ** 20, 3)
+        return report
+
+    def format(self) -> str:
+        """Одна строка для лога: блоки по убыванию времени"""
+        stages = sorted(self.stages.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        parts = ", ".join(f"{name} {stage['seconds'] * 1000:.1f} мс" for name, stage in stages)
+        memory = f", пик памяти {self.peak_bytes / 2 ** 20:.1f} МБ" if self.memory else ""
+        return f"⏱️ Предобработка {self.seconds * 1000:.1f} мс{memory}, копий {self.copies}: {parts}"
+
+
+def _count_copies(method):
+    """Обёртка NDFrame.copy/astype: считаю внешний вызов в активном профиле потока"""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        profile = _active.get()
+        if profile is None:
+            return method(*args, **kwargs)
+        depth = _copy_depth.get()
+        if depth == 0:
+            profile.copies += 1
+        token = _copy_depth.set(depth + 1)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _copy_depth.reset(token)
+
+    return wrapper
+
+
+def _install_copy_hook():
+    """Ставлю счётчики на NDFrame.copy и astype при первом открытом профиле"""
+    global _copy_hook_users
+    with _tracing_lock:
+        if _copy_hook_users == 0:
+            from pandas.core.generic import NDFrame
+            for name in ("copy", "astype"):
+                _copy_originals[name] = NDFrame.__dict__[name]
+                setattr(NDFrame, name, _count_copies(_copy_originals[name]))
+        _copy_hook_users += 1
+
+
+def _remove_copy_hook():
+    """Возвращаю исходные методы, когда закрыт последний профиль"""
+    global _copy_hook_users
+    with _tracing_lock:
+        _copy_hook_users -= 1
+        if _copy_hook_users == 0:
+            from pandas.core.generic import NDFrame
+            for name, method in _copy_originals.items():
+                setattr(NDFrame, name, method)
+            _copy_originals.clear()
+
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0:
+            tracemalloc.stop()
+
+
+def active() -> bool:
+    return _active.get() is not None
+
+
+@contextmanager
+def profile(memory: bool = False):
+    """
+    Профилирую блок кода в текущем потоке. memory=True — ещё и пики памяти;
+    под нагрузкой они приблизительны: tracemalloc видит выделения всех потоков
+    """
+    _install_copy_hook()
+    current = Profile(memory)
+    if memory:
+        _start_tracing()
+        current._baseline = tracemalloc.get_traced_memory()[0]
+    token = _active.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        _active.reset(token)
+        if memory:
+            _stop_tracing()
+        _remove_copy_hook()
+
+
+@contextmanager
+def stage(name: str):
+    """Именованный блок внутри активного профиля; без профиля — ничего не делаю"""
+    current: Optional[Profile] = _active.get()
+    if current is None:
+        yield
+        return
+
+    if current.memory:
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+    copies_before = current.copies
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stats = current.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "copies": 0, "peak_bytes": 0})
+        stats["seconds"] += elapsed
+        stats["calls"] += 1
+        stats["copies"] += current.copies - copies_before
+        if current.memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            stats["peak_bytes"] = max(stats["peak_bytes"], peak - memory_before)
+            current.peak_bytes = max(current.peak_bytes, peak - current._baseline)
+
+
+@contextmanager
+def logged():
+    """
+    Для PREPROCESS_PROFILE=1: профилирую блок и пишу разбивку в лог.
+    Если профиль уже открыт снаружи (заголовок X-Profile), он и собирает блоки
+    """
+    if PROFILE_MODE not in PROFILE_MODES or active():
+        yield
+        return
+    with profile(PROFILE_MODE == "memory") as current:
+        yield
+    logger.info(current.format())
@@ -0,0 +1,319 @@
+"""
+Реестр версий модели и подмена модели без перезапуска сервиса
+
+    python -m registry list ../models/registry
+    python -m registry publish ../models/registry ../models/housing_model.json --version 2026-10-17
+    python -m registry activate ../models/registry 2026-10-01     # закрепить версию (откат)
+    python -m registry activate ../models/registry --latest       # снова брать новейшую
+
+Реестр — папка с подпапкой на версию: housing_model.json + housing_model.cbm
+(или housing_model.pkl) и отчёт обучения metrics.json, если он был. Публикация
+собирает версию во временной папке и переименовывает её целиком, поэтому сервис
+не увидит версию наполовину. Нужная версия — из файла ACTIVE, без него — новейшая
+по имени (по умолчанию имя — время публикации в UTC).
+
+ModelReloader в сервисе загружает версию в потоке, прогревает её (warmup.py)
+и только потом подменяет модель; начатые запросы доживают на старой
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telemetry import MODEL_RELOADS
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_FILE = "ACTIVE"
+# Файлы модели внутри версии: нативный артефакт важнее pickle, как в HousePricePredictor._find_model
+MODEL_FILES = ("housing_model.json", "housing_model.pkl")
+METRICS_FILE = "metrics.json"
+
+version_pattern = re.compile(r"\w[\w.-]*")
+
+
+def _version_key(version: str) -> list:
+    """Сортировка с числами по значению: v2 раньше v10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", version)]
+
+
+class ModelRegistry:
+    """Версии модели в папке root"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def model_path(self, version: str) -> Optional[str]:
+        """Файл, который грузит HousePricePredictor; None — такой версии нет"""
+        if not version_pattern.fullmatch(version):
+            return None
+        for filename in MODEL_FILES:
+            path = os.path.join(self.root, version, filename)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def versions(self) -> List[str]:
+        """Опубликованные версии от старых к новым; недособранные (.tmp-папки) пропускаю"""
+        if not os.path.isdir(self.root):
+            return []
+        names = [name for name in os.listdir(self.root) if self.model_path(name) is not None]
+        return sorted(names, key=_version_key)
+
+    def pinned(self) -> Optional[str]:
+        """Версия из ACTIVE или None"""
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def target(self) -> Optional[str]:
+        """Версия, которую сейчас должен обслуживать сервис"""
+        pinned = self.pinned()
+        if pinned is not None:
+            if self.model_path(pinned) is None:
+                logger.warning(f"⚠️ В {ACTIVE_FILE} версия {pinned}, но её нет в реестре {self.root}")
+                return None
+            return pinned
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def pin(self, version: Optional[str]):
+        """Закрепляю версию (None — снова новейшая); файл подменяю атомарно"""
+        path = os.path.join(self.root, ACTIVE_FILE)
+        if version is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        if self.model_path(version) is None:
+            raise LookupError(f"Версии {version} нет в реестре {self.root}")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(version + "\n")
+        os.replace(path + ".tmp", path)
+
+    def describe(self, version: str) -> Dict[str, Any]:
+        path = self.model_path(version)
+        published = os.path.getmtime(os.path.dirname(path))
+        info = {
+            "version": version,
+            "model_file": os.path.basename(path),
+            "published": datetime.fromtimestamp(published, timezone.utc).isoformat(timespec="seconds"),
+        }
+        metrics_path = os.path.join(self.root, version, METRICS_FILE)
+        if os.path.exists(metrics_path):
+            with open(metrics_path, encoding="utf-8") as f:
+                report = json.load(f)
+            selected = report.get("selected")
+            info["selected"] = selected
+            info["test"] = report.get("models", {}).get(selected, {}).get("test")
+        return info
+
+    def publish(self, model_path: str, version: Optional[str] = None) -> str:
+        """
+        Копирую модель (манифест .json с его .cbm или .pkl) и её <префикс>.metrics.json
+        в новую версию; возвращаю имя версии
+        """
+        version = version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        if not version_pattern.fullmatch(version):
+            raise ValueError(f"Недопустимое имя версии: {version!r}")
+        final_dir = os.path.join(self.root, version)
+        if os.path.exists(final_dir):
+            raise FileExistsError(f"Версия {version} уже есть в реестре {self.root}")
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = os.path.join(self.root, f".{version}.{os.getpid()}.tmp")
+        os.mkdir(tmp_dir)
+        try:
+            if model_path.endswith(".json"):
+                with open(model_path, encoding="utf-8") as f:
+                    manifest = json.load(f)
+                shutil.copy2(os.path.join(os.path.dirname(model_path), manifest["model_file"]),
+                             os.path.join(tmp_dir, "housing_model.cbm"))
+                manifest["model_file"] = "housing_model.cbm"
+                with open(os.path.join(tmp_dir, "housing_model.json"), "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, ensure_ascii=False, indent=2)
+            else:
+                shutil.copy2(model_path, os.path.join(tmp_dir, "housing_model.pkl"))
+
+            metrics_path = os.path.splitext(model_path)[0] + ".metrics.json"
+            if os.path.exists(metrics_path):
+                shutil.copy2(metrics_path, os.path.join(tmp_dir, METRICS_FILE))
+            os.rename(tmp_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"✅ Версия {version} опубликована в {self.root}")
+        return version
+
+
+class ModelReloader:
+    """
+    Загружаю версии из реестра в фоне и отдаю готовую модель в activate.
+    load(model_path, version) создаёт предсказатель, warm(predictor) прогревает его
+    и кидает ошибку, если модель не годится; загрузки идут по одной.
+    Версия, выбранная вручную (reload с версией, rollback), закрепляется в процессе —
+    пока её не снять, за реестром не слежу
+    """
+
+    def __init__(self, registry: ModelRegistry, load: Callable[[str, Optional[str]], Any],
+                 activate: Callable[[Any], Awaitable[None]], warm: Optional[Callable[[Any], Any]] = None,
+                 poll_s: float = 0, version: Optional[str] = None, history_size: int = 5):
+        self.registry = registry
+        self.load = load
+        self.activate = activate
+        self.warm = warm
+        self.poll_s = poll_s
+        self.version = version
+        self.history_size = history_size
+        # Прежние активные версии, последняя — предыдущая
+        self.history: List[str] = []
+        self.pinned = False
+        self.reloads = {"ok": 0, "failed": 0}
+        self.last_error: Optional[str] = None
+        # Сломанные версии не перезагружаю на каждом опросе реестра
+        self._failed: set = set()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _prepare(self, model_path: str, version: str):
+        start = time.perf_counter()
+        loaded = self.load(model_path, version)
+        if self.warm is not None:
+            self.warm(loaded)
+        logger.info(f"✅ Версия {version} загружена и прогрета за {time.perf_counter() - start:.2f} с")
+        return loaded
+
+    async def _switch(self, version: str, pin: bool, remember: bool):
+        model_path = self.registry.model_path(version)
+        if model_path is None:
+            raise LookupError(f"Версии {version} нет в реестре {self.registry.root}")
+        try:
+            loaded = await asyncio.to_thread(self._prepare, model_path, version)
+        except Exception as e:
+            self.reloads["failed"] += 1
+            MODEL_RELOADS.inc("failed")
+            self.last_error = f"{version}: {e}"
+            self._failed.add(version)
+            logger.error(f"❌ Версия {version} не загружена, остаётся {self.version}: {e}")
+            raise
+
+        await self.activate(loaded)
+        if remember and self.version is not None and self.version != version:
+            self.history = (self.history + [self.version])[-self.history_size:]
+        logger.info(f"♻️ Активна версия модели {version} (была {self.version})")
+        self.version = version
+        self.pinned = pin
+        self.reloads["ok"] += 1
+        MODEL_RELOADS.inc("ok")
+        self._failed.discard(version)
+
+    async def reload(self, version: Optional[str] = None) -> str:
+        """Загрузить версию и закрепить её; без версии — ту, что велит реестр, и следить за ним дальше"""
+        async with self._lock:
+            target = version or self.registry.target()
+            if target is None:
+                raise LookupError(f"В реестре {self.registry.root} нет версий")
+            await self._switch(target, pin=version is not None, remember=True)
+            return target
+
+    async def rollback(self) -> str:
+        """Вернуть предыдущую активную версию и закрепить её"""
+        async with self._lock:
+            if not self.history:
+                raise LookupError("Нет предыдущей версии для отката")
+            version = self.history[-1]
+            await self._switch(version, pin=True, remember=False)
+            self.history.pop()
+            return version
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_s)
+            if self.pinned or self._lock.locked():
+                continue
+            try:
+                target = self.registry.target()
+                if target is not None and target != self.version and target not in self._failed:
+                    async with self._lock:
+                        await self._switch(target, pin=False, remember=True)
+            except Exception:
+                # Ошибку уже записал _switch; слежу дальше
+                pass
+
+    def start(self):
+        if self.poll_s > 0 and self._task is None:
+            self._task = asyncio.create_task(self._watch())
+            logger.info(f"👀 Слежу за реестром {self.registry.root} раз в {self.poll_s:g} с")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "active": self.version,
+            "pinned": self.pinned,
+            "history": list(self.history),
+            "registry": os.path.abspath(self.registry.root),
+            "registry_target": self.registry.target(),
+            "versions": [self.registry.describe(version) for version in self.registry.versions()],
+            "poll_s": self.poll_s,
+            "reloads": dict(self.reloads),
+            "last_error": self.last_error,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Реестр версий модели")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="Версии и какая из них нужна сервису")
+    list_parser.add_argument("registry", help="Папка реестра")
+
+    publish_parser = commands.add_parser("publish", help="Опубликовать модель как новую версию")
+    publish_parser.add_argument("registry", help="Папка реестра")
+    publish_parser.add_argument("model", help="Манифест .json нативного артефакта или .pkl")
+    publish_parser.add_argument("--version", default=None, help="Имя версии (по умолчанию — время UTC)")
+
+    activate_parser = commands.add_parser("activate", help="Закрепить версию или вернуться к новейшей")
+    activate_parser.add_argument("registry", help="Папка реестра")
+    activate_parser.add_argument("version", nargs="?", default=None, help="Версия")
+    activate_parser.add_argument("--latest", action="store_true", help="Снять закрепление")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    registry = ModelRegistry(args.registry)
+    if args.command == "publish":
+        print(registry.publish(args.model, args.version))
+    elif args.command == "activate":
+        if (args.version is None) == (not args.latest):
+            parser.error("нужна версия или --latest")
+        registry.pin(args.version)
+        print(registry.target())
+    else:
+        target = registry.target()
+        for version in registry.versions():
+            info = registry.describe(version)
+            r2 = (info.get("test") or {}).get("r2")
+            quality = f"  {info['selected']} R² {r2:.4f}" if r2 is not None else ""
+            print(f"{'*' if version == target else ' '} {version}  {info['published']}{quality}")
+        if registry.pinned():
+            print(f"закреплена {registry.pinned()} ({ACTIVE_FILE})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field, validator, ConfigDict
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, TypeAdapter, validator, ConfigDict
+from typing import Annotated, Optional, List, Dict, Any, get_args, get_origin
+from typing_extensions import NotRequired, TypedDict
+from functools import lru_cache
 from enum import Enum
 import re
 
@@ -124,6 +126,57 @@ class HouseInput(BaseModel):
     MlsId: Optional[str] = Field(None, description="MLS ID (дубликат)")
 
 
+# Облегчённая проверка для /predict и /predict/batch: TypedDict, выведенные из HouseInput и
+# вложенных моделей — те же поля и ограничения, но результат сразу словарь для предсказателя
+# с ключами сырых столбцов датасета ('private pool', 'mls-id'), без экземпляра модели и model_dump.
+# Пробелы обрезаются там же, где у моделей: только на верхнем уровне
+def _record_annotation(annotation):
+    """Тип поля модели → тип поля TypedDict: вложенные модели заменяю их TypedDict"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return record_type(annotation)
+    args = get_args(annotation)
+    if not args:
+        return annotation
+    return get_origin(annotation)[tuple(_record_annotation(arg) for arg in args)]
+
+
+@lru_cache(maxsize=None)
+def record_type(model: type) -> type:
+    """
+    TypedDict с полями модели: ключи — алиасы (как в JSON), ограничения Field — через Annotated,
+    необязательные поля — NotRequired. Конфиг — только str_strip_whitespace модели
+    """
+    fields = {}
+    for name, field in model.model_fields.items():
+        annotation = _record_annotation(field.annotation)
+        if field.metadata:
+            annotation = Annotated[(annotation, *field.metadata)]
+        fields[field.alias or name] = annotation if field.is_required() else NotRequired[annotation]
+    record = TypedDict(f"{model.__name__}Record", fields)
+    record.__pydantic_config__ = ConfigDict(str_strip_whitespace=model.model_config.get("str_strip_whitespace", False))
+    return record
+
+
+HouseRecord = record_type(HouseInput)
+house_record_adapter = TypeAdapter(HouseRecord)
+
+# populate_by_name у HouseInput: поля с алиасом принимаются и под питоновским именем
+_FIELD_ALIASES = {name: field.alias for name, field in HouseInput.model_fields.items() if field.alias}
+# Отсутствующие поля — None, как у HouseInput.model_dump: у каждой строки одинаковый набор ключей
+_RECORD_DEFAULTS = {field.alias or name: field.default for name, field in HouseInput.model_fields.items()}
+
+
+def validate_house(payload: Any) -> Dict[str, Any]:
+    """Разобранный JSON объявления → словарь для предсказателя; ошибки — ValidationError, как у HouseInput"""
+    if isinstance(payload, dict) and not _FIELD_ALIASES.keys().isdisjoint(payload):
+        # Как у populate_by_name: значение под алиасом приоритетнее
+        payload = dict(payload)
+        for name, alias in _FIELD_ALIASES.items():
+            if name in payload:
+                payload.setdefault(alias, payload.pop(name))
+    return {**_RECORD_DEFAULTS, **house_record_adapter.validate_python(payload)}
+
+
 class PredictionResponse(BaseModel):
     """Схема ответа с предсказанием"""
     model_config = ConfigDict(
@@ -132,7 +185,8 @@ class PredictionResponse(BaseModel):
                 "success": True,
                 "predicted_price": 418000.0,
                 "predicted_price_formatted": "$418,000",
-                "message": "Предсказание успешно выполнено"
+                "message": "Предсказание успешно выполнено",
+                "model_version": "20261017T120000Z"
             }
         }
     )
@@ -140,39 +194,48 @@ class PredictionResponse(BaseModel):
     success: bool = Field(..., description="Успешно ли выполнено предсказание")
     predicted_price: float = Field(..., description="Предсказанная цена в долларах", example=418000.0)
     predicted_price_formatted: str = Field(..., description="Отформатированная цена", example="$418,000")
+    price_low: Optional[float] = Field(
+        None, description="Нижняя граница интервала цены (только с ?intervals=true; null — модель без калибровки)"
+    )
+    price_high: Optional[float] = Field(None, description="Верхняя граница интервала цены (только с ?intervals=true)")
     message: Optional[str] = Field(None, description="Дополнительное сообщение")
+    model_version: Optional[str] = Field(None, description="Версия модели из реестра, которая посчитала ответ")
+    profile: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Разбивка предобработки по блокам (только с заголовком X-Profile: 1 или memory)"
+    )
+
+
+class BatchPredictionRequest(BaseModel):
+    """Схема для пакетного предсказания"""
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "houses": [
+                    {
+                        "status": "Active",
+                        "propertyType": "Single Family Home",
+                        "beds": "4",
+                        "baths": "3.5",
+                        "sqft": "2900",
+                        "state": "NC"
+                    },
+                    {
+                        "status": "for sale",
+                        "propertyType": "single-family home",
+                        "beds": "3 Beds",
+                        "baths": "3 Baths",
+                        "sqft": "1,947 sqft",
+                        "state": "WA"
+                    }
+                ]
+            }
+        }
+    )
+
+    houses: List[HouseInput] = Field(..., description="Список домов для предсказания")
 
 
-# class BatchPredictionRequest(BaseModel):
-#     """Схема для пакетного предсказания"""
-#     model_config = ConfigDict(
-#         json_schema_extra={
-#             "example": {
-#                 "houses": [
-#                     {
-#                         "status": "Active",
-#                         "propertyType": "Single Family Home",
-#                         "beds": "4",
-#                         "baths": "3.5",
-#                         "sqft": "2900",
-#                         "state": "NC"
-#                     },
-#                     {
-#                         "status": "for sale",
-#                         "propertyType": "single-family home",
-#                         "beds": "3 Beds",
-#                         "baths": "3 Baths",
-#                         "sqft": "1,947 sqft",
-#                         "state": "WA"
-#                     }
-#                 ]
-#             }
-#         }
-#     )
-#
-#     houses: List[HouseInput] = Field(..., description="Список домов для предсказания")
-#
-#
 # class BatchPredictionResponse(BaseModel):
 #     """Схема ответа для пакетного предсказания"""
 #     model_config = ConfigDict(
@@ -0,0 +1,238 @@
+"""
+Пакетная оценка файла с объявлениями без поднятия сервиса
+
+    python -m score data.csv -o predictions.csv
+    python -m score data.parquet -o predictions.parquet --workers 8 --chunk-size 20000
+
+Вход — сырые столбцы датасета (как в notebook/data), выход — predicted_price
+в порядке строк входа, плюс колонка-идентификатор, если она задана.
+Если в модели нет статистик предобработки (мода baths, число меток homeFacts), я сначала
+считаю их по всему входу (Preprocessor.partial_fit, как feature_store.fit_pass): иначе каждый
+кусок брал бы свои, и цены зависели бы от --chunk-size
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from batching import predict_chunk
+from predictor import HousePricePredictor
+from preprocessing import Preprocessor
+
+logger = logging.getLogger(__name__)
+
+# Модель в процессе-воркере: загружается один раз в _init_worker
+_predictor: Optional[HousePricePredictor] = None
+
+
+def _init_worker(model_path: Optional[str], low_memory: bool = False, preprocess_workers: int = 0,
+                 state: Optional[Dict[str, Any]] = None):
+    """Загружаю модель один раз на процесс; state — статистики предобработки по входу (fit_input)"""
+    global _predictor
+    logging.getLogger("predictor").setLevel(logging.WARNING)
+    _predictor = HousePricePredictor(model_path, low_memory=low_memory, preprocess_workers=preprocess_workers)
+    if state is not None:
+        _predictor.preprocessor.state = dict(state)
+
+
+def _score_chunk(chunk: pd.DataFrame) -> Tuple[np.ndarray, int]:
+    """
+    Считаю кусок целиком; если он падает — по одной строке.
+    Для строк с ошибкой возвращаю NaN
+    """
+    try:
+        return _predictor.predict_frame(chunk), 0
+    except Exception:
+        records = chunk.astype(object).where(chunk.notna(), None).to_dict('records')
+        outcomes = predict_chunk(_predictor.predict_batch, records)
+        prices = np.array([np.nan if error is not None else price for price, error in outcomes])
+        return prices, sum(error is not None for _, error in outcomes)
+
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def _require_pyarrow():
+    """pyarrow нужен только для Parquet, поэтому импортирую его по требованию"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise SystemExit("❌ Для Parquet нужен pyarrow: pip install pyarrow")
+
+
+def read_chunks(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Читаю CSV или Parquet кусками по chunk_size строк"""
+    if _is_parquet(path):
+        pa = _require_pyarrow()
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, low_memory=False)
+
+
+def fit_input(input_path: str, chunk_size: int) -> Dict[str, Any]:
+    """Статистики предобработки по всему входу: проход кусками через partial_fit"""
+    preprocessor = Preprocessor()
+    for chunk in read_chunks(input_path, chunk_size):
+        preprocessor.partial_fit(chunk)
+    if not preprocessor.fitted:
+        raise ValueError(f"Не удалось посчитать статистики предобработки по {input_path}: нет значений baths")
+    return preprocessor.state
+
+
+def preprocessing_state(model_path: Optional[str], input_path: str, chunk_size: int) -> Optional[Dict[str, Any]]:
+    """
+    Статистики для воркеров: None, если они есть в модели, иначе — по всему входу.
+    Pickle-пайплайн без быстрого пути предобрабатывает сам и чужие статистики не примет —
+    такую модель без статистик не считаю
+    """
+    predictor = HousePricePredictor(model_path)
+    if predictor.preprocessor.fitted:
+        return None
+    if predictor.model_format == "pickle" and predictor._fast_path is None:
+        raise ValueError(f"В модели {predictor.model_path} нет статистик предобработки, а пайплайн считает их "
+                         f"по каждому куску — цены зависели бы от --chunk-size. "
+                         f"Переобучите модель (python -m train) или экспортируйте её с --train-data")
+    logger.warning("⚠️ В модели нет статистик предобработки — считаю их по всему входу")
+    state = fit_input(input_path, chunk_size)
+    logger.info(f"📐 state {state}")
+    return state
+
+
+class PredictionWriter:
+    """Дописываю предсказания в CSV или Parquet по мере готовности"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._parquet = None
+        self._header = True
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self, frame: pd.DataFrame):
+        if _is_parquet(self.path):
+            pa = _require_pyarrow()
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pa.parquet.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="a", header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def _score_chunks(pool, chunks: Iterator[pd.DataFrame], workers: int,
+                  id_column: Optional[str]) -> Iterator[Tuple[Optional[np.ndarray], Tuple[np.ndarray, int]]]:
+    """
+    Раздаю куски воркерам и отдаю результаты в порядке входа.
+    В работе держу не больше 2 кусков на процесс, чтобы не читать весь файл в память
+    """
+    if pool is None:
+        for chunk in chunks:
+            yield (chunk[id_column].to_numpy() if id_column else None), _score_chunk(chunk)
+        return
+
+    pending = deque()
+    for chunk in chunks:
+        # Идентификаторы остаются в основном процессе, в воркер уходит только кусок
+        ids = chunk[id_column].to_numpy() if id_column else None
+        pending.append((ids, pool.apply_async(_score_chunk, (chunk,))))
+        if len(pending) >= 2 * workers:
+            ids, result = pending.popleft()
+            yield ids, result.get()
+    while pending:
+        ids, result = pending.popleft()
+        yield ids, result.get()
+
+
+def score_file(input_path: str, output_path: str, model_path: Optional[str] = None,
+               workers: Optional[int] = None, chunk_size: int = 10000,
+               id_column: Optional[str] = None, low_memory: bool = False,
+               preprocess_workers: int = 0) -> dict:
+    """
+    Оцениваю файл кусками в пуле процессов и пишу результат по порядку.
+    low_memory — компактная предобработка кусков (меньше пик памяти на воркер).
+    preprocess_workers — при workers=1: модель одна, а предобработка куска идёт
+    по частям в стольких процессах (partitions.py); при workers > 1 куски и так параллельны
+    Возвращаю сводку: строки, ошибки, время и скорость
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    state = preprocessing_state(model_path, input_path, chunk_size)
+    writer = PredictionWriter(output_path)
+
+    rows = 0
+    errors = 0
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model_path, low_memory, 0, state))
+    else:
+        pool = None
+        _init_worker(model_path, low_memory, preprocess_workers, state)
+
+    if workers > 1 and preprocess_workers > 1:
+        logger.warning("⚠️ --preprocess-workers работает только с --workers 1: куски и так считаются в пуле")
+    logger.info(f"🚀 Оцениваю {input_path}: {workers} процесс(ов), куски по {chunk_size} строк")
+    try:
+        for ids, (prices, failed) in _score_chunks(pool, read_chunks(input_path, chunk_size), workers, id_column):
+            frame = pd.DataFrame({"predicted_price": prices})
+            if id_column:
+                frame.insert(0, id_column, ids)
+            writer.write(frame)
+
+            rows += len(prices)
+            errors += failed
+            elapsed = time.perf_counter() - start
+            logger.info(f"⏳ {rows:,} строк, {rows / elapsed:,.0f} строк/с, ошибок: {errors}")
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "rows": rows,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info(f"✅ Готово: {rows:,} строк за {elapsed:.1f} с ({summary['rows_per_sec']:,.0f} строк/с) → {output_path}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная оценка цен по CSV/Parquet")
+    parser.add_argument("input", help="Входной CSV или Parquet с сырыми столбцами датасета")
+    parser.add_argument("-o", "--output", required=True, help="Куда писать предсказания (.csv или .parquet)")
+    parser.add_argument("-m", "--model", default=None, help="Путь к модели (по умолчанию — автопоиск)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Число процессов (по умолчанию — число ядер)")
+    parser.add_argument("-c", "--chunk-size", type=int, default=10000, help="Строк в одном куске")
+    parser.add_argument("--id-column", default=None, help="Колонка входа, которую скопировать в выход")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="Компактная предобработка: category и float32, homeFacts/schools по частям")
+    parser.add_argument("--preprocess-workers", type=int, default=0,
+                        help="С --workers 1: предобработка куска по частям в стольких процессах, модель одна")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    score_file(args.input, args.output, args.model, args.workers, args.chunk_size, args.id_column,
+               args.low_memory, args.preprocess_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Метрики сервиса в текстовом формате Prometheus
+
+Гистограммы этапов запроса и счётчики ошибок живут здесь, в процессе;
+пул, кэш, батчер и разбор отдают свои счётчики через stats(), app переводит
+их в те же строки функцией render_family. prometheus_client не нужен —
+формат простой, а образ сервиса остаётся без лишних зависимостей
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Границы гистограмм времени этапов, секунды: от 100 мкс до 10 с
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    """{name="value",...} для строки метрики; extra — готовая пара вроде le="0.1" """
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            samples = sorted(self._values.items())
+        return render_family(self.name, "counter", self.documentation,
+                             [(dict(zip(self.labelnames, labels)), value) for labels, value in samples])
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами и метками"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: счётчики по корзинам (последняя — +Inf), сумма
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Замеряю время блока; ошибка внутри блока тоже учитывается"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in series:
+            lines.extend(_histogram_lines(self.name, self.labelnames, labels,
+                                          list(self.buckets) + [float("inf")], counts, total))
+        return lines
+
+
+def _histogram_lines(name: str, labelnames: Sequence[str], labels: Sequence,
+                     bounds: Sequence[float], counts: Sequence[int], total: float) -> List[str]:
+    """Строки _bucket (накопительно), _sum и _count одной серии"""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        le = 'le="' + _number(bound) + '"'
+        lines.append(f"{name}_bucket{_labels(labelnames, labels, le)} {cumulative}")
+    lines.append(f"{name}_sum{_labels(labelnames, labels)} {_number(total)}")
+    lines.append(f"{name}_count{_labels(labelnames, labels)} {cumulative}")
+    return lines
+
+
+def render_family(name: str, kind: str, documentation: str,
+                  samples: Iterable[Tuple[Dict[str, object], float]]) -> List[str]:
+    """Семейство counter/gauge из готовых значений: [({метка: значение}, число), ...]"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+    return lines
+
+
+def render_histogram(name: str, documentation: str, bucket_counts: Dict[object, int], total: float,
+                     labels: Optional[Dict[str, object]] = None) -> List[str]:
+    """Гистограмма из чужих счётчиков по корзинам (не накопительных, ключ '+Inf' — хвост)"""
+    bounds = [float("inf") if bound == "+Inf" else float(bound) for bound in bucket_counts]
+    labels = labels or {}
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} histogram"] + \
+        _histogram_lines(name, list(labels), list(labels.values()), bounds, list(bucket_counts.values()), total)
+
+
+# Время этапов: parse, validation, preprocessing, encoding, predict, serialization
+STAGE_SECONDS = Histogram(
+    "house_price_stage_seconds",
+    "Время этапов обработки запроса",
+    ["stage"],
+)
+
+REQUEST_SECONDS = Histogram(
+    "house_price_request_seconds",
+    "Полное время обработки запроса",
+    ["endpoint"],
+)
+
+ERRORS = Counter(
+    "house_price_errors_total",
+    "Ошибки по эндпоинтам и видам",
+    ["endpoint", "kind"],
+)
+
+PREDICTIONS = Counter(
+    "house_price_predictions_total",
+    "Посчитанные строки по пути предсказания: fast — построчно, frame — через pandas",
+    ["path"],
+)
+
+FAST_PATH_FALLBACKS = Counter(
+    "house_price_fast_path_fallbacks_total",
+    "Строки, которые построчный путь не смог посчитать и отдал в pandas: features — признаки, predict — модель",
+    ["stage"],
+)
+
+MODEL_RELOADS = Counter(
+    "house_price_model_reloads_total",
+    "Загрузки версий модели из реестра: ok — подменена, failed — осталась прежняя",
+    ["result"],
+)
+
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, ERRORS, PREDICTIONS, FAST_PATH_FALLBACKS, MODEL_RELOADS]
+
+
+def render(extra: Iterable[str] = ()) -> str:
+    """Все метрики процесса плюс строки extra"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,320 @@
+"""
+Обучение модели скриптом: признаки, one-hot и CatBoost/XGBoost/RandomForest
+с параметрами из notebook/best_params.json
+
+    python -m train ../notebook/data/data.csv -o ../models/housing_model
+    python -m train ../notebook/data/data.csv --models cb,xgb,rf --cv 5 -o ../models/housing_model
+    python -m train --features ../features/train.parquet -o ../models/housing_model
+    python -m train --features ../features/train.parquet -o ../out/housing_model --registry ../models/registry
+
+Признаки строит feature_store и кэширует в features/ по входным файлам и версии
+предобработки: повторный запуск на тех же данных не считает их заново.
+Дальше как в ноутбуке: отложенные 20% (random_state=42), кросс-валидация на остальном,
+обучение на них целиком и метрики на отложенных. Фолды идут параллельно в потоках,
+а ядра делятся между ними: каждой модели достаётся cpu / число параллельных фолдов.
+Лучшая по R² на CV модель сохраняется: CatBoost — нативным артефактом (.cbm + .json),
+XGBoost и RandomForest — pickle-пайплайном с предобработкой. Рядом — <имя>.metrics.json.
+С --registry модель и отчёт публикуются новой версией в реестр моделей (registry.py)
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from feature_store import TARGET_COLUMN, build_feature_store, load_manifest, read_feature_store
+from preprocessing import PREPROCESSING_VERSION, Preprocessor, cols_to_use
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_PARAMS = os.path.join(ROOT_DIR, "notebook", "best_params.json")
+DEFAULT_CACHE_DIR = os.path.join(ROOT_DIR, "features")
+
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+
+# Категориальные признаки — в one-hot, остальные проходят как есть (как в ноутбуке)
+cat_cols = ['status_cat', 'city_tier', 'street_cat', 'sqft_category', 'propertyType_cat',
+            'lotsize_cat', 'heating_cat', 'cooling_cat', 'parking_cat',
+            'fireplace_type', 'fireplace_location', 'school_district_cat']
+num_cols = [col for col in cols_to_use if col not in cat_cols]
+
+MODEL_NAMES = {"cb": "CatBoost", "xgb": "XGBoost", "rf": "RandomForest"}
+
+
+def _catboost(params: Dict[str, Any], threads: int):
+    from catboost import CatBoostRegressor
+    return CatBoostRegressor(**params, random_state=RANDOM_STATE, thread_count=threads,
+                             verbose=0, allow_writing_files=False)
+
+
+def _xgboost(params: Dict[str, Any], threads: int):
+    try:
+        from xgboost import XGBRegressor
+    except ImportError:
+        raise SystemExit("❌ Для модели xgb нужен xgboost: pip install xgboost")
+    return XGBRegressor(**params, random_state=RANDOM_STATE, n_jobs=threads, verbosity=0)
+
+
+def _random_forest(params: Dict[str, Any], threads: int):
+    from sklearn.ensemble import RandomForestRegressor
+    return RandomForestRegressor(**params, random_state=RANDOM_STATE, n_jobs=threads)
+
+
+REGRESSORS = {"cb": _catboost, "xgb": _xgboost, "rf": _random_forest}
+
+
+def load_params(path: str, name: str) -> Dict[str, Any]:
+    """
+    Параметры модели из best_params.json ({"cb": {...}, ...}) или best_params_<name>.json.
+    Префикс regressor__ из RandomizedSearchCV убираю
+    """
+    with open(path, encoding="utf-8") as f:
+        params = json.load(f)
+    if any(isinstance(value, dict) for value in params.values()):
+        if name not in params:
+            raise ValueError(f"В {path} нет параметров модели {name}")
+        params = params[name]
+    return {key.split("__", 1)[-1]: value for key, value in params.items()}
+
+
+def make_pipeline(name: str, params: Dict[str, Any], threads: int):
+    """Pipeline из 'prep' (OneHotEncoder + passthrough) и 'model' (регрессор на log1p цены)"""
+    from sklearn.compose import ColumnTransformer, TransformedTargetRegressor
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder
+
+    prep = ColumnTransformer(transformers=[
+        ('cat', OneHotEncoder(handle_unknown='ignore'), cat_cols),
+        ('num', 'passthrough', num_cols),
+    ])
+    model = TransformedTargetRegressor(regressor=REGRESSORS[name](params, threads),
+                                       func=np.log1p, inverse_func=np.expm1)
+    return Pipeline([('prep', prep), ('model', model)])
+
+
+def evaluate(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
+    """Метрики как в evaluate_model ноутбука"""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    return {
+        "r2": float(r2_score(y_true, y_pred)),
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        "mape": float(np.mean(np.abs((y_true - y_pred) / y_true)) * 100),
+    }
+
+
+def split_threads(folds: int, parallel_folds: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Сколько фолдов считать одновременно и сколько потоков дать модели в каждом:
+    произведение не больше числа ядер, чтобы потоки CatBoost не дрались за них
+    """
+    cpus = os.cpu_count() or 1
+    parallel = max(1, min(parallel_folds or cpus, folds, cpus))
+    return parallel, max(1, cpus // parallel)
+
+
+def _fit_fold(name: str, params: Dict[str, Any], threads: int, X: pd.DataFrame, y: np.ndarray,
+              train_index: np.ndarray, valid_index: np.ndarray) -> Dict[str, Any]:
+    start = time.perf_counter()
+    pipeline = make_pipeline(name, params, threads)
+    pipeline.fit(X.iloc[train_index], y[train_index])
+    metrics = evaluate(y[valid_index], pipeline.predict(X.iloc[valid_index]))
+    metrics["seconds"] = round(time.perf_counter() - start, 2)
+    return metrics
+
+
+def cross_validate(name: str, params: Dict[str, Any], X: pd.DataFrame, y: np.ndarray,
+                   folds: int, parallel_folds: Optional[int] = None) -> Dict[str, Any]:
+    """KFold с перемешиванием; фолды — в потоках (модели отпускают GIL), данные не копируются"""
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import KFold
+
+    parallel, threads = split_threads(folds, parallel_folds)
+    logger.info(f"🔁 {MODEL_NAMES[name]}: {folds} фолдов, по {parallel} одновременно, {threads} потоков на модель")
+    splits = KFold(n_splits=folds, shuffle=True, random_state=RANDOM_STATE).split(X)
+    results = Parallel(n_jobs=parallel, prefer="threads")(
+        delayed(_fit_fold)(name, params, threads, X, y, train_index, valid_index)
+        for train_index, valid_index in splits
+    )
+    summary = {"folds": results, "parallel_folds": parallel, "threads_per_model": threads}
+    for metric in ("r2", "mae", "rmse", "mape"):
+        values = [fold[metric] for fold in results]
+        summary[f"{metric}_mean"] = float(np.mean(values))
+        summary[f"{metric}_std"] = float(np.std(values))
+    return summary
+
+
+def _cache_key(inputs: List[str], trim_outliers: bool) -> str:
+    """Ключ кэша признаков: входные файлы (путь, размер, время изменения) и версия предобработки"""
+    files = []
+    for path in inputs:
+        stat = os.stat(path)
+        files.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    payload = json.dumps({"inputs": files, "preprocessing_version": PREPROCESSING_VERSION,
+                          "trim_outliers": trim_outliers}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def cached_features(inputs: List[str], cache_dir: str, chunk_size: int = 100000,
+                    trim_outliers: bool = True, rebuild: bool = False) -> str:
+    """Путь к хранилищу признаков для inputs: готовое из кэша или построенное заново"""
+    store_path = os.path.join(cache_dir, f"features-{_cache_key(inputs, trim_outliers)}.parquet")
+    if not rebuild and os.path.exists(store_path):
+        try:
+            load_manifest(store_path)
+            logger.info(f"♻️ Признаки из кэша: {store_path}")
+            return store_path
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Кэш признаков не подходит ({e}), строю заново")
+    build_feature_store(inputs, store_path, chunk_size, trim_outliers)
+    return store_path
+
+
+def save_model(name: str, pipeline, output_prefix: str, manifest: Dict[str, Any],
+               calibration: Optional[Tuple[pd.DataFrame, np.ndarray]] = None) -> List[str]:
+    """
+    CatBoost — нативный артефакт со статистиками и словарями из хранилища признаков
+    и интервалами цены, откалиброванными на calibration (отложенная выборка).
+    Остальные — pickle, в начало пайплайна ставлю предобработку с теми же статистиками
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_prefix)), exist_ok=True)
+    if name == "cb":
+        from model_artifact import export_artifact
+        export_artifact(pipeline, output_prefix, manifest.get("vocabulary"), manifest.get("preprocessing_state"),
+                        calibration)
+        return [output_prefix + ".cbm", output_prefix + ".json"]
+
+    import joblib
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import FunctionTransformer
+
+    preprocessor = Preprocessor(manifest.get("preprocessing_state"))
+    full = Pipeline([('preprocess', FunctionTransformer(preprocessor.transform))] + pipeline.steps)
+    joblib.dump(full, output_prefix + ".pkl")
+    return [output_prefix + ".pkl"]
+
+
+def _git_commit() -> Optional[str]:
+    import subprocess
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def train(store_path: str, output_prefix: str, models: List[str], params_path: str = DEFAULT_PARAMS,
+          folds: int = 5, parallel_folds: Optional[int] = None,
+          n_estimators: Optional[int] = None) -> Dict[str, Any]:
+    """Обучаю модели на хранилище признаков, сохраняю лучшую и отчёт; возвращаю отчёт"""
+    from sklearn.model_selection import train_test_split
+
+    frame, manifest = read_feature_store(store_path)
+    X = frame[cols_to_use]
+    y = frame[TARGET_COLUMN].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    logger.info(f"📦 Признаки {store_path}: train {len(X_train):,}, test {len(X_test):,}")
+
+    results = {}
+    fitted = {}
+    for name in models:
+        params = load_params(params_path, name)
+        if n_estimators is not None:
+            params["n_estimators"] = n_estimators
+        result = {"params": params}
+        if folds > 1:
+            result["cv"] = cross_validate(name, params, X_train, y_train, folds, parallel_folds)
+            logger.info(f"📊 {MODEL_NAMES[name]} CV: R² {result['cv']['r2_mean']:.4f} ± {result['cv']['r2_std']:.4f}, "
+                        f"MAE {result['cv']['mae_mean']:,.0f}")
+
+        # Финальная модель — на всех train-строках и всех ядрах
+        start = time.perf_counter()
+        pipeline = make_pipeline(name, params, os.cpu_count() or 1)
+        pipeline.fit(X_train, y_train)
+        result["fit_seconds"] = round(time.perf_counter() - start, 2)
+        result["train"] = evaluate(y_train, pipeline.predict(X_train))
+        result["test"] = evaluate(y_test, pipeline.predict(X_test))
+        result["overfit_gap"] = result["train"]["r2"] - result["test"]["r2"]
+        logger.info(f"🏁 {MODEL_NAMES[name]} test: R² {result['test']['r2']:.4f}, MAE {result['test']['mae']:,.0f}, "
+                    f"обучение {result['fit_seconds']:.1f} с")
+        results[name] = result
+        fitted[name] = pipeline
+
+    # Лучшая — по CV, без CV — по отложенной выборке
+    score = (lambda n: results[n]["cv"]["r2_mean"]) if folds > 1 else (lambda n: results[n]["test"]["r2"])
+    best = max(models, key=score)
+    files = save_model(best, fitted[best], output_prefix, manifest, (X_test, y_test))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "preprocessing_version": PREPROCESSING_VERSION,
+            "features": os.path.abspath(store_path),
+            "inputs": manifest.get("inputs"),
+            "rows": {"train": len(X_train), "test": len(X_test)},
+            "folds": folds,
+            "random_state": RANDOM_STATE,
+        },
+        "models": results,
+        "selected": best,
+        "artifact": files,
+    }
+    with open(output_prefix + ".metrics.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"✅ Выбрана {MODEL_NAMES[best]}: {', '.join(files)}, отчёт {output_prefix}.metrics.json")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обучение модели цены по сырым данным или хранилищу признаков")
+    parser.add_argument("inputs", nargs="*", help="Сырые CSV или Parquet с колонкой target")
+    parser.add_argument("--features", default=None, help="Готовое хранилище признаков вместо сырых файлов")
+    parser.add_argument("-o", "--output", required=True, help="Префикс артефакта, например ../models/housing_model")
+    parser.add_argument("--models", default="cb", help="Модели через запятую: cb, xgb, rf")
+    parser.add_argument("--params", default=DEFAULT_PARAMS, help="best_params.json или best_params_<модель>.json")
+    parser.add_argument("--cv", type=int, default=5, help="Число фолдов; 0 или 1 — без кросс-валидации")
+    parser.add_argument("--parallel-folds", type=int, default=None,
+                        help="Сколько фолдов считать одновременно (по умолчанию — сколько позволяют ядра)")
+    parser.add_argument("--n-estimators", type=int, default=None, help="Переопределить число деревьев (для пробных запусков)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Где хранить кэш признаков")
+    parser.add_argument("--rebuild-features", action="store_true", help="Построить признаки заново")
+    parser.add_argument("-c", "--chunk-size", type=int, default=100000, help="Строк в куске при построении признаков")
+    parser.add_argument("--registry", default=None, help="Опубликовать модель новой версией в этот реестр")
+    parser.add_argument("--version", default=None, help="Имя версии в реестре (по умолчанию — время UTC)")
+    args = parser.parse_args(argv)
+
+    models = [name.strip() for name in args.models.split(",") if name.strip()]
+    unknown = [name for name in models if name not in REGRESSORS]
+    if unknown or not models:
+        parser.error(f"неизвестные модели: {unknown}; доступны {', '.join(REGRESSORS)}")
+    if not args.features and not args.inputs:
+        parser.error("нужны сырые файлы или --features")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    store_path = args.features or cached_features(args.inputs, args.cache_dir, args.chunk_size,
+                                                  rebuild=args.rebuild_features)
+    report = train(store_path, args.output, models, args.params, args.cv, args.parallel_folds, args.n_estimators)
+    if args.registry:
+        from registry import ModelRegistry
+        # Последний файл артефакта — тот, что грузит сервис (.json или .pkl)
+        ModelRegistry(args.registry).publish(report["artifact"][-1], args.version)
+
+
+if __name__ == "__main__":
+    main()
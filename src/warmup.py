@@ -0,0 +1,143 @@
+"""
+Прогрев модели до приёма трафика
+
+Первые предсказания после загрузки заметно дольше следующих: ленивая инициализация
+pandas и CatBoost (у pickle-модели — ещё sklearn), компиляция регулярок предобработки,
+первые значения в словарях категорий, создание потоков пула. Здесь эти расходы
+оплачивают пробные объявления: одиночные — через быстрый путь predict, пакет — через
+predict_frame (pandas-предобработка и модель целиком). Образцы — встроенные
+объявления разного вида или свой файл (WARMUP_SAMPLES: JSON-массив, NDJSON или CSV
+в формате /predict/batch), лучше всего — выгрузка реальных запросов
+"""
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+from schemas import HouseInput, validate_house
+
+logger = logging.getLogger(__name__)
+
+# Встроенные образцы: пример из схемы, другие форматы полей и объявление с пропусками
+# (null во вложенных полях), чтобы прогреть правила разбора, а не одну строку
+SAMPLES = [
+    HouseInput.model_config["json_schema_extra"]["example"],
+    {
+        "status": "for sale",
+        "private pool": None,
+        "propertyType": "condo",
+        "street": "1200 Ocean Dr APT 5",
+        "baths": "2 Baths",
+        "homeFacts": {
+            "atAGlanceFacts": [
+                {"factValue": "2008", "factLabel": "Year built"},
+                {"factValue": "", "factLabel": "Remodeled year"},
+                {"factValue": "Electric", "factLabel": "Heating"},
+                {"factValue": "", "factLabel": "Cooling"},
+                {"factValue": "2 spaces", "factLabel": "Parking"},
+                {"factValue": "—", "factLabel": "lotsize"},
+                {"factValue": "$512", "factLabel": "Price/sqft"}
+            ]
+        },
+        "fireplace": "",
+        "city": "Miami Beach",
+        "schools": [{"rating": ["8/10", "NR"], "data": {"Distance": ["0.4mi", "1.1mi"], "Grades": ["K-5", "6-8"]},
+                     "name": ["South Pointe Elementary", "Nautilus Middle"]}],
+        "sqft": "Total interior livable area: 1,150 sqft",
+        "zipcode": "33139",
+        "beds": "2 Beds",
+        "state": "FL",
+        "stories": "",
+        "mls-id": "A11458",
+        "PrivatePool": "Yes",
+        "MlsId": None,
+    },
+    {
+        "status": "Pending",
+        "private pool": None,
+        "propertyType": "Townhouse",
+        "street": None,
+        "baths": "2.5 ba",
+        "homeFacts": None,
+        "fireplace": None,
+        "city": "Austin",
+        "schools": None,
+        "sqft": "1,840 sqft",
+        "zipcode": "78704",
+        "beds": "3 bd",
+        "state": "TX",
+        "stories": None,
+        "mls-id": None,
+        "PrivatePool": None,
+        "MlsId": None,
+    },
+]
+
+
+def load_samples(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Образцы в виде, в каком их получает предсказатель (как /predict после validate_house).
+    path — свой файл; строки с ошибками пропускаю
+    """
+    if not path:
+        return [validate_house(sample) for sample in SAMPLES]
+
+    import bulk
+    ext = os.path.splitext(path)[1].lower()
+    fmt = "csv" if ext == ".csv" else "ndjson" if ext in (".ndjson", ".jsonl") else "json"
+    with open(path, "rb") as f:
+        records = [record for record, error in bulk.iter_records(f, fmt) if error is None]
+    if not records:
+        raise ValueError(f"В {path} нет корректных объявлений для прогрева")
+    return records
+
+
+@contextmanager
+def cache_bypassed(predictor):
+    """
+    Прогрев мимо кэша предсказаний: иначе со второго прохода образцы берутся из кэша
+    и замер показывает не модель, а словарь. После — кэш пустой и с нулевыми счётчиками
+    """
+    cache = getattr(predictor, "cache", None)
+    if cache is None:
+        yield
+        return
+    try:
+        with cache.bypassed():
+            yield
+    finally:
+        cache.reset()
+
+
+def warm_up(predictor, samples: Sequence[Dict[str, Any]], rounds: int = 1, batch_size: int = 32) -> Dict[str, Any]:
+    """
+    rounds раз: каждое объявление по одному (быстрый путь) и пакет из batch_size строк
+    (pandas), мимо кэша предсказаний. Прогноз не число — модель не годится, кидаю ValueError.
+    Возвращаю время проходов: первый обычно в разы дольше последнего
+    """
+    batch = [samples[i % len(samples)] for i in range(batch_size)] if samples else []
+    round_ms = []
+    start = time.perf_counter()
+    with cache_bypassed(predictor):
+        for _ in range(rounds):
+            round_start = time.perf_counter()
+            prices = [predictor.predict(sample) for sample in samples]
+            if batch:
+                prices += predictor.predict_batch(batch)
+            bad = [price for price in prices if not math.isfinite(price)]
+            if bad:
+                raise ValueError(f"Прогрев дал нечисловые прогнозы: {bad[:3]}")
+            round_ms.append(round((time.perf_counter() - round_start) * 1000, 1))
+
+    report = {
+        "seconds": round(time.perf_counter() - start, 3),
+        "samples": len(samples),
+        "batch_size": len(batch),
+        "round_ms": round_ms,
+    }
+    if round_ms:
+        logger.info(f"🔥 Прогрев: {rounds} проходов за {report['seconds']:.2f} с, "
+                    f"первый {round_ms[0]:.0f} мс, последний {round_ms[-1]:.0f} мс")
+    return report
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import os
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import profiling
+from batching import PoolSaturated, interval_result, predict_chunk, predict_frame_chunk
+from predictor import HousePricePredictor
+
+logger = logging.getLogger(__name__)
+
+# Предсказатель внутри процесса-воркера: загружается один раз в _init_process
+_process_predictor: Optional[HousePricePredictor] = None
+
+
+def _init_process(model_path: str, cache_size: int, cache_ttl_s: Optional[float], low_memory: bool,
+                  version: Optional[str] = None):
+    """
+    Загружаю модель один раз на процесс пула.
+    Если процесс создан через fork, модель уже есть — её страницы общие с родителем
+    """
+    global _process_predictor
+    if (_process_predictor is None or _process_predictor.model_path != model_path
+            or _process_predictor.version != version):
+        _process_predictor = HousePricePredictor(model_path, cache_size, cache_ttl_s, low_memory, version=version)
+
+
+def _no_interval(result) -> Tuple[float, None, None]:
+    """Интервал просили, а у модели нет калибровки — цена без границ"""
+    return float(result), None, None
+
+
+def _batch_call(predictor: HousePricePredictor, intervals: bool):
+    """Функция пакета и преобразование результата: цена или (цена, low, high)"""
+    if intervals:
+        if predictor.intervals is None:
+            return predictor.predict_batch, _no_interval
+        return predictor.predict_batch_intervals, interval_result
+    return predictor.predict_batch, float
+
+
+def _frame_call(predictor: HousePricePredictor, intervals: bool):
+    if intervals:
+        if predictor.intervals is None:
+            return predictor.predict_frame, _no_interval
+        return predictor.predict_frame_intervals, interval_result
+    return predictor.predict_frame, float
+
+
+def _process_predict_chunk(items: List[Dict[str, Any]], intervals: bool = False) -> List[Tuple[Any, Optional[Exception]]]:
+    predict_batch, convert = _batch_call(_process_predictor, intervals)
+    return predict_chunk(predict_batch, items, convert)
+
+
+def _process_predict_frame(frame: pd.DataFrame, intervals: bool = False) -> List[Tuple[Any, Optional[Exception]]]:
+    predict_frame, convert = _frame_call(_process_predictor, intervals)
+    return predict_frame_chunk(predict_frame, frame, convert)
+
+
+def profile_predict(predictor: HousePricePredictor, house_data: Dict[str, Any],
+                    memory: bool = False) -> Tuple[float, Dict[str, Any]]:
+    """
+    Одно предсказание с разбивкой по блокам предобработки.
+    Строку считаю через DataFrame мимо быстрого пути — профилируется _do_preprocessing
+    """
+    with profiling.profile(memory) as profile:
+        price = float(predictor.predict_frame(predictor.records_frame([house_data]))[0])
+    return price, profile.report()
+
+
+def _process_profile_predict(house_data: Dict[str, Any], memory: bool) -> Tuple[float, Dict[str, Any]]:
+    return profile_predict(_process_predictor, house_data, memory)
+
+
+class PredictionTimeout(Exception):
+    """Предсказание не уложилось в таймаут"""
+
+
+class PredictionPool:
+    """
+    Выношу CPU-работу pandas/CatBoost из event loop в пул потоков или процессов.
+    Одновременно в работе и в очереди — не больше workers + queue_size задач,
+    сверх этого сразу PoolSaturated; каждая задача ограничена timeout
+    """
+
+    def __init__(self, predictor: HousePricePredictor, mode: str = "thread",
+                 workers: Optional[int] = None, queue_size: int = 64, timeout: float = 10.0):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Неизвестный режим пула: {mode}")
+        self.predictor = predictor
+        self.mode = mode
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.queue_size = max(0, int(queue_size))
+        self.timeout = float(timeout) if timeout and timeout > 0 else None
+
+        self._executor: Optional[Executor] = None
+        # В режиме process — свой пул процессов на каждую модель, пока она кому-то нужна
+        self._process_executors = weakref.WeakKeyDictionary()
+        self._freed = asyncio.Event()
+        self.in_flight = 0
+
+        # Метрики
+        self.submitted_total = 0
+        self.rejected_total = 0
+        self.timeouts_total = 0
+
+    def _process_executor(self, predictor: HousePricePredictor) -> Executor:
+        """
+        Пул процессов для модели predictor. Он живёт, пока жива сама модель: запросы,
+        взявшие её до подмены, держат на неё ссылку и досчитываются в её процессах
+        """
+        # При fork дочерние процессы получат текущую модель без повторной загрузки; другую
+        # _init_process загрузит с диска — ссылка из глобала держала бы её вечно
+        # multiprocessing нужен только в этом режиме — импортирую здесь
+        from concurrent.futures import ProcessPoolExecutor
+
+        global _process_predictor
+        if predictor is self.predictor:
+            _process_predictor = predictor
+        executor = ProcessPoolExecutor(
+            self.workers, initializer=_init_process,
+            initargs=(predictor.model_path, predictor.cache_size, predictor.cache_ttl_s,
+                      predictor.low_memory, predictor.version)
+        )
+        self._process_executors[predictor] = executor
+        weakref.finalize(predictor, executor.shutdown, wait=False)
+        return executor
+
+    def _executor_for(self, predictor: Optional[HousePricePredictor]) -> Executor:
+        """Куда отправить задачу модели predictor: в режиме thread — общий пул"""
+        if self.mode != "process" or predictor is None or self._executor is None:
+            return self._executor
+        executor = self._process_executors.get(predictor)
+        if executor is None:
+            # Модель, которую пул ещё не видел, получает свои процессы, а не чужую модель
+            executor = self._process_executor(predictor)
+        return executor
+
+    def start(self):
+        if self.mode == "process":
+            self._executor = self._process_executor(self.predictor)
+        else:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="predict")
+        logger.info(f"✅ Пул предсказаний: {self.mode}, {self.workers} воркеров, очередь {self.queue_size}")
+
+    def swap_predictor(self, predictor: HousePricePredictor):
+        """
+        Подменяю модель: новые задачи считает новая, начатые и стоящие в очереди — та,
+        которой их отдали. Потоки берут self.predictor в момент отправки задачи; процессам
+        нужна новая модель, поэтому завожу ей новый пул. Старый остаётся для запросов,
+        взявших старую модель, и закрывается, когда на неё не останется ссылок
+        """
+        self.predictor = predictor
+        if self.mode == "process" and self._executor is not None:
+            self._executor = self._process_executor(predictor)
+
+    def stop(self):
+        for executor in list(self._process_executors.values()):
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._process_executors.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    async def predict_chunk(self, items: List[Dict[str, Any]], wait: bool = False,
+                            predictor: Optional[HousePricePredictor] = None,
+                            intervals: bool = False) -> List[Tuple[Any, Optional[Exception]]]:
+        """
+        Считаю пакет в пуле; пары (результат, ошибка) как у batching.predict_chunk.
+        wait=True — при заполненной очереди жду места, а не отклоняю (для /predict/batch).
+        predictor — считать этой моделью, а не текущей (в режиме process — в её пуле процессов).
+        intervals — результат (цена, low, high) вместо цены
+        """
+        if self.mode == "process":
+            return await self._run(wait, _process_predict_chunk, items, intervals,
+                                   executor=self._executor_for(predictor))
+        predict_batch, convert = _batch_call(predictor or self.predictor, intervals)
+        return await self._run(wait, predict_chunk, predict_batch, items, convert)
+
+    async def predict_frame(self, frame: pd.DataFrame, wait: bool = False,
+                            predictor: Optional[HousePricePredictor] = None,
+                            intervals: bool = False) -> List[Tuple[Any, Optional[Exception]]]:
+        """То же для DataFrame с сырыми столбцами — Arrow/Parquet из /predict/batch идут мимо словарей"""
+        if self.mode == "process":
+            return await self._run(wait, _process_predict_frame, frame, intervals,
+                                   executor=self._executor_for(predictor))
+        predict_frame, convert = _frame_call(predictor or self.predictor, intervals)
+        return await self._run(wait, predict_frame_chunk, predict_frame, frame, convert)
+
+    async def predict(self, house_data: Dict[str, Any], predictor: Optional[HousePricePredictor] = None,
+                      intervals: bool = False) -> Any:
+        """Одно предсказание в пуле; с intervals — (цена, low, high)"""
+        (result, error), = await self.predict_chunk([house_data], predictor=predictor, intervals=intervals)
+        if error is not None:
+            raise error
+        return result
+
+    async def predict_profiled(self, house_data: Dict[str, Any], memory: bool = False,
+                               predictor: Optional[HousePricePredictor] = None) -> Tuple[float, Dict[str, Any]]:
+        """Одно предсказание с профилем предобработки — отдельной задачей, без микробатчинга"""
+        if self.mode == "process":
+            return await self._run(False, _process_profile_predict, house_data, memory,
+                                   executor=self._executor_for(predictor))
+        return await self._run(False, profile_predict, predictor or self.predictor, house_data, memory)
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.capacity
+
+    async def _run(self, wait: bool, fn, *args, executor: Optional[Executor] = None):
+        while self.saturated:
+            if not wait:
+                self.rejected_total += 1
+                raise PoolSaturated(f"Пул предсказаний занят: {self.in_flight} задач в работе")
+            self._freed.clear()
+            await self._freed.wait()
+
+        self.in_flight += 1
+        self.submitted_total += 1
+        future = asyncio.get_running_loop().run_in_executor(executor or self._executor, fn, *args)
+        # Место в пуле освобождаю, когда задача реально закончилась, а не когда истёк таймаут
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts_total += 1
+            raise PredictionTimeout(f"Предсказание не уложилось в {self.timeout:g} с")
+
+    def _release(self, future: asyncio.Future):
+        self.in_flight -= 1
+        self._freed.set()
+        # Результат задачи, которую уже никто не ждёт, забираю, чтобы не было предупреждений
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "timeout_s": self.timeout,
+            "in_flight": self.in_flight,
+            "submitted_total": self.submitted_total,
+            "rejected_total": self.rejected_total,
+            "timeouts_total": self.timeouts_total,
+        }
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# Модули сервиса лежат в src/ и импортируются без пакета, как в app.py и benchmarks/
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def model_paths(tmp_path_factory):
+    """
+    Маленький CatBoost на синтетических объявлениях, экспортированный дважды:
+    fitted — со статистиками предобработки, unfitted — без них (как экспорт без --train-data)
+    """
+    pytest.importorskip("catboost")
+    pytest.importorskip("sklearn")
+    import numpy as np
+
+    from feature_store import clean_target
+    from model_artifact import export_artifact
+    from preprocessing import Preprocessor
+    from synthetic import make_listings
+    from train import make_pipeline
+
+    df = make_listings(600, seed=7, with_target=True)
+    target = clean_target(df["target"])
+    df, target = df[~np.isnan(target)].reset_index(drop=True), target[~np.isnan(target)]
+    preprocessor = Preprocessor().fit(df)
+    pipeline = make_pipeline("cb", {"iterations": 30, "depth": 4}, threads=1)
+    pipeline.fit(preprocessor.transform(df), target)
+
+    directory = tmp_path_factory.mktemp("models")
+    paths = {}
+    for name, state in (("fitted", preprocessor.state), ("unfitted", None)):
+        prefix = str(directory / name)
+        export_artifact(pipeline, prefix, preprocessing_state=state)
+        paths[name] = prefix + ".json"
+    return paths
@@ -0,0 +1,97 @@
+"""
+Микробатчинг /predict не меняет ответ: запрос, посчитанный один, и тот же запрос
+в общем пакете с другими дают одну цену и один код ответа
+"""
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+import app as service  # noqa: E402
+from batching import MicroBatcher, PoolSaturated  # noqa: E402
+from predictor import HousePricePredictor  # noqa: E402
+from synthetic import make_payloads  # noqa: E402
+from workers import PredictionPool  # noqa: E402
+
+pytestmark = pytest.mark.filterwarnings("ignore")
+
+
+def _bodies():
+    """Обычные объявления, baths без числа ('--') и объявление без части ключей"""
+    bodies = make_payloads(24, seed=3)
+    bodies[5] = dict(bodies[5], baths="--")
+    bodies[9] = {key: value for key, value in bodies[9].items() if key not in ("baths", "homeFacts", "sqft")}
+    return bodies
+
+
+async def _serve(predictor, bodies, together: bool):
+    """Ответы /predict: все запросы разом (собираются в пакеты) или по одному"""
+    pool = PredictionPool(predictor, "thread", workers=2, queue_size=64)
+    pool.start()
+    batcher = MicroBatcher(service.run_batch, max_batch_size=32, max_wait_ms=50)
+    await batcher.start()
+    saved = service.predictor, service.pool, service.batcher
+    service.predictor, service.pool, service.batcher = predictor, pool, batcher
+    try:
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            if together:
+                responses = await asyncio.gather(*(client.post("/predict", json=body) for body in bodies))
+            else:
+                responses = [await client.post("/predict", json=body) for body in bodies]
+    finally:
+        service.predictor, service.pool, service.batcher = saved
+        await batcher.stop()
+        pool.stop()
+    outcomes = [(r.status_code, r.json().get("predicted_price")) for r in responses]
+    return outcomes, batcher.max_batch_seen
+
+
+@pytest.mark.parametrize("model", ["fitted", "unfitted"])
+def test_request_same_alone_and_in_batch(model_paths, model):
+    predictor = HousePricePredictor(model_paths[model])
+    bodies = _bodies()
+
+    alone, _ = asyncio.run(_serve(predictor, bodies, together=False))
+    together, max_batch = asyncio.run(_serve(predictor, bodies, together=True))
+
+    assert together == alone
+    assert any(status == 200 for status, _ in alone)
+    if model == "fitted":
+        # Со статистиками запросы действительно шли пакетами
+        assert max_batch > 1
+    else:
+        # Без статистик микробатчинг обходится — каждая строка считается сама по себе
+        assert max_batch == 0
+
+
+def test_full_batcher_rejects_each_extra_request():
+    """Сверх max_queue ждущих ответа запросов отказ получает каждый лишний, а не пакет целиком"""
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def run_chunk(items, key):
+            await gate.wait()
+            return [(item["n"], None) for item in items]
+
+        batcher = MicroBatcher(run_chunk, max_batch_size=2, max_wait_ms=1, max_queue=3)
+        await batcher.start()
+        try:
+            tasks = [asyncio.create_task(batcher.submit({"n": n})) for n in range(5)]
+            await asyncio.sleep(0.05)
+            assert batcher.pending == 3
+            gate.set()
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            # Место освободилось — следующий запрос снова принимается
+            after = await batcher.submit({"n": 5})
+        finally:
+            await batcher.stop()
+        return outcomes, after, batcher.stats()
+
+    outcomes, after, stats = asyncio.run(scenario())
+    assert outcomes[:3] == [0, 1, 2]
+    assert all(isinstance(outcome, PoolSaturated) for outcome in outcomes[3:])
+    assert after == 5
+    assert stats["rejected_total"] == 2
+    assert stats["pending"] == 0
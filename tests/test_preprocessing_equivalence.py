@@ -0,0 +1,74 @@
+"""
+Векторная предобработка против замороженных выходов исходной построчной версии.
+
+Ожидаемые выходы в data/preprocessing_expected.json записаны benchmarks/equivalence.py --freeze:
+обычный режим — исходной версией из первого коммита, low_memory — текущей после сверки с ней.
+Если правка предобработки меняет признаки намеренно, файл перезаписывается той же командой
+"""
+import json
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessing import Preprocessor, _do_preprocessing, _preprocess_record
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "preprocessing_expected.json")
+
+with open(DATA_PATH, encoding="utf-8") as f:
+    CASES = json.load(f)["cases"]
+
+pytestmark = pytest.mark.filterwarnings("ignore")
+
+
+def _input(case) -> pd.DataFrame:
+    return pd.DataFrame(case["input"])
+
+
+def assert_frozen(actual: pd.DataFrame, frozen: dict):
+    """Те же столбцы в том же порядке, те же dtype и точно те же значения (NaN == NaN)"""
+    assert list(actual.columns) == frozen["columns"]
+    for col, dtype, values in zip(frozen["columns"], frozen["dtypes"], frozen["values"]):
+        assert str(actual[col].dtype) == dtype, col
+        if dtype == "category" or dtype == "object":
+            assert actual[col].astype(object).tolist() == values, col
+        else:
+            expected = np.array([np.nan if value is None else value for value in values], dtype=dtype)
+            np.testing.assert_array_equal(actual[col].to_numpy(), expected, err_msg=col)
+
+
+@pytest.mark.parametrize("case", CASES, ids=[case["name"] for case in CASES])
+def test_matches_baseline(case):
+    assert_frozen(_do_preprocessing(_input(case)), case["expected"])
+
+
+@pytest.mark.parametrize("case", CASES, ids=[case["name"] for case in CASES])
+def test_low_memory_matches_frozen(case):
+    assert_frozen(_do_preprocessing(_input(case), low_memory=True), case["low_memory"])
+
+
+@pytest.mark.parametrize("case", CASES, ids=[case["name"] for case in CASES])
+def test_fitted_preprocessor_matches_baseline(case):
+    # Статистики с того же пакета — те же, что исходная версия считала по пакету
+    df = _input(case)
+    assert_frozen(Preprocessor().fit(df).transform(df), case["expected"])
+
+
+@pytest.mark.parametrize("case", CASES, ids=[case["name"] for case in CASES])
+def test_record_path_matches_baseline(case):
+    # Быстрый путь /predict: строка за строкой без pandas, со статистиками пакета
+    df = _input(case)
+    state = Preprocessor().fit(df).state
+    expected = pd.DataFrame(dict(zip(case["expected"]["columns"], case["expected"]["values"])))
+    for i, record in enumerate(case["input"]):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            features = _preprocess_record(record, state)
+        row = expected.iloc[i]
+        for col, value in features.items():
+            if isinstance(value, str):
+                assert value == row[col], (i, col)
+            else:
+                assert value == row[col] or (pd.isna(value) and pd.isna(row[col])), (i, col)
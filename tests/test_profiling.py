@@ -0,0 +1,33 @@
+"""
+Счётчик копий профиля: стоит на pandas только пока открыт профиль
+и считает одну операцию один раз, без вложенных вызовов внутри pandas
+"""
+import pandas as pd
+from pandas.core.generic import NDFrame
+
+import profiling  # noqa: E402
+
+
+def test_copy_hook_is_removed_after_profile():
+    originals = NDFrame.__dict__["copy"], NDFrame.__dict__["astype"]
+    with profiling.profile():
+        with profiling.profile():
+            assert NDFrame.__dict__["copy"] is not originals[0]
+        # Внешний профиль ещё открыт — счётчики на месте
+        assert NDFrame.__dict__["astype"] is not originals[1]
+    assert (NDFrame.__dict__["copy"], NDFrame.__dict__["astype"]) == originals
+
+
+def test_nested_pandas_calls_counted_once():
+    df = pd.DataFrame({"a": [1, 2, 3], "b": [4, 5, 6]})
+    with profiling.profile() as current:
+        with profiling.stage("block"):
+            # astype со словарём типов внутри вызывает astype и copy у каждого столбца
+            df.astype({"a": "float64"})
+            df.copy()
+    assert current.copies == 2
+    assert current.report()["stages"]["block"]["copies"] == 2
+
+    # Вне профиля не считаю
+    df.copy()
+    assert current.copies == 2
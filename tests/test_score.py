@@ -0,0 +1,27 @@
+"""
+Пакетная оценка файла не зависит от --chunk-size: модель без статистик предобработки
+получает их по всему входу, а не по каждому куску
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from score import score_file  # noqa: E402
+from synthetic import make_listings  # noqa: E402
+
+pytestmark = pytest.mark.filterwarnings("ignore")
+
+
+@pytest.mark.parametrize("model", ["fitted", "unfitted"])
+def test_scores_do_not_depend_on_chunk_size(model_paths, model, tmp_path):
+    input_path = tmp_path / "listings.csv"
+    make_listings(150, seed=11).to_csv(input_path, index=False)
+
+    prices = {}
+    for chunk_size in (7, 1000):
+        output_path = tmp_path / f"predictions_{chunk_size}.csv"
+        summary = score_file(str(input_path), str(output_path), model_paths[model], workers=1, chunk_size=chunk_size)
+        assert summary["rows"] == 150
+        prices[chunk_size] = pd.read_csv(output_path)["predicted_price"].to_numpy()
+
+    np.testing.assert_array_equal(prices[7], prices[1000])
@@ -0,0 +1,62 @@
+"""
+Пул процессов после подмены модели: запрос, взявший старую модель, считает она же,
+а её процессы закрываются, когда на модель не остаётся ссылок
+"""
+import asyncio
+import gc
+
+import pytest
+
+from predictor import HousePricePredictor  # noqa: E402
+from synthetic import make_payloads  # noqa: E402
+from workers import PredictionPool  # noqa: E402
+
+pytestmark = pytest.mark.filterwarnings("ignore")
+
+
+def test_process_pool_scores_with_the_requested_model(model_paths):
+    old = HousePricePredictor(model_paths["fitted"], version="old")
+    new = HousePricePredictor(model_paths["unfitted"], version="new")
+    # Пакет, в котором статистики по пакету и с обучения дают разные цены
+    items = make_payloads(8, seed=5)
+    expected = {"old": old.predict_batch(items), "new": new.predict_batch(items)}
+    assert expected["old"] != expected["new"]
+
+    async def scenario():
+        pool = PredictionPool(old, "process", workers=1, queue_size=4)
+        pool.start()
+        try:
+            pool.swap_predictor(new)
+            by_old = await pool.predict_chunk(items, predictor=old)
+            by_new = await pool.predict_chunk(items, predictor=new)
+            by_default = await pool.predict_chunk(items)
+            return [r for r, _ in by_old], [r for r, _ in by_new], [r for r, _ in by_default]
+        finally:
+            pool.stop()
+
+    by_old, by_new, by_default = asyncio.run(scenario())
+    assert by_old == expected["old"]
+    assert by_new == expected["new"]
+    assert by_default == expected["new"]
+
+
+def test_retired_process_pool_closes_with_its_model(model_paths):
+    async def scenario():
+        old = HousePricePredictor(model_paths["fitted"], version="old")
+        pool = PredictionPool(old, "process", workers=1, queue_size=4)
+        pool.start()
+        try:
+            await pool.predict_chunk(make_payloads(2, seed=1), predictor=old)
+            executor = pool._executor
+            pool.swap_predictor(HousePricePredictor(model_paths["unfitted"], version="new"))
+            assert len(pool._process_executors) == 2
+
+            del old
+            gc.collect()
+            return executor, len(pool._process_executors)
+        finally:
+            pool.stop()
+
+    executor, pools_left = asyncio.run(scenario())
+    assert pools_left == 1
+    assert executor._shutdown_thread